@@ -1,64 +1,161 @@
 import os
+import click
 from flask import Flask
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, get_app, initialize_app
-import cloudinary
 from .routes.registration import register_blueprint
 from .routes.login import login_blueprint
 from .routes.recipes import recipes_blueprint
+from .routes.cache import cache_blueprint
+from .routes.feed import feed_blueprint
+from .routes.health import health_blueprint
+from .routes.users import users_blueprint
+from .routes.metrics import metrics_blueprint
+from .services.auth_tokens import init_auth
+from .services.cache import init_recipe_cache
+from .services.database_interface import backfill_user_reservations
+from .services.http_cache import init_http_cache
+from .services.json_provider import init_json_provider
+from .services.metrics import init_metrics
+from .services.profiling import init_profiling
+from .services.recipe_database import backfill_recipe_summaries
+from .services.image_jobs import init_image_jobs
+from .services.ingredients import init_ingredient_index
+from .services.image_pool import init_image_pool
+from .services.image_processing import init_image_processing
+from .services.hashing import init_password_hasher
+from .services.lifecycle import init_lifecycle
+from .services.likes import init_like_counter
+from .services.recommendations import RecipeVectors, init_recommender
+from .services.search import init_search_index, get_search_index
+from .services.storage import init_storage, get_db, setup_firebase  # noqa: F401  (re-exported)
 
 
-def create_app():
+def create_app(config=None):
     """
     Create and configure an instance of the Flask application.
-    We'll call 'setup_firebase()' here once, so we have a default
-    Firebase app ready (test or production, depending on environment).
-    Then we configure Cloudinary using CLOUDINARY_URL.
+    STORAGE_BACKEND picks where users, recipes and images live:
+      - "firestore" (default): the default Firebase app (test or production,
+        depending on environment) and Cloudinary (CLOUDINARY_URL) are set up
+        on first use, or by the start-up warm-up, not here: importing and
+        initializing their SDKs dominates cold start.
+      - "memory": in-process stand-ins, no credentials or network needed.
+        STORAGE_LATENCY_MS adds a simulated round trip to every call.
+    Anything in `config` overrides the environment.
     """
     app = Flask(__name__)
     CORS(app)
 
-    # Initialize Firebase Admin (default app)
-    setup_firebase()
+    app.config.from_mapping(
+        STORAGE_BACKEND=os.getenv("STORAGE_BACKEND", "firestore").lower(),
+        STORAGE_LATENCY_MS=float(os.getenv("STORAGE_LATENCY_MS", "0")),
+        STORAGE_WARMUP=os.getenv("STORAGE_WARMUP", "true").lower() == "true",
+        RECIPE_CACHE_BACKEND=os.getenv("RECIPE_CACHE_BACKEND", "memory").lower(),
+        RECIPE_CACHE_URL=os.getenv("RECIPE_CACHE_URL"),
+        RECIPE_CACHE_TTL=int(os.getenv("RECIPE_CACHE_TTL", "60")),
+        RECIPE_CACHE_MAX_ENTRIES=int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "1024")),
+        RECIPE_CACHE_MAX_BYTES=int(os.getenv("RECIPE_CACHE_MAX_BYTES", "0")),
+        HTTP_CACHE_MAX_AGE=int(os.getenv("HTTP_CACHE_MAX_AGE", "0")),
+        COMPRESS_MIN_BYTES=int(os.getenv("COMPRESS_MIN_BYTES", "1024")),
+        JSON_PROVIDER=os.getenv("JSON_PROVIDER", "auto"),
+        SERVER_TIMING=os.getenv("SERVER_TIMING", "false").lower() == "true",
+        PROFILE_ROUTES=os.getenv("PROFILE_ROUTES", ""),
+        PROFILE_SAMPLE_RATE=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        PROFILE_SECRET=os.getenv("PROFILE_SECRET", ""),
+        PROFILE_FORMAT=os.getenv("PROFILE_FORMAT", "collapsed").lower(),
+        PROFILE_INTERVAL_MS=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        PROFILE_DIR=os.getenv("PROFILE_DIR", "profiles"),
+        PROFILE_KEEP=int(os.getenv("PROFILE_KEEP", "100")),
+        FEED_CACHE_TTL=int(os.getenv("FEED_CACHE_TTL", "10")),
+        LIKE_SHARDS=int(os.getenv("LIKE_SHARDS", "10")),
+        LIKE_FLUSH_INTERVAL=float(os.getenv("LIKE_FLUSH_INTERVAL", "1")),
+        LIKE_COUNT_TTL=int(os.getenv("LIKE_COUNT_TTL", "5")),
+        SEARCH_INDEX_PATH=os.getenv("SEARCH_INDEX_PATH", ""),
+        SEARCH_REFRESH_INTERVAL=float(os.getenv("SEARCH_REFRESH_INTERVAL", "60")),
+        INGREDIENT_REFRESH_INTERVAL=float(os.getenv("INGREDIENT_REFRESH_INTERVAL", "60")),
+        RECOMMEND_MODEL_PATH=os.getenv("RECOMMEND_MODEL_PATH", ""),
+        RECOMMEND_RELOAD_INTERVAL=float(os.getenv("RECOMMEND_RELOAD_INTERVAL", "60")),
+        IMAGE_IO_CONCURRENCY=int(os.getenv("IMAGE_IO_CONCURRENCY", "4")),
+        IMAGE_UPLOAD_TIMEOUT=float(os.getenv("IMAGE_UPLOAD_TIMEOUT", "30")),
+        IMAGE_PREPROCESS=os.getenv("IMAGE_PREPROCESS", "auto").lower(),
+        IMAGE_PREPROCESS_WORKERS=int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2")),
+        IMAGE_MAX_BYTES=int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024))),
+        IMAGE_MAX_DIMENSION=int(os.getenv("IMAGE_MAX_DIMENSION", "2048")),
+        IMAGE_FORMAT=os.getenv("IMAGE_FORMAT", "webp").lower(),
+        IMAGE_QUALITY=int(os.getenv("IMAGE_QUALITY", "80")),
+        RECIPE_MAX_REQUEST_BYTES=int(os.getenv("RECIPE_MAX_REQUEST_BYTES", str(100 * 1024 * 1024))),
+        IMAGE_PROCESSING_MODE=os.getenv("IMAGE_PROCESSING_MODE", "sync").lower(),
+        IMAGE_JOB_BACKEND=os.getenv("IMAGE_JOB_BACKEND", "memory").lower(),
+        IMAGE_JOB_DIR=os.getenv("IMAGE_JOB_DIR", "image_jobs"),
+        IMAGE_JOB_WORKERS=int(os.getenv("IMAGE_JOB_WORKERS", "2")),
+        PASSWORD_HASH_WORKERS=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+        PASSWORD_HASH_METHOD=os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+        PASSWORD_HASH_SALT_LENGTH=int(os.getenv("PASSWORD_HASH_SALT_LENGTH", "16")),
+        LEGACY_USER_LOOKUP=os.getenv("LEGACY_USER_LOOKUP", "true").lower() == "true",
+        AUTH_REQUIRED=os.getenv("AUTH_REQUIRED", "false").lower() == "true",
+        AUTH_TOKEN_CACHE_SIZE=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+        ASGI_SYNC_WORKERS=int(os.getenv("ASGI_SYNC_WORKERS", "16")),
+    )
+    if config:
+        app.config.update(config)
 
-    # Configure Cloudinary using CLOUDINARY_URL, e.g.
-    #   export CLOUDINARY_URL=cloudinary://<api_key>:<api_secret>@<cloud_name>
-    cloudinary.config(cloudinary_url=os.getenv("CLOUDINARY_URL"))
+    init_json_provider(app)
+    # Its process pool is created before anything below starts a thread.
+    init_password_hasher(app)
+    init_metrics(app)
+    init_profiling(app)
+    init_storage(app)
+    init_auth(app)
+    init_recipe_cache(app)
+    init_http_cache(app)
+    init_like_counter(app)
+    init_search_index(app)
+    init_ingredient_index(app)
+    init_recommender(app)
+    init_image_pool(app)
+    init_image_processing(app)
+    init_image_jobs(app)
+    init_lifecycle(app)
 
     # Register blueprints
     app.register_blueprint(register_blueprint, url_prefix="/api")
     app.register_blueprint(login_blueprint, url_prefix="/api")
     app.register_blueprint(recipes_blueprint, url_prefix="/api")
+    app.register_blueprint(feed_blueprint, url_prefix="/api")
+    app.register_blueprint(cache_blueprint, url_prefix="/api")
+    app.register_blueprint(health_blueprint, url_prefix="/api")
+    app.register_blueprint(users_blueprint, url_prefix="/api")
+    # Where Prometheus expects it, outside /api
+    app.register_blueprint(metrics_blueprint)
 
-    return app
+    @app.cli.command("backfill-reservations")
+    def backfill_reservations_command():
+        """Create usernames/ and emails/ reservations for existing users."""
+        print(f"Wrote {backfill_user_reservations()} reservation docs")
 
+    @app.cli.command("backfill-summaries")
+    def backfill_summaries_command():
+        """Write the summary document of every existing recipe."""
+        print(f"Wrote {backfill_recipe_summaries()} recipe summaries")
 
-def setup_firebase():
-    """
-    If FLASK_ENV == 'testing', use Firebase_Test.
-    Otherwise, use GOOGLE_APPLICATION_CREDENTIALS for dev or prod.
-    """
-    try:
-        # If default app already exists, do nothing
-        get_app()
-        return
-    except ValueError:
-        pass  # Means no default app has been initialized yet
+    @app.cli.command("build-search-index")
+    def build_search_index_command():
+        """Rebuild the search index from Firestore and write SEARCH_INDEX_PATH."""
+        path = app.config["SEARCH_INDEX_PATH"]
+        if not path:
+            raise click.UsageError("SEARCH_INDEX_PATH is not set.")
+        index = get_search_index()
+        index.rebuild(get_db())
+        index.snapshot(path)
+        print(f"Indexed {len(index.docs)} recipes into {path}")
 
-    env_mode = os.getenv("FLASK_ENV", "development").lower()
-    if env_mode == "testing":
-        cred_path = os.getenv("Firebase_Test")
-        if not cred_path:
-            raise ValueError(
-                "TEST_FIREBASE_CREDENTIALS not set, but FLASK_ENV=testing."
-            )
-    else:
-        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        if not cred_path:
-            raise ValueError(
-                "GOOGLE_APPLICATION_CREDENTIALS not set (non-testing mode)."
-            )
+    @app.cli.command("build-recommendations")
+    def build_recommendations_command():
+        """Rebuild the recipe vectors and write RECOMMEND_MODEL_PATH."""
+        path = app.config["RECOMMEND_MODEL_PATH"]
+        if not path:
+            raise click.UsageError("RECOMMEND_MODEL_PATH is not set.")
+        vectors = RecipeVectors.build(get_db())
+        vectors.save(path)
+        print(f"Wrote {vectors.matrix.shape[0]}x{vectors.matrix.shape[1]} recipe vectors to {path}")
 
-    cred = credentials.Certificate(cred_path)
-    initialize_app(cred)
+    return app
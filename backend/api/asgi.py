@@ -0,0 +1,239 @@
+"""
+ASGI serving mode.
+
+AsgiApp wraps the Flask app as an ASGI application (run it with any ASGI
+server, e.g. `uvicorn start_asgi:app` from backend/). Requests for the
+endpoints in ASYNC_VIEWS (recipe create/get/update/delete, login and
+registration) run as coroutines on the event loop, inside the usual
+Flask request context, with the same before/after-request hooks, error
+handlers and teardown. Their Firestore reads and writes and image
+uploads are awaited, so one process can keep thousands of them in
+flight, and a request's independent calls (its image uploads, the read
+of the recipe it updates) overlap.
+
+Every other endpoint is served by the WSGI app on a pool of
+ASGI_SYNC_WORKERS threads, as under gunicorn, with streamed bodies
+passed through chunk by chunk. Sync mode (start_server.py, any WSGI
+server) is unchanged.
+
+Known limit: the coroutines still make a few blocking calls on the
+loop. These are recipe cache get/set, the search and ingredient index
+updates, and LikeCounter's pending deltas. In-process they are brief
+and in memory, but with RECIPE_CACHE_BACKEND=redis each cache call is a
+synchronous round trip. A slow Redis stalls every connection on the
+loop.
+
+Request bodies are read in full before dispatch, up to
+RECIPE_MAX_REQUEST_BYTES: a longer one (by Content-Length, or once that
+much has arrived) is a 413 without reading the rest.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from .controllers import async_auth, async_recipes
+
+# _read_body() result for a body over RECIPE_MAX_REQUEST_BYTES
+TOO_LARGE = object()
+
+# endpoint -> coroutine taking the route's view args
+ASYNC_VIEWS = {
+    "recipes.create_recipe_route": async_recipes.create_recipe,
+    "recipes.get_recipe_route": async_recipes.get_recipe,
+    "recipes.update_recipe_route": async_recipes.update_recipe,
+    "recipes.delete_recipe_route": async_recipes.delete_recipe,
+    "register.register": async_auth.register_user,
+    "login.login": async_auth.login,
+}
+
+
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI HTTP scope and its (complete) body."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]) if server[1] is not None else "80",
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        if name != "CONTENT_TYPE":
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def _start_message(status, headers):
+    return {
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+
+class AsgiApp:
+    def __init__(self, app, async_views=None):
+        self.app = app
+        self.async_views = ASYNC_VIEWS if async_views is None else async_views
+        self._pool = ThreadPoolExecutor(
+            max_workers=app.config["ASGI_SYNC_WORKERS"], thread_name_prefix="asgi-sync")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'.")
+
+        body = await self._read_body(scope, receive)
+        if body is None:
+            return
+        if body is TOO_LARGE:
+            return await self._send_too_large(send)
+        environ = build_environ(scope, body)
+
+        view = self._async_view(environ)
+        if view is None:
+            await self._run_sync(environ, send)
+        else:
+            await self._run_async(view, environ, send)
+
+    async def _read_body(self, scope, receive):
+        """
+        The whole request body; None if the client went away, TOO_LARGE
+        as soon as it is known to exceed RECIPE_MAX_REQUEST_BYTES.
+        """
+        max_bytes = self.app.config["RECIPE_MAX_REQUEST_BYTES"]
+        for name, value in scope.get("headers", ()):
+            if name.lower() == b"content-length" and max_bytes:
+                try:
+                    if int(value) > max_bytes:
+                        return TOO_LARGE
+                except ValueError:
+                    pass
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if max_bytes and len(body) > max_bytes:
+                return TOO_LARGE
+            if not message.get("more_body"):
+                return bytes(body)
+
+    async def _send_too_large(self, send):
+        body = b'{"error":"Request body too large"}'
+        await send({"type": "http.response.start", "status": 413, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"connection", b"close"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    def _async_view(self, environ):
+        """The coroutine serving this request, or None to run it on the sync app."""
+        if environ["REQUEST_METHOD"] == "OPTIONS":
+            # Flask answers these itself (CORS preflights included).
+            return None
+        adapter = self.app.url_map.bind_to_environ(
+            environ, server_name=self.app.config["SERVER_NAME"])
+        try:
+            # Methods the route doesn't declare fail to match: the sync
+            # app gives them their 405.
+            return self.async_views.get(adapter.match()[0])
+        except HTTPException:
+            return None
+
+    async def _run_async(self, view, environ, send):
+        """Flask's full_dispatch_request(), awaiting the view."""
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                try:
+                    response = app.preprocess_request()
+                    if response is None:
+                        response = await view(**request.view_args)
+                except Exception as e:
+                    response = app.handle_user_exception(e)
+                response = app.finalize_request(response)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+
+            app_iter, status, headers = response.get_wsgi_response(environ)
+            try:
+                await send(_start_message(status, headers))
+                for chunk in app_iter:
+                    if chunk:
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            ctx.pop(error)
+
+    async def _run_sync(self, environ, send):
+        """The WSGI app on a pool thread, its output sent from the loop."""
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [status, headers]
+
+            app_iter = self.app(environ, start_response)
+            try:
+                send_from_thread(_start_message(*started))
+                for chunk in app_iter:
+                    if chunk:
+                        send_from_thread({"type": "http.response.body", "body": chunk,
+                                          "more_body": True})
+                send_from_thread({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+
+        await loop.run_in_executor(self._pool, run)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.app.extensions["storage"].aclose()
+                self._pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
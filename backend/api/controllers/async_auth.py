@@ -0,0 +1,28 @@
+"""
+Coroutine versions of POST /api/register and POST /api/login for the
+ASGI mode (api/asgi.py), sharing parsing and responses with
+registration.py and login.py.
+"""
+from ..services.database_interface import add_user_async, check_user_available_async, UserExists
+from ..services.hashing import get_password_hasher
+from .login import authenticate_user_async, login_credentials, login_response
+from .registration import build_user_dict, parse_registration, registered, user_exists
+
+
+async def register_user():
+    user_data, error = parse_registration()
+    if error is not None:
+        return error
+    try:
+        await check_user_available_async(user_data["username"], user_data["email"])
+        password_hash = await get_password_hasher().hash_password_async(user_data["password"])
+        user_dict = build_user_dict(user_data, password_hash)
+        result = await add_user_async(user_dict)
+    except UserExists as e:
+        return user_exists(e)
+    return registered(user_dict, result)
+
+
+async def login():
+    username, password = login_credentials()
+    return login_response(*await authenticate_user_async(username, password))
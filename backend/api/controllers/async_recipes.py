@@ -0,0 +1,108 @@
+"""
+Coroutine versions of the recipe create/get/update/delete handlers, run
+on the event loop by the ASGI mode (api/asgi.py). Request parsing and
+responses are shared with controllers/recipes.py; storage goes through
+the async Firestore client and awaitable image uploads.
+"""
+from flask import request, jsonify
+from ..services.recipe_database import (
+    create_recipe_async,
+    get_recipe_with_update_time_async,
+    update_recipe_async,
+    delete_recipe_async,
+    upload_images_async,
+    delete_images_async,
+    RecipeConflict,
+)
+from ..services.image_jobs import get_image_jobs
+from ..services.image_pool import ImageUploadError
+from ..services.http_cache import like_parts, make_etag, not_modified, with_validators
+from ..services.likes import annotate_likes_async
+from ..services.auth_tokens import authenticated_user_id
+from .recipes import (
+    image_job_not_queued,
+    image_upload_failed,
+    parse_new_recipe,
+    parse_recipe_update,
+    queue_image_job,
+    recipe_conflict,
+)
+
+
+async def create_recipe():
+    user_id, recipe_data, image_files = parse_new_recipe()
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+
+    job_queue = get_image_jobs()
+    if image_files and job_queue is not None:
+        job, body = queue_image_job(user_id, recipe_data, image_files)
+        await create_recipe_async(user_id, recipe_data)
+        try:
+            job_queue.submit(job)
+        except Exception:
+            await delete_recipe_async(user_id, job.post_id)
+            return image_job_not_queued()
+        return jsonify(body), 202
+
+    recipe_data["imageList"] = []
+    if image_files:
+        try:
+            recipe_data["imageList"] = await upload_images_async(image_files)
+        except ImageUploadError as e:
+            return image_upload_failed(e)
+
+    post_id = await create_recipe_async(user_id, recipe_data)
+    return jsonify({"message": "Recipe created", "postId": post_id}), 201
+
+
+async def get_recipe(post_id):
+    user_id = request.args.get("userId")
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+    recipe_doc, update_time = await get_recipe_with_update_time_async(user_id, post_id)
+    if not recipe_doc:
+        return jsonify({"error": "Recipe not found"}), 404
+    viewer_id = authenticated_user_id(request.args.get("viewerId"))
+    await annotate_likes_async([recipe_doc], user_id, viewer_id)
+    etag = make_etag("recipe", user_id, post_id, update_time, *like_parts([recipe_doc], viewer_id))
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    return with_validators(jsonify(recipe_doc), etag), 200
+
+
+async def update_recipe(post_id):
+    user_id, updated_data, remove_ids, image_files = parse_recipe_update()
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+
+    if not updated_data and not remove_ids and not image_files:
+        existing_doc, _ = await get_recipe_with_update_time_async(user_id, post_id)
+        if not existing_doc:
+            return jsonify({"error": "Recipe not found"}), 404
+        return jsonify({"message": "Recipe updated", "recipe": existing_doc}), 200
+
+    # New images upload while the current recipe is read
+    try:
+        updated_recipe, removed_images = await update_recipe_async(
+            user_id, post_id, updated_data, remove_ids, image_files)
+    except ImageUploadError as e:
+        return image_upload_failed(e)
+    except RecipeConflict:
+        return recipe_conflict()
+    if not updated_recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+
+    # Only destroy images once the recipe no longer references them
+    await delete_images_async([img["publicId"] for img in removed_images])
+    return jsonify({"message": "Recipe updated", "recipe": updated_recipe}), 200
+
+
+async def delete_recipe(post_id):
+    user_id = authenticated_user_id(request.args.get("userId"))
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+    if not await delete_recipe_async(user_id, post_id):
+        return jsonify({"error": "Recipe not found"}), 404
+    return jsonify({"message": "Recipe deleted"}), 200
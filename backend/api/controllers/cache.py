@@ -0,0 +1,10 @@
+from flask import jsonify
+from ..services.cache import get_recipe_cache
+
+
+def get_cache_stats():
+    """
+    Hit/miss counters and sizing for the recipe cache, for tuning
+    RECIPE_CACHE_MAX_ENTRIES / RECIPE_CACHE_MAX_BYTES / RECIPE_CACHE_TTL.
+    """
+    return jsonify(get_recipe_cache().stats()), 200
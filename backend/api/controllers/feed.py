@@ -0,0 +1,34 @@
+from flask import request, jsonify
+from ..services.recipe_database import get_feed_page_from_firebase
+from ..services.likes import annotate_likes
+from ..services.pagination import encode_cursor, decode_cursor, parse_page_size
+from ..services.auth_tokens import authenticated_user_id
+from .recipes import parse_fields, parse_view
+
+
+def get_feed():
+    """
+    Recipes from every user, newest first. Query params:
+      - limit / cursor: page size and the nextCursor from the previous page
+      - fields: optional comma-separated projection, e.g. title,imageList
+      - view: "summary" for just what list screens show
+      - viewerId: who's looking, for isLiked
+    Returns {"recipes": [...], "nextCursor": "..."}; each recipe includes
+    the author's userId. nextCursor is null on the last page.
+    """
+    try:
+        fields = parse_fields(request.args.get("fields"))
+        summaries = parse_view(request.args.get("view"), fields)
+        limit = parse_page_size(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        cursor = decode_cursor(cursor, 3) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    recipes, next_cursor = get_feed_page_from_firebase(limit, cursor, fields, summaries)
+    annotate_likes(recipes, [r["userId"] for r in recipes],
+                   authenticated_user_id(request.args.get("viewerId")), fields)
+    return jsonify({
+        "recipes": recipes,
+        "nextCursor": encode_cursor(*next_cursor) if next_cursor else None,
+    }), 200
@@ -0,0 +1,11 @@
+from flask import jsonify
+from ..services.lifecycle import get_readiness, READY
+
+
+def readiness():
+    """
+    200 once storage warm-up has finished, 503 while warming (or if it
+    failed), so instances only get traffic when they can serve it quickly.
+    """
+    status = get_readiness().status()
+    return jsonify(status), 200 if status["status"] == READY else 503
@@ -1,6 +1,31 @@
-from firebase_admin import auth
-from werkzeug.security import check_password_hash
-from ..services.database_interface import get_user_by_username
+from flask import request, jsonify
+from ..services.database_interface import (
+    get_user_by_username,
+    get_user_by_username_async,
+    update_user_in_firebase,
+    update_user_async,
+)
+from ..services.hashing import get_password_hasher
+from ..services.storage import get_backend
+
+def login_credentials():
+    """(username, password) from the login request's JSON body."""
+    data = request.get_json()
+    username = data.get('username') if data else None
+    password = data.get('password') if data else None
+    return username, password
+
+
+def login_response(token, status_code, error, user_doc):
+    if token:
+        # Note: custom_token is bytes; decode to string
+        return jsonify({
+            "firebase_custom_token": token.decode('utf-8'),
+            "userId": user_doc["userId"]  # the random doc ID from Firestore
+        }), status_code
+    else:
+        return jsonify({"error": error}), status_code
+
 
 def authenticate_user(username, password):
     """
@@ -15,13 +40,44 @@ def authenticate_user(username, password):
     if not user_doc:
         return None, 401, "Invalid credentials", None
 
-    if not check_password_hash(user_doc['password_hash'], password):
+    hasher = get_password_hasher()
+    if not hasher.verify_password(user_doc['password_hash'], password):
         return None, 401, "Invalid credentials", None
 
-    # If you want the custom token to represent user['userId'] instead of 'username', do:
-    # custom_token = auth.create_custom_token(user_doc['userId'])
-    # For now, we’ll keep it as username-based:
-    custom_token = auth.create_custom_token(user_doc['username'])
+    # Hash parameters changed since this user registered: upgrade the
+    # stored hash now, while we have the plaintext password.
+    if hasher.needs_rehash(user_doc['password_hash']):
+        new_hash = hasher.hash_password(password)
+        update_user_in_firebase(user_doc['userId'], {"password_hash": new_hash})
+        user_doc['password_hash'] = new_hash
+
+    # The uid stays the username; the userId claim is carried into the
+    # client's ID tokens, where the auth middleware reads it.
+    custom_token = get_backend().create_custom_token(
+        user_doc['username'], {"userId": user_doc['userId']})
 
     # Return the doc so we can provide userId in /login response
     return custom_token, 200, None, user_doc
+
+
+async def authenticate_user_async(username, password):
+    """authenticate_user() for the ASGI mode; same return values."""
+    if not username or not password:
+        return None, 400, "Missing username or password", None
+
+    user_doc = await get_user_by_username_async(username)
+    if not user_doc:
+        return None, 401, "Invalid credentials", None
+
+    hasher = get_password_hasher()
+    if not await hasher.verify_password_async(user_doc['password_hash'], password):
+        return None, 401, "Invalid credentials", None
+
+    if hasher.needs_rehash(user_doc['password_hash']):
+        new_hash = await hasher.hash_password_async(password)
+        await update_user_async(user_doc['userId'], {"password_hash": new_hash})
+        user_doc['password_hash'] = new_hash
+
+    custom_token = get_backend().create_custom_token(
+        user_doc['username'], {"userId": user_doc['userId']})
+    return custom_token, 200, None, user_doc
@@ -0,0 +1,10 @@
+from flask import Response
+from ..services.metrics import METRICS
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_metrics():
+    """Request and dependency metrics for this process, for Prometheus to scrape."""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
@@ -1,31 +1,112 @@
-from flask import request, jsonify
+import json
+import uuid
+from itertools import chain, islice
+from flask import current_app, request, jsonify, Response, stream_with_context
 from datetime import datetime
 from ..services.recipe_database import (
     create_recipe_in_firebase,
     get_recipe_from_firebase,
+    get_recipe_with_update_time_from_firebase,
+    get_recipes_version,
     update_recipe_in_firebase,
+    update_recipe_images_in_firebase,
     delete_recipe_from_firebase,
     upload_images_to_cloudinary,
-    delete_image_from_cloudinary,
-    get_all_recipes_from_firebase,
+    delete_images_from_cloudinary,
+    iter_all_recipes_from_firebase,
+    get_recipes_page_from_firebase,
+    get_recipe_image_status_from_firebase,
+    iter_recipes_from_firebase,
+    import_recipes_to_firebase,
+    RecipeConflict,
 )
+from ..services.image_jobs import ImageJob, get_image_jobs
+from ..services.image_pool import ImageUploadError
+from ..services.image_processing import limit_request_size
+from ..services.pagination import encode_cursor, decode_cursor, parse_page_size
+from ..services.search import search_recipes as search_recipe_index
+from ..services.ingredients import match_recipes
+from ..services.http_cache import (
+    like_parts, make_etag, not_modified, shows_likes, with_validators,
+)
+from ..services.likes import annotate_likes, like_recipe, unlike_recipe, get_like_counts
+from ..services.json_provider import stream_json_array
+from ..services.auth_tokens import authenticated_user_id
 
+# Recipes annotated with likes per round trip while a list streams.
+STREAM_CHUNK_SIZE = 100
 
-def create_recipe():
+# Fields a client may ask for with ?fields=
+RECIPE_FIELDS = {
+    "postId",
+    "title",
+    "description",
+    "cookingTime",
+    "difficulty",
+    "servings",
+    "datePosted",
+    "dateUpdated",
+    "likes",
+    "isLiked",
+    "ingredients",
+    "instructions",
+    "imageList",
+}
+
+
+def parse_fields(raw):
     """
-    Expects in JSON or form-data:
-      - userId (the unique ID returned at login)
-      - other recipe fields
-      - optional images in request.files.getlist('images')
+    Parse ?fields=title,imageList into a projection list.
+    postId is always included so clients can link to the full recipe.
     """
-    data = request.form.to_dict() or request.get_json() or {}
-    user_id = data.get("userId")
-    if not user_id:
-        return jsonify({"error": "Missing userId"}), 400
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in RECIPE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["postId", *fields]))
 
-    # if multipart form-data in postman
-    image_files = request.files.getlist("images")
 
+def parse_view(raw, fields):
+    """
+    ?view=summary (True) serves lists from the recipe summary documents:
+    postId, title, cookingTime, difficulty, datePosted and coverImage,
+    plus likes and isLiked. ?view=full (or none) is the full recipes.
+    """
+    if raw in (None, "", "full"):
+        return False
+    if raw != "summary":
+        raise ValueError("view must be 'full' or 'summary'")
+    if fields:
+        raise ValueError("fields can't be combined with view=summary")
+    return True
+
+
+def image_upload_failed(error):
+    """502 listing which files failed; the rest were already cleaned up."""
+    return jsonify({
+        "error": "Image upload failed",
+        "failures": error.failures,
+    }), 502
+
+
+# Fields PUT /api/recipes/<post_id> may change
+UPDATABLE_FIELDS = (
+    "title",
+    "description",
+    "cookingTime",
+    "difficulty",
+    "servings",
+    "ingredients",
+    "instructions",
+)
+
+
+def parse_new_recipe():
+    """(user_id, recipe_data, image_files) from a create request's JSON or form-data."""
+    limit_request_size()
+    data = request.form.to_dict() or request.get_json() or {}
     recipe_data = {
         "title": data.get("title"),
         "description": data.get("description"),
@@ -33,15 +114,91 @@ def create_recipe():
         "difficulty": data.get("difficulty"),
         "servings": data.get("servings"),
         "datePosted": datetime.utcnow().isoformat(),
-        "likes": 0,
-        "isLiked": False,
         "ingredients": data.get("ingredients"),
         "instructions": data.get("instructions"),
     }
+    # if multipart form-data in postman
+    return authenticated_user_id(data.get("userId")), recipe_data, request.files.getlist("images")
+
+
+def parse_recipe_update():
+    """(user_id, updated_data, remove_ids, image_files) from an update request."""
+    limit_request_size()
+    data = request.form.to_dict() or request.get_json() or {}
+    image_files = request.files.getlist("images") if request.files else []
+    updated_data = {f: data[f] for f in UPDATABLE_FIELDS if f in data}
+
+    # Remove images
+    remove_ids_str = data.get("removePublicIds")
+    remove_ids = []
+    if remove_ids_str:
+        remove_ids = [rid.strip()
+                      for rid in remove_ids_str.split(",") if rid.strip()]
+    return authenticated_user_id(data.get("userId")), updated_data, remove_ids, image_files
+
+
+def queue_image_job(user_id, recipe_data, image_files):
+    """
+    Async image processing: hand the images to the job queue and mark the
+    recipe pending. Returns the 202 body; the caller stores the recipe.
+    """
+    post_id = str(uuid.uuid4())
+    recipe_data["postId"] = post_id
+    job = ImageJob.from_uploads(user_id, post_id, image_files)
+    recipe_data["imageList"] = []
+    recipe_data["imageStatus"] = {
+        "status": "pending", "total": len(job.files), "completed": 0}
+    return job, {
+        "message": "Recipe created",
+        "postId": post_id,
+        "status": "pending",
+        "statusUrl": f"/api/recipes/{post_id}/status?userId={user_id}",
+    }
+
+
+def image_job_not_queued():
+    """
+    500 for a job the queue refused (e.g. a spool write error); the caller
+    has already deleted the pending recipe, so nothing was created.
+    """
+    current_app.logger.exception("Could not queue image processing")
+    return jsonify({"error": "Could not queue image processing"}), 500
+
+
+def recipe_conflict():
+    return jsonify({"error": "Recipe was modified concurrently, please retry"}), 409
+
+
+def create_recipe():
+    """
+    Expects in JSON or form-data:
+      - userId (the unique ID returned at login; taken from the bearer
+        token when one is sent)
+      - other recipe fields
+      - optional images in request.files.getlist('images')
+    """
+    user_id, recipe_data, image_files = parse_new_recipe()
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+
+    # Async mode: store the recipe now, upload images in the background
+    job_queue = get_image_jobs()
+    if image_files and job_queue is not None:
+        job, body = queue_image_job(user_id, recipe_data, image_files)
+        create_recipe_in_firebase(user_id, recipe_data)
+        try:
+            job_queue.submit(job)
+        except Exception:
+            delete_recipe_from_firebase(user_id, job.post_id)
+            return image_job_not_queued()
+        return jsonify(body), 202
 
     # Upload images
     if image_files:
-        image_entries = upload_images_to_cloudinary(image_files)
+        try:
+            image_entries = upload_images_to_cloudinary(image_files)
+        except ImageUploadError as e:
+            return image_upload_failed(e)
         recipe_data["imageList"] = image_entries
     else:
         recipe_data["imageList"] = []
@@ -51,83 +208,284 @@ def create_recipe():
 
 
 def get_recipe(post_id):
-    # Use only query parameters for GET
+    # Use only query parameters for GET; viewerId (optional) is who's
+    # looking, for isLiked
     user_id = request.args.get("userId")
     if not user_id:
         return jsonify({"error": "Missing userId"}), 400
-    recipe_doc = get_recipe_from_firebase(user_id, post_id)
+    recipe_doc, update_time = get_recipe_with_update_time_from_firebase(user_id, post_id)
     if not recipe_doc:
         return jsonify({"error": "Recipe not found"}), 404
-    return jsonify(recipe_doc), 200
+    viewer_id = authenticated_user_id(request.args.get("viewerId"))
+    annotate_likes([recipe_doc], user_id, viewer_id)
+    etag = make_etag("recipe", user_id, post_id, update_time, *like_parts([recipe_doc], viewer_id))
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    return with_validators(jsonify(recipe_doc), etag), 200
+
+
+def get_recipe_status(post_id):
+    """
+    Image processing progress for a recipe created in async mode:
+    {"postId", "status": pending|processing|done|failed, "total", "completed"}.
+    Recipes with no background work report "done".
+    """
+    user_id = request.args.get("userId")
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+
+    # Live progress if the job is running in this process
+    job_queue = get_image_jobs()
+    job = job_queue.job_for(post_id) if job_queue else None
+    if job and job.user_id == user_id:
+        return jsonify({"postId": post_id, **job.status()}), 200
+
+    image_status = get_recipe_image_status_from_firebase(user_id, post_id)
+    if image_status is None:
+        return jsonify({"error": "Recipe not found"}), 404
+    if not image_status:
+        image_status = {"status": "done"}
+    return jsonify({"postId": post_id, **image_status}), 200
 
 
 def get_all_recipes():
+    """
+    Query params:
+      - userId (required)
+      - fields: optional comma-separated projection, e.g. title,imageList
+      - view: "summary" for just what list screens show (see parse_view)
+      - viewerId: who's looking, for isLiked
+      - limit / cursor: page through recipes newest first. The response is
+        then {"recipes": [...], "nextCursor": "..."}; pass nextCursor back
+        as cursor to get the next page (null on the last page).
+    Without limit or cursor the full list is returned as a bare array,
+    streamed as the recipes are read.
+    Responses carry an ETag (the streamed full list only when fields
+    leaves out likes and isLiked); send it back in If-None-Match to get
+    a 304 while none of the user's recipes or their likes have changed.
+    """
     user_id = request.args.get("userId")
     if not user_id:
         return jsonify({"error": "Missing userId"}), 400
 
-    recipes = get_all_recipes_from_firebase(user_id)
-    return jsonify(recipes), 200
+    try:
+        fields = parse_fields(request.args.get("fields"))
+        summaries = parse_view(request.args.get("view"), fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    # Read the version before the recipes, so the tag is never newer than the body.
+    # A user no recipe write has bumped yet has no version, and their lists no ETag.
+    version = get_recipes_version(user_id)
+    etag = None if version is None else make_etag(
+        "recipe-summaries" if summaries else "recipes", user_id, version)
+    has_likes = shows_likes(fields)
+    if not has_likes:
+        unchanged = not_modified(etag)
+        if unchanged is not None:
+            return unchanged
+    viewer_id = authenticated_user_id(request.args.get("viewerId"))
 
-def update_recipe(post_id):
-    data = request.form.to_dict() or request.get_json() or {}
-    user_id = data.get("userId")
+    if "limit" not in request.args and "cursor" not in request.args:
+        recipes = iter_all_recipes_from_firebase(user_id, fields, summaries)
+
+        def annotated():
+            while chunk := list(islice(recipes, STREAM_CHUNK_SIZE)):
+                yield from annotate_likes(chunk, user_id, viewer_id, fields)
+
+        body = stream_json_array(current_app, annotated())
+        # The first chunk is read before the 200 goes out, so a failed
+        # read is a 500. One that fails later aborts the response before
+        # the closing "]", which clients see as a truncated body.
+        first = next(body)
+        body = chain([first], body)
+        return with_validators(Response(
+            stream_with_context(body), mimetype=current_app.json.mimetype),
+            None if has_likes else etag), 200
+
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        cursor = decode_cursor(cursor, 2) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    recipes, next_cursor = get_recipes_page_from_firebase(
+        user_id, limit, cursor, fields, summaries)
+    annotate_likes(recipes, user_id, viewer_id, fields)
+    if has_likes and etag is not None:
+        etag = make_etag(etag, *like_parts(recipes, viewer_id, fields))
+        unchanged = not_modified(etag)
+        if unchanged is not None:
+            return unchanged
+    return with_validators(jsonify({
+        "recipes": recipes,
+        "nextCursor": encode_cursor(*next_cursor) if next_cursor else None,
+    }), etag), 200
+
+
+def export_recipes():
+    """
+    Stream all of a user's recipes as NDJSON (one JSON object per line),
+    reading them from Firestore a page at a time. Query params: userId.
+    The output can be fed straight back to POST /api/recipes/import.
+    """
+    user_id = request.args.get("userId")
     if not user_id:
         return jsonify({"error": "Missing userId"}), 400
 
-    image_files = request.files.getlist("images") if request.files else []
+    def generate():
+        for recipe in iter_recipes_from_firebase(user_id):
+            yield json.dumps(recipe, separators=(",", ":"), default=str) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="recipes-{user_id}.ndjson"'},
+    )
+
 
-    existing_doc = get_recipe_from_firebase(user_id, post_id)
-    if not existing_doc:
+def import_recipes():
+    """
+    Bulk-create recipes from an NDJSON body (one recipe object per line).
+    Query params: userId. Lines are parsed as the body streams in and
+    written in batches of up to 249 (two writes each, with the summary). Returns 200 with {"imported",
+    "failed", "errors": [{"line", "error"}], "seconds",
+    "recipesPerSecond"}, even if some lines failed.
+    """
+    user_id = authenticated_user_id(request.args.get("userId"))
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+    report = import_recipes_to_firebase(user_id, request.stream)
+    return jsonify(report), 200
+
+
+def set_recipe_like(post_id, liked):
+    """
+    POST (like) / DELETE (unlike) a recipe. Expects:
+      - userId: the recipe's owner (JSON body for POST, query for DELETE)
+      - viewerId: the user liking or unliking it (the token's user, when
+        a bearer token is sent)
+    Idempotent: liking twice counts once. Returns {"postId", "liked", "likes"}.
+    """
+    # DELETE bodies aren't reliably sent, so unlike uses query params
+    data = (request.get_json(silent=True) or {}) if liked else request.args
+    user_id = data.get("userId")
+    viewer_id = authenticated_user_id(data.get("viewerId"))
+    if not user_id or not viewer_id:
+        return jsonify({"error": "Missing userId or viewerId"}), 400
+    if not get_recipe_from_firebase(user_id, post_id):
         return jsonify({"error": "Recipe not found"}), 404
 
-    updated_data = {}
-    fields = [
-        "title",
-        "description",
-        "cookingTime",
-        "difficulty",
-        "servings",
-        "ingredients",
-        "instructions",
-    ]
-    for f in fields:
-        if f in data:
-            updated_data[f] = data[f]
+    if liked:
+        like_recipe(user_id, post_id, viewer_id)
+    else:
+        unlike_recipe(user_id, post_id, viewer_id)
+    likes = get_like_counts([(user_id, post_id)])[0]
+    return jsonify({"postId": post_id, "liked": liked, "likes": likes}), 200
 
-    # Remove images
-    remove_ids_str = data.get("removePublicIds")
-    remove_ids = []
-    if remove_ids_str:
-        remove_ids = [rid.strip()
-                      for rid in remove_ids_str.split(",") if rid.strip()]
 
-    current_images = existing_doc.get("imageList", [])
-    remaining_images = []
-    for img_obj in current_images:
-        if img_obj["publicId"] in remove_ids:
-            delete_image_from_cloudinary(img_obj["publicId"])
-        else:
-            remaining_images.append(img_obj)
+def search_recipes():
+    """
+    Query params:
+      - q (required): free text matched against title, description,
+        ingredients and instructions
+      - userId: only search this user's recipes
+      - limit: max results (default 20)
+    Returns {"results": [{"userId", "postId", "title", "score"}, ...]},
+    best match first.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = search_recipe_index(query, limit=limit, user_id=request.args.get("userId"))
+    return jsonify({"results": results}), 200
 
-    # Add new images
+
+def match_recipes_by_ingredients():
+    """
+    "What can I cook": recipes ranked by how many of their ingredients
+    the user has. Query params:
+      - ingredients (required): comma-separated, e.g. eggs,flour,milk
+      - maxMissing: leave out recipes missing more than this many
+      - limit: max results (default 20)
+    Returns {"results": [{"userId", "postId", "title", "coverage",
+    "missing", "missingIngredients"}, ...]}, best coverage first.
+    """
+    have = [i for i in request.args.get("ingredients", "").split(",") if i.strip()]
+    if not have:
+        return jsonify({"error": "Missing ingredients"}), 400
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    max_missing = request.args.get("maxMissing")
+    if max_missing:
+        if not max_missing.isdigit():
+            return jsonify({"error": "Invalid maxMissing"}), 400
+        max_missing = int(max_missing)
+    else:
+        max_missing = None
+
+    results = match_recipes(have, limit=limit, max_missing=max_missing)
+    return jsonify({"results": results}), 200
+
+
+def update_recipe(post_id):
+    user_id, updated_data, remove_ids, image_files = parse_recipe_update()
+    if not user_id:
+        return jsonify({"error": "Missing userId"}), 400
+
+    if not updated_data and not remove_ids and not image_files:
+        # Nothing to change; just hand back the current recipe.
+        existing_doc = get_recipe_from_firebase(user_id, post_id)
+        if not existing_doc:
+            return jsonify({"error": "Recipe not found"}), 404
+        return jsonify({"message": "Recipe updated", "recipe": existing_doc}), 200
+
+    if not remove_ids and not image_files:
+        try:
+            updated_recipe = update_recipe_in_firebase(user_id, post_id, updated_data)
+        except RecipeConflict:
+            return recipe_conflict()
+        if not updated_recipe:
+            return jsonify({"error": "Recipe not found"}), 404
+        return jsonify({"message": "Recipe updated", "recipe": updated_recipe}), 200
+
+    # Upload new images before the transaction so it never waits on Cloudinary
     new_images = []
     if image_files:
-        new_images = upload_images_to_cloudinary(image_files)
-
-    updated_data["imageList"] = remaining_images + new_images
+        try:
+            new_images = upload_images_to_cloudinary(image_files)
+        except ImageUploadError as e:
+            return image_upload_failed(e)
 
-    updated_recipe = update_recipe_in_firebase(user_id, post_id, updated_data)
+    # If the write doesn't happen, the new uploads are orphaned; clean them up
+    try:
+        updated_recipe, removed_images = update_recipe_images_in_firebase(
+            user_id, post_id, updated_data, remove_ids, new_images)
+    except RecipeConflict:
+        delete_images_from_cloudinary([img["publicId"] for img in new_images])
+        return recipe_conflict()
     if not updated_recipe:
-        return jsonify({"error": "Update failed"}), 404
+        delete_images_from_cloudinary([img["publicId"] for img in new_images])
+        return jsonify({"error": "Recipe not found"}), 404
+
+    # Only destroy images once the recipe no longer references them
+    delete_images_from_cloudinary([img["publicId"] for img in removed_images])
 
     return jsonify({"message": "Recipe updated", "recipe": updated_recipe}), 200
 
 
 def delete_recipe(post_id):
     # Use query parameter for DELETE to avoid unsupported media type issues
-    user_id = request.args.get("userId")
+    user_id = authenticated_user_id(request.args.get("userId"))
     if not user_id:
         return jsonify({"error": "Missing userId"}), 400
     deleted = delete_recipe_from_firebase(user_id, post_id)
@@ -1,20 +1,21 @@
 from flask import request, jsonify
-from werkzeug.security import generate_password_hash
-from ..services.database_interface import add_user_to_firebase, get_user_by_username, get_user_by_email
+from ..services.database_interface import add_user_to_firebase, check_user_available, UserExists
+from ..services.hashing import get_password_hasher
 from ..models.user import User
 import re
 
-def register_user():
+def parse_registration():
+    """(user_data, None) for a valid registration body, else (None, error response)."""
     if request.content_type != 'application/json':
-        return jsonify({"error": "Invalid JSON format"}), 400
+        return None, (jsonify({"error": "Invalid JSON format"}), 400)
 
     try:
         user_data = request.get_json()
     except:
-        return jsonify({"error": "Invalid JSON format"}), 400
+        return None, (jsonify({"error": "Invalid JSON format"}), 400)
 
     if not user_data:
-        return jsonify({"error": "No data provided."}), 400
+        return None, (jsonify({"error": "No data provided."}), 400)
 
     # Required fields
     username = user_data.get("username")
@@ -22,25 +23,25 @@ def register_user():
     password = user_data.get("password")
 
     if not username or not email or not password:
-        return jsonify({"error": "Missing required fields"}), 400
+        return None, (jsonify({"error": "Missing required fields"}), 400)
 
     # Email validation
     if not User.validate_email(email):
-        return jsonify({"error": "Invalid email format"}), 400
-
-    # Check for existing username or email
-    existing_user = get_user_by_username(username)
-    if existing_user:
-        return jsonify({"error": "User already exists"}), 409
-
-    existing_email = get_user_by_email(email)
-    if existing_email:
-        return jsonify({"error": "Email already exists"}), 409
+        return None, (jsonify({"error": "Invalid email format"}), 400)
 
     preferences = user_data.get("preferences", [])
     if not isinstance(preferences, list):
-        return jsonify({"error": "Invalid preferences format"}), 400
+        return None, (jsonify({"error": "Invalid preferences format"}), 400)
+
+    return user_data, None
 
+
+def build_user_dict(user_data, password_hash):
+    """The users/ document for a parsed registration."""
+    username = user_data["username"]
+    email = user_data["email"]
+    password = user_data["password"]
+    preferences = user_data.get("preferences", [])
     country = user_data.get("country", "")
 
     new_user = User(
@@ -52,7 +53,8 @@ def register_user():
         friend_list=[],
         created_recipes=[],
         saved_recipes= [],
-        followers = [] 
+        followers = [],
+        password_hash=password_hash
     )
 
     # Convert to dict for Firestore
@@ -67,12 +69,37 @@ def register_user():
         "saved_recipes": new_user.saved_recipes,
         "followers":new_user.followers
     }
+    return user_dict
+
+
+def user_exists(error):
+    if error.field == "email":
+        return jsonify({"error": "Email already exists"}), 409
+    return jsonify({"error": "User already exists"}), 409
 
-    # This now returns: {"message": "...", "userId": "..."}
-    result = add_user_to_firebase(user_dict)
 
+def registered(user_dict, result):
     return jsonify({
         "message": "User registered successfully",
         "user": user_dict,               # includes the final doc fields
         "userId": result["userId"]       # for convenience in your client
     }), 201
+
+
+def register_user():
+    user_data, error = parse_registration()
+    if error is not None:
+        return error
+
+    # This now returns: {"message": "...", "userId": "..."}
+    # A duplicate is turned away before the (slow) hash; uniqueness is
+    # checked again inside the transaction that creates the user
+    try:
+        check_user_available(user_data["username"], user_data["email"])
+        user_dict = build_user_dict(
+            user_data, get_password_hasher().hash_password(user_data["password"]))
+        result = add_user_to_firebase(user_dict)
+    except UserExists as e:
+        return user_exists(e)
+
+    return registered(user_dict, result)
@@ -0,0 +1,27 @@
+from flask import request, jsonify
+from ..services.pagination import parse_page_size
+from ..services.auth_tokens import authenticated_user_id
+from ..services.recommendations import recommend_for_user, RecommendationsUnavailable
+
+
+def get_recommendations(user_id):
+    """
+    Recipes by other users that match this user's preferences and saved
+    recipes, best first. Query params:
+      - limit: max results (default 20)
+    Returns {"results": [{"userId", "postId", "title", "score"}, ...]};
+    empty if the user has no preferences or saved recipes yet.
+    """
+    user_id = authenticated_user_id(user_id)
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = recommend_for_user(user_id, limit=limit)
+    except RecommendationsUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    if results is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify({"results": results}), 200
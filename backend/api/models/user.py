@@ -2,9 +2,10 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import re
 
 class User:
-    def __init__(self, username, email, password, country, preferences, friend_list, created_recipes, saved_recipes, followers):
+    def __init__(self, username, email, password, country, preferences, friend_list, created_recipes, saved_recipes, followers, password_hash=None):
         self.username = username
-        self.password_hash = generate_password_hash(password)
+        # Pass password_hash when it was already computed (e.g. by the hashing pool)
+        self.password_hash = password_hash or generate_password_hash(password)
         self.email = email
         self.country = country
         self.preferences = preferences
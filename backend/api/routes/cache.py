@@ -0,0 +1,12 @@
+from flask import Blueprint
+from ..controllers.cache import get_cache_stats
+
+cache_blueprint = Blueprint("cache", __name__)
+
+
+@cache_blueprint.route("/cache/stats", methods=["GET"])
+def cache_stats_route():
+    """
+    Endpoint: GET /api/cache/stats
+    """
+    return get_cache_stats()
@@ -0,0 +1,12 @@
+from flask import Blueprint
+from ..controllers.feed import get_feed
+
+feed_blueprint = Blueprint("feed", __name__)
+
+
+@feed_blueprint.route("/feed", methods=["GET"])
+def feed_route():
+    """
+    Endpoint: GET /api/feed?limit=&cursor=&fields=
+    """
+    return get_feed()
@@ -0,0 +1,12 @@
+from flask import Blueprint
+from ..controllers.health import readiness
+
+health_blueprint = Blueprint("health", __name__)
+
+
+@health_blueprint.route("/ready", methods=["GET"])
+def ready():
+    """
+    Endpoint: GET /api/ready
+    """
+    return readiness()
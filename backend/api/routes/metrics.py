@@ -0,0 +1,12 @@
+from flask import Blueprint
+from ..controllers.metrics import get_metrics
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+
+@metrics_blueprint.route("/metrics", methods=["GET"])
+def metrics_route():
+    """
+    Endpoint: GET /metrics
+    """
+    return get_metrics()
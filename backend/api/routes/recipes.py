@@ -5,6 +5,12 @@ from ..controllers.recipes import (
     update_recipe,
     delete_recipe,
     get_all_recipes,
+    get_recipe_status,
+    search_recipes,
+    match_recipes_by_ingredients,
+    set_recipe_like,
+    export_recipes,
+    import_recipes,
 )
 
 recipes_blueprint = Blueprint("recipes", __name__)
@@ -15,11 +21,46 @@ def create_recipe_route():
     return create_recipe()
 
 
+@recipes_blueprint.route("/recipes/export", methods=["GET"])
+def export_recipes_route():
+    return export_recipes()
+
+
+@recipes_blueprint.route("/recipes/import", methods=["POST"])
+def import_recipes_route():
+    return import_recipes()
+
+
+@recipes_blueprint.route("/recipes/search", methods=["GET"])
+def search_recipes_route():
+    return search_recipes()
+
+
+@recipes_blueprint.route("/recipes/match", methods=["GET"])
+def match_recipes_route():
+    return match_recipes_by_ingredients()
+
+
 @recipes_blueprint.route("/recipes/<post_id>", methods=["GET"])
 def get_recipe_route(post_id):
     return get_recipe(post_id)
 
 
+@recipes_blueprint.route("/recipes/<post_id>/status", methods=["GET"])
+def get_recipe_status_route(post_id):
+    return get_recipe_status(post_id)
+
+
+@recipes_blueprint.route("/recipes/<post_id>/like", methods=["POST"])
+def like_recipe_route(post_id):
+    return set_recipe_like(post_id, liked=True)
+
+
+@recipes_blueprint.route("/recipes/<post_id>/like", methods=["DELETE"])
+def unlike_recipe_route(post_id):
+    return set_recipe_like(post_id, liked=False)
+
+
 @recipes_blueprint.route("/recipes/<post_id>", methods=["PUT"])
 def update_recipe_route(post_id):
     return update_recipe(post_id)
@@ -0,0 +1,12 @@
+from flask import Blueprint
+from ..controllers.users import get_recommendations
+
+users_blueprint = Blueprint("users", __name__)
+
+
+@users_blueprint.route("/users/<user_id>/recommendations", methods=["GET"])
+def recommendations_route(user_id):
+    """
+    Endpoint: GET /api/users/<user_id>/recommendations?limit=
+    """
+    return get_recommendations(user_id)
@@ -0,0 +1,219 @@
+"""
+Bearer-token authentication.
+
+Clients send `Authorization: Bearer <ID token>`: a Firebase ID token with
+the firestore backend, one from MemoryBackend.create_id_token() with the
+memory backend. Firebase tokens are verified locally against Google's
+public signing keys (PublicKeyCache): fetched once, kept as long as
+their Cache-Control allows and refreshed in the background shortly
+before that, so no request waits on a key fetch once warm. Verified
+claims are kept in a bounded LRU (AUTH_TOKEN_CACHE_SIZE) until the token
+expires, so repeat requests with the same token skip the signature
+check too.
+
+A request with a valid token is made by the token's user: the `userId`
+claim that /api/login puts in its custom token (or the uid, for tokens
+without one). authenticated_user_id() hands that to the controllers in
+place of the userId/viewerId parameter; a parameter naming a different
+user is a 403. A bad or expired token is a 401. Requests without a token
+still trust the parameter, unless AUTH_REQUIRED is on: then everything
+but registration, login, readiness and metrics needs a token (CORS
+preflights and unknown URLs excepted).
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.request
+
+from flask import current_app, g, jsonify, request
+
+from .cache import LRUCache
+from .metrics import timed
+
+FIREBASE_KEYS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+# Refresh the keys this many seconds before the cached copy expires.
+KEY_REFRESH_MARGIN = 300
+# Used when the key response has no max-age.
+DEFAULT_KEY_MAX_AGE = 3600
+CLOCK_SKEW_SECONDS = 5
+
+# Reachable without a token even when AUTH_REQUIRED is on.
+PUBLIC_ENDPOINTS = frozenset({
+    "register.register", "login.login", "health.ready", "metrics.metrics_route",
+})
+
+
+class InvalidToken(Exception):
+    """The bearer token is missing (where required), malformed, forged or expired."""
+
+
+class UserMismatch(Exception):
+    """A userId/viewerId parameter names someone other than the token's user."""
+
+
+def fetch_public_keys(url):
+    """({key id: PEM certificate}, max-age seconds) from a key endpoint."""
+    with timed("firebase_auth", "public_keys"):
+        with urllib.request.urlopen(url, timeout=10) as response:
+            keys = json.loads(response.read())
+            cache_control = response.headers.get("Cache-Control", "")
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return keys, int(match.group(1)) if match else DEFAULT_KEY_MAX_AGE
+
+
+class PublicKeyCache:
+    """
+    Signing keys from `url`, cached for their max-age. A lookup within
+    `refresh_margin` seconds of expiry refreshes them on a background
+    thread and returns the cached keys meanwhile; only the first lookup,
+    or one after the keys actually expired, waits for the fetch.
+    """
+
+    def __init__(self, url=FIREBASE_KEYS_URL, fetch=fetch_public_keys,
+                 refresh_margin=KEY_REFRESH_MARGIN):
+        self.url = url
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._keys = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.time()
+        if self._keys is None or now >= self._expires:
+            with self._lock:
+                if self._keys is None or time.time() >= self._expires:
+                    self._refresh()
+        elif now >= self._expires - self.refresh_margin and self._lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background,
+                             name="auth-key-refresh", daemon=True).start()
+        return self._keys
+
+    def _refresh(self):
+        keys, max_age = self.fetch(self.url)
+        self._keys, self._expires = keys, time.time() + max_age
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        except Exception:
+            # The cached keys are still good until they expire; the first
+            # lookup after that fetches in the foreground and raises.
+            pass
+        finally:
+            self._lock.release()
+
+
+class FirebaseTokenVerifier:
+    """Checks a Firebase ID token's signature and claims without a network call."""
+
+    def __init__(self, project_id, keys=None):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.keys = keys or PublicKeyCache()
+
+    def verify(self, token):
+        from google.auth import jwt
+
+        try:
+            if jwt.decode_header(token).get("alg") != "RS256":
+                raise InvalidToken("Unexpected token algorithm")
+            claims = jwt.decode(token, certs=self.keys.get(), audience=self.project_id,
+                                clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        except ValueError as e:
+            raise InvalidToken(str(e))
+        if claims.get("iss") != self.issuer:
+            raise InvalidToken("Unexpected token issuer")
+        if not claims.get("sub"):
+            raise InvalidToken("Token has no subject")
+        return claims
+
+
+class TokenAuthenticator:
+    """Verifies bearer tokens through the storage backend, caching the claims."""
+
+    def __init__(self, backend, cache_size=10000, required=False):
+        self.backend = backend
+        self.required = required
+        self.cache = LRUCache(max_entries=cache_size, ttl=0)
+
+    def claims(self, token):
+        # Keyed by digest so the cache doesn't hold on to usable tokens.
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        claims = self.backend.verify_id_token(token)
+        ttl = int(claims["exp"] - time.time())
+        if ttl > 0:
+            self.cache.set(key, json.dumps(claims), ttl=ttl)
+        return claims
+
+
+def _bearer_token():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def _authenticate():
+    authenticator = get_authenticator()
+    token = _bearer_token()
+    if token is None:
+        # Preflights carry no credentials, and an unknown URL should be a
+        # 404, so neither needs a token.
+        if (authenticator.required and request.method != "OPTIONS"
+                and request.endpoint is not None
+                and request.endpoint not in PUBLIC_ENDPOINTS):
+            raise InvalidToken("Missing bearer token")
+        return
+    claims = authenticator.claims(token)
+    g.auth_claims = claims
+    g.auth_user_id = claims.get("userId") or claims["sub"]
+
+
+def authenticated_user_id(claimed=None):
+    """
+    Who is making the request: the token's user when a bearer token was
+    sent (UserMismatch if `claimed` names someone else), otherwise
+    `claimed`, the request's own userId/viewerId parameter.
+    """
+    user_id = g.get("auth_user_id")
+    if user_id is None:
+        return claimed
+    if claimed and claimed != user_id:
+        raise UserMismatch(claimed)
+    return user_id
+
+
+def _invalid_token(error):
+    response = jsonify({"error": "Invalid or missing token"})
+    response.headers["WWW-Authenticate"] = 'Bearer error="invalid_token"'
+    return response, 401
+
+
+def _user_mismatch(error):
+    return jsonify({"error": "userId does not match the token"}), 403
+
+
+def init_auth(app):
+    authenticator = TokenAuthenticator(
+        app.extensions["storage"],
+        cache_size=app.config["AUTH_TOKEN_CACHE_SIZE"],
+        required=app.config["AUTH_REQUIRED"],
+    )
+    app.before_request(_authenticate)
+    app.register_error_handler(InvalidToken, _invalid_token)
+    app.register_error_handler(UserMismatch, _user_mismatch)
+    app.extensions["auth"] = authenticator
+    return authenticator
+
+
+def get_authenticator():
+    return current_app.extensions["auth"]
@@ -0,0 +1,231 @@
+"""
+Read-through cache for recipe reads.
+
+create_app() builds one from RECIPE_CACHE_BACKEND:
+  - "memory" (default): bounded in-process LRU with TTL. Each worker has
+                        its own, so other workers may serve a stale entry
+                        for up to RECIPE_CACHE_TTL seconds after a write.
+  - "redis":            shared between workers, via RECIPE_CACHE_URL
+  - "none":             caching disabled
+
+Values are stored JSON-encoded, so callers always get a fresh copy and
+the size limit (RECIPE_CACHE_MAX_BYTES) tracks the serialized size.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class CacheBackend:
+    """
+    Interface every cache backend implements. Values are JSON strings;
+    get() returns None on a miss.
+    """
+
+    name = None
+    enabled = True
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class NullCache(CacheBackend):
+    name = "none"
+    enabled = False
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process LRU bounded by entry count and (optionally) total bytes.
+    Expired entries are dropped lazily on lookup and evicted first when
+    they reach the LRU end.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries=1024, max_bytes=0, ttl=60):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        size = len(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxEntries": self.max_entries,
+                "maxBytes": self.max_bytes,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            })
+        return stats
+
+
+class RedisCache(CacheBackend):
+    """
+    Shared cache so every worker sees the same entries and invalidations.
+    Needs the optional `redis` package; hit/miss counters are per process.
+    """
+
+    name = "redis"
+
+    def __init__(self, url, ttl=60, prefix="feastly:"):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "RECIPE_CACHE_BACKEND=redis requires the 'redis' package."
+            )
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode("utf-8")
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+def init_recipe_cache(app):
+    name = app.config["RECIPE_CACHE_BACKEND"]
+    ttl = app.config["RECIPE_CACHE_TTL"]
+    if name == "memory":
+        cache = LRUCache(
+            max_entries=app.config["RECIPE_CACHE_MAX_ENTRIES"],
+            max_bytes=app.config["RECIPE_CACHE_MAX_BYTES"],
+            ttl=ttl,
+        )
+    elif name == "redis":
+        cache = RedisCache(app.config["RECIPE_CACHE_URL"], ttl=ttl)
+    elif name == "none":
+        cache = NullCache()
+    else:
+        raise ValueError(f"Unknown RECIPE_CACHE_BACKEND '{name}'.")
+    app.extensions["recipe_cache"] = cache
+    return cache
+
+
+def get_recipe_cache():
+    return current_app.extensions["recipe_cache"]
+
+
+def cache_get(cache, key):
+    value = cache.get(key)
+    return json.loads(value) if value is not None else None
+
+
+def cache_set(cache, key, value, ttl=None):
+    cache.set(key, json.dumps(value, separators=(",", ":"), default=str), ttl)
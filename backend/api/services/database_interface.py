@@ -1,12 +1,108 @@
-import firebase_admin
-from firebase_admin import firestore
+from urllib.parse import quote
+from flask import current_app
+from .storage import get_async_db, get_db
+
+
+class UserExists(Exception):
+    """The username or email is already reserved; `field` says which."""
+
+    def __init__(self, field):
+        super().__init__(f"{field} already exists")
+        self.field = field
+
+
+def normalize_username(username):
+    return username.strip().lower()
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def _reservation_id(key):
+    # Document IDs can't contain '/', so escape anything unusual.
+    return quote(key, safe="@.+-_")
+
+
+def _reservation_refs(db, username, email):
+    return (
+        db.collection('usernames').document(_reservation_id(normalize_username(username))),
+        db.collection('emails').document(_reservation_id(normalize_email(email))),
+    )
+
+
+def _taken_field(username_ref, email_ref, snapshots):
+    taken = {snap.reference.path for snap in snapshots if snap.exists}
+    if username_ref.path in taken:
+        return "username"
+    if email_ref.path in taken:
+        return "email"
+    return None
+
+
+def _legacy_taken_field(db, username, email, transaction=None):
+    """
+    Which of username/email an account from before reservation docs
+    already uses (found only by a field query), while LEGACY_USER_LOOKUP
+    is on; else None.
+    """
+    if not _legacy_lookup():
+        return None
+    for field, value in (("username", username), ("email", email)):
+        query = db.collection('users').where(field, '==', value).limit(1)
+        users = transaction.get(query) if transaction is not None else query.stream()
+        if any(True for _ in users):
+            return field
+    return None
+
+
+def check_user_available(username, email):
+    """
+    Raise UserExists if the username or email is taken. Registration runs
+    this cheap check before it hashes the password, so a duplicate doesn't
+    cost a hash; add_user_to_firebase() still checks again atomically.
+    """
+    db = get_db()
+    username_ref, email_ref = _reservation_refs(db, username, email)
+    taken = (_taken_field(username_ref, email_ref, db.get_all([username_ref, email_ref]))
+             or _legacy_taken_field(db, username, email))
+    if taken:
+        raise UserExists(taken)
+
+
+async def check_user_available_async(username, email):
+    """check_user_available() through the async client."""
+    db = get_async_db()
+    username_ref, email_ref = _reservation_refs(db, username, email)
+    snapshots = [snap async for snap in db.get_all([username_ref, email_ref])]
+    taken = _taken_field(username_ref, email_ref, snapshots)
+    if not taken and _legacy_lookup():
+        for field, value in (("username", username), ("email", email)):
+            query = db.collection('users').where(field, '==', value).limit(1)
+            if [user async for user in query.stream()]:
+                taken = field
+                break
+    if taken:
+        raise UserExists(taken)
+
 
 def add_user_to_firebase(user_data):
     """
     Creates a new user doc in the 'users' collection with a random doc ID.
     Also stores that docRef's ID in the doc under 'userId'.
+
+    Uniqueness is enforced by reservation docs keyed by the normalized
+    username and email (usernames/<name>, emails/<addr>, each holding the
+    userId). One transaction point-reads both reservations in a single
+    batch and, if both are free, creates them together with the user doc,
+    so two concurrent registrations can't both claim a name. While
+    LEGACY_USER_LOOKUP is on, the transaction also queries users/ by
+    field, since accounts from before reservations have none.
+    Raises UserExists if either is taken.
     """
-    db = firestore.client()
+    from firebase_admin import firestore
+
+    db = get_db()
     users_ref = db.collection('users')
 
     # Generate a new doc reference with a random ID
@@ -16,43 +112,163 @@ def add_user_to_firebase(user_data):
     # Add userId to the user_data dict so it's also stored in the doc
     user_data["userId"] = user_id
 
-    # Write the doc to Firestore
-    doc_ref.set(user_data)
+    username_ref, email_ref = _reservation_refs(db, user_data["username"], user_data["email"])
+
+    @firestore.transactional
+    def reserve_and_create(transaction):
+        taken = (_taken_field(username_ref, email_ref,
+                              transaction.get_all([username_ref, email_ref]))
+                 or _legacy_taken_field(db, user_data["username"], user_data["email"],
+                                        transaction))
+        if taken:
+            raise UserExists(taken)
+        transaction.create(username_ref, {"userId": user_id})
+        transaction.create(email_ref, {"userId": user_id})
+        transaction.create(doc_ref, user_data)
+
+    reserve_and_create(db.transaction())
 
     return {"message": "User added successfully", "userId": user_id}
 
 
-def get_user_by_username(username):
+async def add_user_async(user_data):
+    """
+    add_user_to_firebase() through the async client. The two reservations
+    and the user doc are created in one batch: a create fails if its
+    document exists, and the batch is atomic, so this claims the name as
+    safely as the transaction does, in one round trip instead of three.
+    Only when it fails is a reservation read to tell which was taken.
+    Accounts from before reservations are left to the
+    check_user_available_async() registration runs first.
     """
-    Query Firestore for a user doc with the given 'username'.
-    Returns the first match as a dict, or None if not found.
+    from google.api_core import exceptions
+
+    db = get_async_db()
+    doc_ref = db.collection('users').document()
+    user_id = doc_ref.id
+    user_data["userId"] = user_id
+
+    username_ref, email_ref = _reservation_refs(db, user_data["username"], user_data["email"])
+    batch = db.batch()
+    batch.create(username_ref, {"userId": user_id})
+    batch.create(email_ref, {"userId": user_id})
+    batch.create(doc_ref, user_data)
+    try:
+        await batch.commit()
+    except exceptions.AlreadyExists:
+        raise UserExists("username" if (await username_ref.get()).exists else "email")
+
+    return {"message": "User added successfully", "userId": user_id}
+
+
+def update_user_in_firebase(user_id, fields):
+    """
+    Update only the given fields on users/<user_id>.
     """
-    db = firestore.client()
-    users_ref = db.collection('users').where('username', '==', username).limit(1)
+    db = get_db()
+    db.collection('users').document(user_id).update(fields)
+
+
+def _get_user_by_reservation(reservation_ref):
+    reservation = reservation_ref.get()
+    if not reservation.exists:
+        return None
+    user = get_db().collection('users').document(reservation.get('userId')).get()
+    return user.to_dict() if user.exists else None
+
+
+async def update_user_async(user_id, fields):
+    await get_async_db().collection('users').document(user_id).update(fields)
+
+
+def _legacy_lookup():
+    # Accounts created before reservation docs existed are only found by
+    # a field query. Once backfill_user_reservations() has run, turning
+    # LEGACY_USER_LOOKUP off spares unknown names (every failed login)
+    # that query.
+    return current_app.config["LEGACY_USER_LOOKUP"]
+
+
+def _get_user_by_field(field, value):
+    if not _legacy_lookup():
+        return None
+    db = get_db()
+    users_ref = db.collection('users').where(field, '==', value).limit(1)
     users = users_ref.stream()
     for user in users:
         return user.to_dict()
     return None
 
-def get_user_by_email(email):
+
+def get_user_by_username(username):
     """
-    Query Firestore for a user doc with the given 'email'.
-    Returns the first match as a dict, or None if not found.
+    Look up a user by username through usernames/<normalized name>.
+    Returns the user doc as a dict, or None if not found.
     """
-    db = firestore.client()
-    users_ref = db.collection('users').where('email', '==', email).limit(1)
-    users = users_ref.stream()
-    for user in users:
+    db = get_db()
+    username_ref = db.collection('usernames').document(
+        _reservation_id(normalize_username(username)))
+    return _get_user_by_reservation(username_ref) or _get_user_by_field('username', username)
+
+
+async def get_user_by_username_async(username):
+    """get_user_by_username() through the async client."""
+    db = get_async_db()
+    reservation = await db.collection('usernames').document(
+        _reservation_id(normalize_username(username))).get()
+    if reservation.exists:
+        user = await db.collection('users').document(reservation.get('userId')).get()
+        if user.exists:
+            return user.to_dict()
+    if not _legacy_lookup():
+        return None
+    query = db.collection('users').where('username', '==', username).limit(1)
+    async for user in query.stream():
         return user.to_dict()
     return None
 
 
+def get_user_by_email(email):
+    """
+    Look up a user by email through emails/<normalized address>.
+    Returns the user doc as a dict, or None if not found.
+    """
+    db = get_db()
+    email_ref = db.collection('emails').document(
+        _reservation_id(normalize_email(email)))
+    return _get_user_by_reservation(email_ref) or _get_user_by_field('email', email)
+
+
+def backfill_user_reservations():
+    """
+    Create missing usernames/ and emails/ reservations for existing users.
+    Safe to re-run; returns how many reservation docs were written.
+    """
+    db = get_db()
+    written = 0
+    batch = db.batch()
+    for user in db.collection('users').stream():
+        data = user.to_dict()
+        if not data.get('username') or not data.get('email'):
+            continue
+        for ref in _reservation_refs(db, data['username'], data['email']):
+            if not ref.get().exists:
+                batch.set(ref, {"userId": user.id})
+                written += 1
+                if len(batch) >= 500:
+                    batch.commit()
+                    batch = db.batch()
+    if len(batch):
+        batch.commit()
+    return written
+
+
 def add_recipe_card_to_firebase(recipe_dict):
     """
     (Unchanged) Add a new recipe to Firestore's 'recipes' collection.
     If you decide to store them under users/<userId>/created_recipes, you'd modify here.
     """
-    db = firestore.client()
+    db = get_db()
     recipes_ref = db.collection("recipes")
     new_recipe_ref = recipes_ref.add(recipe_dict)
     return new_recipe_ref[1].id  # Return the ID of the newly created recipe
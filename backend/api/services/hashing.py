@@ -0,0 +1,101 @@
+"""
+Password hashing off the request thread.
+
+generate_password_hash/check_password_hash are deliberately slow and hold
+the GIL, so doing them inline lets one burst of logins stall every other
+request in the worker. Here they run in a process pool instead:
+  - PASSWORD_HASH_WORKERS: pool size (0 = hash inline, e.g. for tests)
+  - PASSWORD_HASH_METHOD / PASSWORD_HASH_SALT_LENGTH: werkzeug hash params
+
+Workers are started with forkserver (spawn where that doesn't exist),
+never fork: the server already runs threads (like flusher, key refresh,
+image pool), and a forked child can deadlock on a lock one of them held.
+
+Stored hashes made with other parameters still verify; needs_rehash()
+tells login to upgrade them. The *_async methods await the same pool
+from the event loop (ASGI mode).
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def _mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, method="scrypt", salt_length=16):
+        self.workers = workers
+        self.method = method
+        self.salt_length = salt_length
+        self._pool = None
+        self._prefix = None
+        self._lock = threading.Lock()
+        if workers:
+            # Made with the app, before any of its threads start; worker
+            # processes are only spawned by the first hash.
+            self._executor()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=_mp_context())
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return self._executor().submit(fn, *args).result()
+
+    async def _run_async(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return await asyncio.wrap_future(self._executor().submit(fn, *args))
+
+    def hash_password(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify_password(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    async def hash_password_async(self, password):
+        return await self._run_async(generate_password_hash, password, self.method, self.salt_length)
+
+    async def verify_password_async(self, password_hash, password):
+        return await self._run_async(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash wasn't made with the current method/params."""
+        if self._prefix is None:
+            # werkzeug expands "scrypt" to "scrypt:32768:8:1" etc.; hash
+            # once to learn the full parameter string we should expect.
+            self._prefix = generate_password_hash("", self.method, 1).split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        method=app.config["PASSWORD_HASH_METHOD"],
+        salt_length=app.config["PASSWORD_HASH_SALT_LENGTH"],
+    )
+    app.extensions["password_hasher"] = hasher
+    return hasher
+
+
+def get_password_hasher():
+    return current_app.extensions["password_hasher"]
@@ -0,0 +1,137 @@
+"""
+HTTP-level caching for recipe reads: ETags, conditional GETs,
+Cache-Control and response compression.
+
+Recipe responses carry a weak ETag built from what they were read from:
+the document's update time for one recipe, the user's recipesVersion
+(bumped by every recipe write) for lists. The computed likes/isLiked
+fields change without a recipe write, so where a response has them the
+ETag also covers their values and whose isLiked it is (like_parts()),
+and the 304 comes after the likes are read. A response without them
+gets its 304 before the recipe is even read. A streamed list has no
+like values yet when its headers are sent, so it only carries an ETag
+when its projection leaves them out.
+
+Cache-Control is "private" (responses are per user) with
+HTTP_CACHE_MAX_AGE seconds of freshness, 0 meaning revalidate every time,
+and Vary: Authorization, since the bearer token decides who is asking.
+
+JSON responses of at least COMPRESS_MIN_BYTES are compressed with brotli
+(if the optional `brotli` package is installed and the client accepts it)
+or gzip. Streamed responses have no size up front; they're compressed
+chunk by chunk as they're written.
+"""
+import gzip
+import hashlib
+import zlib
+
+from flask import current_app, request
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson")
+
+
+def make_etag(*parts):
+    return hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:20]
+
+
+def shows_likes(fields=None):
+    """Whether a response with this `fields` projection has likes or isLiked."""
+    return not fields or "likes" in fields or "isLiked" in fields
+
+
+def like_parts(recipes, viewer_id, fields=None):
+    """
+    make_etag() parts for the likes/isLiked values on `recipes` (those a
+    `fields` projection kept), and whose isLiked they are.
+    """
+    if not shows_likes(fields):
+        return []
+    values = [(r.get("likes"), r.get("isLiked")) for r in recipes]
+    return [values, viewer_id if not fields or "isLiked" in fields else None]
+
+
+def not_modified(etag):
+    """A 304 response if the client's If-None-Match has `etag`, else None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag)
+
+
+def with_validators(response, etag=None):
+    """Cache-Control and Vary on a recipe response, plus its ETag if it has one."""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = (
+        f"private, max-age={current_app.config['HTTP_CACHE_MAX_AGE']}"
+    )
+    response.vary.add("Authorization")
+    return response
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _compress_stream(chunks, compress, flush):
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _compress_streamed(response, accepted):
+    brotli = _brotli()
+    if brotli is not None and accepted["br"]:
+        compressor = brotli.Compressor(quality=5)
+        compress, flush, encoding = compressor.process, compressor.finish, "br"
+    elif accepted["gzip"]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip framing
+        compress, flush, encoding = compressor.compress, compressor.flush, "gzip"
+    else:
+        return response
+    response.response = _compress_stream(response.response, compress, flush)
+    response.headers.pop("Content-Length", None)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def compress_response(response):
+    min_bytes = current_app.config["COMPRESS_MIN_BYTES"]
+    if (
+        not min_bytes
+        or response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed:
+        return _compress_streamed(response, request.accept_encodings)
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    accepted = request.accept_encodings
+    brotli = _brotli()
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_http_cache(app):
+    app.after_request(compress_response)
@@ -0,0 +1,342 @@
+"""
+Background image processing for IMAGE_PROCESSING_MODE=async.
+
+create_recipe writes the recipe right away with an empty imageList and
+imageStatus "pending", then hands the uploaded files to a job queue.
+Worker threads upload them and patch imageList/imageStatus on the recipe,
+so the HTTP request never waits on Cloudinary.
+
+Where queued jobs live is pluggable (IMAGE_JOB_BACKEND):
+  - "memory" (default): lost if the process dies
+  - "directory":        spooled to IMAGE_JOB_DIR and replayed on startup
+
+If processing a job fails outright, the recipe's imageStatus is set to
+failed and any images it had already uploaded are destroyed. If it can't
+even be queued, create_recipe deletes the pending recipe and fails.
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from io import BytesIO
+
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from .image_pool import ImageUploadError
+from .image_processing import get_image_preprocessor, read_upload
+from .recipe_database import (
+    upload_images_to_cloudinary,
+    update_recipe_images_in_firebase,
+    update_recipe_in_firebase,
+    delete_images_from_cloudinary,
+)
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+# A directory job being processed is renamed to <jobId>.claimed; one
+# spooled but not yet complete is <jobId>.tmp.
+CLAIM_SUFFIX = ".claimed"
+SPOOL_SUFFIX = ".tmp"
+# A claim older than this belongs to a process that died mid-job; the
+# next start-up replays the job.
+CLAIM_LEASE_SECONDS = 600
+
+
+class ImageJob:
+    """One recipe's worth of images waiting to be uploaded."""
+
+    def __init__(self, user_id, post_id, files, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.post_id = post_id
+        self.files = files  # list of (filename, content_type, bytes)
+        self.state = PENDING
+        self.completed = 0
+        self.failures = []
+        self.uploaded = []  # images uploaded but not yet on the recipe
+        self._lock = threading.Lock()
+
+    def mark_uploaded(self):
+        # Called from image pool threads as each upload finishes.
+        with self._lock:
+            self.completed += 1
+
+    @classmethod
+    def from_uploads(cls, user_id, post_id, file_list):
+        # The request body is gone once we respond, so copy the bytes now.
+        max_bytes = get_image_preprocessor().max_bytes
+        files = [(f.filename, f.content_type, read_upload(f, max_bytes)) for f in file_list]
+        return cls(user_id, post_id, files)
+
+    def file_storages(self):
+        return [
+            FileStorage(stream=BytesIO(data), filename=filename, content_type=content_type)
+            for filename, content_type, data in self.files
+        ]
+
+    def status(self):
+        status = {
+            "jobId": self.job_id,
+            "status": self.state,
+            "total": len(self.files),
+            "completed": self.completed,
+        }
+        if self.failures:
+            status["failures"] = self.failures
+        return status
+
+
+class JobBackend:
+    """Interface for where queued jobs are kept until a worker acks them."""
+
+    def put(self, job):
+        raise NotImplementedError
+
+    def get(self, timeout=None):
+        """Next job, or None if none arrived within `timeout` seconds."""
+        raise NotImplementedError
+
+    def ack(self, job):
+        raise NotImplementedError
+
+
+class MemoryJobBackend(JobBackend):
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, job):
+        self._queue.put(job)
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, job):
+        pass
+
+
+class DirectoryJobBackend(MemoryJobBackend):
+    """
+    Each job is written to <directory>/<jobId>/ before it is queued and
+    removed once processed, so jobs survive a restart and are replayed.
+    Every worker process replays the whole directory at start-up, so a
+    job is claimed (an atomic rename to <jobId>.claimed) before it is
+    processed: only the process whose rename succeeds runs it.
+    """
+
+    def __init__(self, directory, lease=CLAIM_LEASE_SECONDS):
+        super().__init__()
+        self.directory = directory
+        self.lease = lease
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(CLAIM_SUFFIX):
+                name = self._release_stale_claim(name)
+            if name is None or name.endswith(SPOOL_SUFFIX):
+                continue
+            job = self._load(name)
+            if job is not None:
+                super().put(job)
+
+    def _path(self, job_id, suffix=""):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def put(self, job):
+        spool_dir = self._path(job.job_id, SPOOL_SUFFIX)
+        os.makedirs(spool_dir, exist_ok=True)
+        meta = {"userId": job.user_id, "postId": job.post_id, "files": []}
+        for index, (filename, content_type, data) in enumerate(job.files):
+            with open(os.path.join(spool_dir, f"{index}.bin"), "wb") as f:
+                f.write(data)
+            meta["files"].append({"filename": filename, "contentType": content_type})
+        with open(os.path.join(spool_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        # Only complete jobs ever appear under their own name.
+        os.rename(spool_dir, self._path(job.job_id))
+        super().put(job)
+
+    def get(self, timeout=None):
+        while (job := super().get(timeout=timeout)) is not None:
+            if self._claim(job):
+                return job
+        return None
+
+    def _claim(self, job):
+        claimed = self._path(job.job_id, CLAIM_SUFFIX)
+        try:
+            os.rename(self._path(job.job_id), claimed)
+        except OSError:
+            # Another process claimed it (or already finished it).
+            return False
+        os.utime(claimed)
+        return True
+
+    def _release_stale_claim(self, name):
+        """Rename a claim older than the lease back to its job ID; None if it's live."""
+        job_id = name[:-len(CLAIM_SUFFIX)]
+        claimed = self._path(job_id, CLAIM_SUFFIX)
+        try:
+            if time.time() - os.path.getmtime(claimed) < self.lease:
+                return None
+            os.rename(claimed, self._path(job_id))
+        except OSError:
+            return None
+        return job_id
+
+    def ack(self, job):
+        shutil.rmtree(self._path(job.job_id, CLAIM_SUFFIX), ignore_errors=True)
+
+    def _load(self, job_id):
+        job_dir = os.path.join(self.directory, job_id)
+        try:
+            with open(os.path.join(job_dir, "meta.json")) as f:
+                meta = json.load(f)
+            files = []
+            for index, entry in enumerate(meta["files"]):
+                with open(os.path.join(job_dir, f"{index}.bin"), "rb") as f:
+                    files.append((entry["filename"], entry["contentType"], f.read()))
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return None
+        return ImageJob(meta["userId"], meta["postId"], files, job_id=job_id)
+
+
+class ImageJobQueue:
+    """Job backend plus the worker threads that drain it."""
+
+    def __init__(self, app, backend, workers=1):
+        self.app = app
+        self.backend = backend
+        self.jobs = {}  # jobId -> ImageJob, for live progress
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._run, name=f"image-job-{index}", daemon=True
+            )
+            thread.start()
+
+    def submit(self, job):
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._in_flight += 1
+        try:
+            self.backend.put(job)
+        except Exception:
+            with self._lock:
+                self.jobs.pop(job.job_id, None)
+                self._in_flight -= 1
+                self._idle.notify_all()
+            raise
+        return job
+
+    def job_for(self, post_id):
+        with self._lock:
+            for job in self.jobs.values():
+                if job.post_id == post_id:
+                    return job
+        return None
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted job has finished (used by tests)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def _run(self):
+        while True:
+            job = self.backend.get(timeout=1.0)
+            if job is None:
+                continue
+            with self._lock:
+                known = job.job_id in self.jobs
+                self.jobs.setdefault(job.job_id, job)
+                if not known:
+                    # Replayed from a durable backend after a restart.
+                    self._in_flight += 1
+            try:
+                with self.app.app_context():
+                    try:
+                        process_job(job)
+                    except Exception as e:
+                        self.app.logger.exception("Image job %s failed", job.job_id)
+                        fail_job(job, e)
+            finally:
+                self.backend.ack(job)
+                with self._lock:
+                    self.jobs.pop(job.job_id, None)
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+
+
+def process_job(job):
+    job.state = PROCESSING
+    try:
+        new_images = upload_images_to_cloudinary(
+            job.file_storages(), on_upload=job.mark_uploaded)
+        failures = []
+    except ImageUploadError as e:
+        new_images, failures = [], e.failures
+
+    job.state = FAILED if failures else DONE
+    job.failures = failures
+    image_status = {"status": job.state, "total": len(job.files),
+                    "completed": len(new_images)}
+    if failures:
+        image_status["failures"] = failures
+
+    job.uploaded = new_images
+    recipe, _ = update_recipe_images_in_firebase(
+        job.user_id, job.post_id, {"imageStatus": image_status}, new_images=new_images)
+    job.uploaded = []
+    if recipe is None and new_images:
+        # Recipe was deleted while we worked; don't leave orphans behind.
+        delete_images_from_cloudinary([img["publicId"] for img in new_images])
+
+
+def fail_job(job, error):
+    """
+    process_job() raised: destroy whatever it uploaded and mark the
+    recipe failed, so it isn't left "pending" for good.
+    """
+    job.state = FAILED
+    job.failures = [{"filename": None, "error": str(error) or type(error).__name__}]
+    uploaded, job.uploaded = job.uploaded, []
+    try:
+        delete_images_from_cloudinary([img["publicId"] for img in uploaded])
+    except Exception:
+        current_app.logger.exception("Could not destroy images of failed job %s", job.job_id)
+    image_status = {"status": FAILED, "total": len(job.files), "completed": 0,
+                    "failures": job.failures}
+    try:
+        update_recipe_in_firebase(job.user_id, job.post_id, {"imageStatus": image_status})
+    except Exception:
+        current_app.logger.exception("Could not mark recipe %s failed", job.post_id)
+
+
+def init_image_jobs(app):
+    if app.config["IMAGE_PROCESSING_MODE"] != "async":
+        return None
+    name = app.config["IMAGE_JOB_BACKEND"]
+    if name == "memory":
+        backend = MemoryJobBackend()
+    elif name == "directory":
+        backend = DirectoryJobBackend(app.config["IMAGE_JOB_DIR"])
+    else:
+        raise ValueError(f"Unknown IMAGE_JOB_BACKEND '{name}'.")
+    job_queue = ImageJobQueue(app, backend, workers=app.config["IMAGE_JOB_WORKERS"])
+    app.extensions["image_jobs"] = job_queue
+    return job_queue
+
+
+def get_image_jobs():
+    return current_app.extensions.get("image_jobs")
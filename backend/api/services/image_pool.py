@@ -0,0 +1,128 @@
+"""
+Bounded thread pool for image I/O.
+
+Uploads and deletes are network-bound, so running them side by side cuts
+an N-image request from N round trips to about N / IMAGE_IO_CONCURRENCY.
+One pool is shared by every request in the process, so a burst of uploads
+can't open an unbounded number of connections to Cloudinary.
+
+The ASGI mode uses upload_all_async()/destroy_all_async() instead: the
+same semantics, with each call awaited on the event loop rather than
+holding a pool thread.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+# Cloudinary's delete_resources accepts at most this many IDs per call.
+DESTROY_BATCH_SIZE = 100
+
+
+class ImageUploadError(Exception):
+    """
+    Some uploads in a batch failed. Uploads that did succeed have already
+    been destroyed; `failures` lists {"filename", "error"} for each failure.
+    """
+
+    def __init__(self, failures):
+        super().__init__(f"{len(failures)} image upload(s) failed")
+        self.failures = failures
+
+
+def init_image_pool(app):
+    pool = ThreadPoolExecutor(
+        max_workers=app.config["IMAGE_IO_CONCURRENCY"],
+        thread_name_prefix="image-io",
+    )
+    app.extensions["image_pool"] = pool
+    return pool
+
+
+def get_image_pool():
+    return current_app.extensions["image_pool"]
+
+
+def _upload_failures(files, outcomes):
+    return [
+        {"filename": getattr(file_obj, "filename", None), "error": str(e) or type(e).__name__}
+        for (file_obj, _), e in zip(files, outcomes) if isinstance(e, Exception)
+    ]
+
+
+def upload_all(backend, files, folder, timeout, on_complete=None):
+    """
+    Upload `files` concurrently and return their results in input order.
+    `files` is a list of (file_obj, public_id). Each upload gets `timeout`
+    seconds of its own. If any upload fails, the successful ones are
+    destroyed and ImageUploadError is raised. `on_complete`, if given, is
+    called after each successful upload (for progress reporting).
+    """
+    pool = get_image_pool()
+    futures = [
+        pool.submit(backend.upload_image, file_obj, public_id, folder, timeout=timeout)
+        for file_obj, public_id in files
+    ]
+    if on_complete is not None:
+        for future in futures:
+            future.add_done_callback(
+                lambda f: on_complete() if f.exception() is None else None
+            )
+
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append(future.result())
+        except Exception as e:
+            outcomes.append(e)
+    failures = _upload_failures(files, outcomes)
+    results = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+
+    if failures:
+        uploaded = [result["public_id"] for result in results]
+        if uploaded:
+            destroy_all(backend, uploaded)
+        raise ImageUploadError(failures)
+    return results
+
+
+async def upload_all_async(backend, files, folder, timeout):
+    """upload_all() for the event loop: every upload in flight at once."""
+    outcomes = await asyncio.gather(
+        *(backend.upload_image_async(file_obj, public_id, folder, timeout=timeout)
+          for file_obj, public_id in files),
+        return_exceptions=True,
+    )
+    failures = _upload_failures(files, outcomes)
+    if failures:
+        uploaded = [o["public_id"] for o in outcomes if not isinstance(o, BaseException)]
+        if uploaded:
+            await destroy_all_async(backend, uploaded)
+        raise ImageUploadError(failures)
+    return outcomes
+
+
+def _destroy_batches(public_ids):
+    public_ids = list(public_ids)
+    return [
+        public_ids[i:i + DESTROY_BATCH_SIZE]
+        for i in range(0, len(public_ids), DESTROY_BATCH_SIZE)
+    ]
+
+
+async def destroy_all_async(backend, public_ids):
+    return await asyncio.gather(
+        *(backend.destroy_images_async(batch) for batch in _destroy_batches(public_ids)))
+
+
+def destroy_all(backend, public_ids):
+    """
+    Destroy images in as few calls as possible: one multi-ID call per
+    DESTROY_BATCH_SIZE IDs, with the batches themselves run concurrently.
+    """
+    batches = _destroy_batches(public_ids)
+    if len(batches) <= 1:
+        return [backend.destroy_images(batch) for batch in batches]
+    pool = get_image_pool()
+    futures = [pool.submit(backend.destroy_images, batch) for batch in batches]
+    return [future.result() for future in futures]
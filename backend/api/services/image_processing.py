@@ -0,0 +1,211 @@
+"""
+Image preprocessing before upload.
+
+Phone photos arrive at 10+ MB and 4000+ px, far more than any screen of
+the app shows. Every uploaded file is read from the request in chunks
+up to IMAGE_MAX_BYTES (past that, ImageTooLarge: a 413 before anything
+is decoded or uploaded). It is then decoded, scaled down so its longer
+side is at most IMAGE_MAX_DIMENSION, and re-encoded as IMAGE_FORMAT
+("webp" or "jpeg") at IMAGE_QUALITY. Only that goes to Cloudinary.
+Re-encoding drops EXIF (GPS position included) and other metadata,
+after the EXIF orientation has been applied to the pixels; only the ICC
+color profile is kept, so wide-gamut photos keep their colors.
+  - IMAGE_PREPROCESS: "auto" (on if Pillow is installed), "true"
+    (Pillow required) or "false" (files are uploaded as sent)
+  - IMAGE_PREPROCESS_WORKERS: threads decoding and encoding side by
+    side (0 = inline). Pillow releases the GIL while it works on pixels.
+  - RECIPE_MAX_REQUEST_BYTES: cap on a whole recipe create/update body,
+    refused with a 413 before it is parsed (0 = no cap)
+
+Files Pillow can't decode, and animations, are uploaded unchanged, and
+so is an original the re-encoded copy isn't smaller than (e.g. a small,
+already optimized image), unless it had to be resized or carries
+metadata (EXIF, XMP) to strip.
+/metrics counts image_bytes_received_total and image_bytes_uploaded_total
+by outcome; the difference is what preprocessing saved.
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import current_app, jsonify, request
+from werkzeug.datastructures import FileStorage
+
+from .metrics import METRICS
+
+READ_CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+}
+
+
+class ImageTooLarge(Exception):
+    """An uploaded file is over IMAGE_MAX_BYTES, or too many pixels to decode."""
+
+    def __init__(self, filename, max_bytes):
+        super().__init__(f"{filename or 'image'} is too large")
+        self.filename = filename
+        self.max_bytes = max_bytes
+
+
+def read_upload(file_obj, max_bytes):
+    """A file's bytes, read in chunks; ImageTooLarge once past max_bytes (0 = no limit)."""
+    chunks, size = [], 0
+    while chunk := file_obj.read(READ_CHUNK_SIZE):
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise ImageTooLarge(getattr(file_obj, "filename", None), max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def downscale(data, max_dimension, image_format, quality):
+    """
+    `data` re-encoded as `image_format` with its longer side at most
+    `max_dimension`, whether it was resized, and whether the source had
+    metadata that the copy leaves out: (bytes, resized, stripped).
+    None if it isn't an image Pillow can decode, or is animated.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    pil_format = FORMATS[image_format][0]
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if getattr(image, "is_animated", False):
+                return None
+            stripped = bool(image.getexif() or image.info.get("exif")
+                            or image.info.get("xmp"))
+            icc_profile = image.info.get("icc_profile")
+            # Lets the JPEG decoder scale down by up to 8x as it decodes.
+            image.draft("RGB", (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(image)
+            resized = max(image.size) > max_dimension
+            if resized:
+                image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA")
+            # Nothing from the source file's metadata is written back out
+            # but its color profile (e.g. Display P3 from phones).
+            image.info = {}
+            out = BytesIO()
+            image.save(out, format=pil_format, quality=quality, icc_profile=icc_profile)
+    except Image.DecompressionBombError:
+        raise ImageTooLarge(None, None)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    return out.getvalue(), resized, stripped
+
+
+class ImagePreprocessor:
+    def __init__(self, enabled=True, max_bytes=0, max_dimension=2048, image_format="webp",
+                 quality=80, workers=2):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown IMAGE_FORMAT '{image_format}' (use webp or jpeg).")
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_dimension = max_dimension
+        self.image_format = image_format
+        self.quality = quality
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="image-preprocess")
+            return self._pool
+
+    def _read_all(self, file_list):
+        # Every file is read (and size-checked) before any is decoded.
+        return [(getattr(f, "filename", None), getattr(f, "content_type", None),
+                 read_upload(f, self.max_bytes)) for f in file_list]
+
+    def _process(self, filename, content_type, data):
+        start = time.perf_counter()
+        result = None
+        if self.enabled:
+            try:
+                result = downscale(data, self.max_dimension, self.image_format, self.quality)
+            except ImageTooLarge:
+                raise ImageTooLarge(filename, self.max_bytes)
+        if result is not None:
+            out, resized, stripped = result
+            if len(out) >= len(data) and not resized and not stripped:
+                result = None
+        if result is None:
+            outcome, out = "unchanged", data
+        else:
+            outcome = "resized" if resized else "reencoded"
+            _, extension, content_type = FORMATS[self.image_format]
+            filename = os.path.splitext(filename or "image")[0] + extension
+            METRICS.observe("image_preprocess_duration_seconds", (),
+                            time.perf_counter() - start)
+        labels = (("outcome", outcome),)
+        METRICS.inc("image_bytes_received_total", labels, len(data))
+        METRICS.inc("image_bytes_uploaded_total", labels, len(out))
+        return FileStorage(stream=BytesIO(out), filename=filename, content_type=content_type)
+
+    def prepare(self, file_list):
+        """The files to upload in place of `file_list`, in order."""
+        files = self._read_all(file_list)
+        if not self.enabled or not self.workers or len(files) < 2:
+            return [self._process(*f) for f in files]
+        futures = [self._executor().submit(self._process, *f) for f in files]
+        return [future.result() for future in futures]
+
+    async def prepare_async(self, file_list):
+        files = self._read_all(file_list)
+        if not self.enabled or not self.workers:
+            return [self._process(*f) for f in files]
+        return list(await asyncio.gather(*(
+            asyncio.wrap_future(self._executor().submit(self._process, *f)) for f in files)))
+
+
+def limit_request_size():
+    """Refuse a recipe body over RECIPE_MAX_REQUEST_BYTES before parsing it."""
+    max_bytes = current_app.config["RECIPE_MAX_REQUEST_BYTES"]
+    if max_bytes:
+        request.max_content_length = max_bytes
+
+
+def _image_too_large(error):
+    body = {"error": "Image too large", "filename": error.filename}
+    if error.max_bytes:
+        body["maxBytes"] = error.max_bytes
+    return jsonify(body), 413
+
+
+def _have_pillow():
+    return importlib.util.find_spec("PIL") is not None
+
+
+def init_image_processing(app):
+    setting = app.config["IMAGE_PREPROCESS"]
+    have_pillow = _have_pillow()
+    if setting == "true" and not have_pillow:
+        raise RuntimeError("IMAGE_PREPROCESS=true requires the 'Pillow' package.")
+    preprocessor = ImagePreprocessor(
+        enabled=have_pillow and setting != "false",
+        max_bytes=app.config["IMAGE_MAX_BYTES"],
+        max_dimension=app.config["IMAGE_MAX_DIMENSION"],
+        image_format=app.config["IMAGE_FORMAT"],
+        quality=app.config["IMAGE_QUALITY"],
+        workers=app.config["IMAGE_PREPROCESS_WORKERS"],
+    )
+    app.register_error_handler(ImageTooLarge, _image_too_large)
+    app.extensions["image_preprocessor"] = preprocessor
+    return preprocessor
+
+
+def get_image_preprocessor():
+    return current_app.extensions["image_preprocessor"]
@@ -0,0 +1,329 @@
+"""
+"What can I cook" ingredient matching.
+
+Each recipe's `ingredients` are normalized ("2 cups chopped Tomatoes" ->
+"tomato") and mapped onto a shared vocabulary, so a recipe becomes a
+bitset with one bit per ingredient, held as a Python int, and gets a row
+number. Per-ingredient posting sets of rows find the recipes sharing at
+least one ingredient with the query; only those are scored.
+
+With numpy installed, scoring is one vectorized pass: np.bincount over
+the query's postings gives every row's matched count, and coverage,
+missing (against a per-row ingredient count array) and the ranking are
+array operations. Without it, the same scoring runs as a Python loop of
+popcounts over the candidates. Writes only touch a recipe's bitset, its
+postings and one array slot, so nothing is re-packed as recipes change
+or the vocabulary grows.
+
+Like the search index, each process keeps its own copy, built from a
+collection-group scan on first use (outside the lock, then swapped in),
+kept current by hooks in recipe_database, and caught up on other
+workers' writes after INGREDIENT_REFRESH_INTERVAL seconds (re-reading
+only recipes whose dateUpdated is past its high-water mark). Deletions
+made through other workers are only seen by the next full build.
+"""
+import heapq
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from .search import SCAN_OVERLAP, stem
+from .storage import get_db
+
+# Words dropped from an ingredient line before it is matched: amounts,
+# units and preparation notes.
+UNITS = frozenset(
+    "cup cups tbsp tablespoon tablespoons tsp teaspoon teaspoons g gram grams "
+    "kg ml l litre liter oz ounce ounces lb lbs pound pounds pinch dash clove "
+    "cloves can cans slice slices piece pieces handful bunch large small "
+    "medium".split()
+)
+DESCRIPTORS = frozenset(
+    "chopped diced minced sliced grated fresh freshly dried ground crushed "
+    "peeled finely roughly to taste optional of and or a an the for".split()
+)
+_SPLIT = re.compile(r"[,\n;]+")
+_WORD = re.compile(r"[a-z]+")
+
+
+def normalize_ingredient(text):
+    """Reduce one ingredient line to a canonical name ('' if nothing is left)."""
+    text = re.sub(r"\(.*?\)", " ", text.lower())
+    words = [w for w in _WORD.findall(text) if w not in UNITS and w not in DESCRIPTORS]
+    return " ".join(stem(w) for w in words)
+
+
+def parse_ingredients(value):
+    """Canonical ingredient names from a recipe's ingredients field (str or list)."""
+    if not value:
+        return []
+    lines = value if isinstance(value, (list, tuple)) else _SPLIT.split(str(value))
+    names = (normalize_ingredient(str(line)) for line in lines)
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class IngredientIndex:
+    def __init__(self, refresh_interval=0):
+        self.refresh_interval = refresh_interval
+        self.vocabulary = {}    # ingredient name -> bit
+        self.names = []         # bit -> ingredient name
+        self.recipes = {}       # doc_key -> (userId, postId, title, bitset, row)
+        self.postings = {}      # bit -> set of rows using it
+        self.row_keys = []      # row -> doc_key, None while the row is free
+        self._free_rows = []
+        self._np = _numpy()
+        # row -> ingredient count, for vectorized scoring (numpy only)
+        self._totals = self._np.zeros(1024, self._np.int32) if self._np else None
+        self.loaded = False
+        # dateUpdated up to which Firestore is reflected.
+        self.high_water = None
+        self._refreshed_at = 0.0  # time.monotonic() of the last build or catch-up
+        self._lock = threading.RLock()
+        self._build_lock = threading.RLock()
+        # Hook writes made while a build scans (doc_key -> (userId, postId,
+        # recipe), None for a removal), replayed over its result.
+        self._journal = None
+
+    def _bit(self, name):
+        bit = self.vocabulary.get(name)
+        if bit is None:
+            bit = self.vocabulary[name] = len(self.names)
+            self.names.append(name)
+        return bit
+
+    def _bits(self, bitset):
+        while bitset:
+            low = bitset & -bitset
+            yield low.bit_length() - 1
+            bitset ^= low
+
+    def _new_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self.row_keys)
+        self.row_keys.append(None)
+        if self._totals is not None and row == len(self._totals):
+            self._totals = self._np.concatenate(
+                [self._totals, self._np.zeros_like(self._totals)])
+        return row
+
+    def _add(self, user_id, post_id, recipe):
+        key = f"{user_id}/{post_id}"
+        self._remove(key)
+        bitset = 0
+        for name in parse_ingredients(recipe.get("ingredients")):
+            bitset |= 1 << self._bit(name)
+        if not bitset:
+            return
+        row = self._new_row()
+        self.row_keys[row] = key
+        self.recipes[key] = (user_id, post_id, recipe.get("title"), bitset, row)
+        for bit in self._bits(bitset):
+            self.postings.setdefault(bit, set()).add(row)
+        if self._totals is not None:
+            self._totals[row] = bitset.bit_count()
+
+    def _remove(self, key):
+        entry = self.recipes.pop(key, None)
+        if entry is None:
+            return
+        bitset, row = entry[3], entry[4]
+        for bit in self._bits(bitset):
+            self.postings[bit].discard(row)
+        self.row_keys[row] = None
+        self._free_rows.append(row)
+        if self._totals is not None:
+            self._totals[row] = 0
+
+    # -- hooks; before the first build they are no-ops, the build covers them --
+
+    def add(self, user_id, post_id, recipe):
+        with self._lock:
+            if self._journal is not None:
+                self._journal[f"{user_id}/{post_id}"] = (user_id, post_id, recipe)
+            if self.loaded:
+                self._add(user_id, post_id, recipe)
+
+    def remove(self, user_id, post_id):
+        key = f"{user_id}/{post_id}"
+        with self._lock:
+            if self._journal is not None:
+                self._journal[key] = None
+            if self.loaded:
+                self._remove(key)
+
+    def _stale(self):
+        return (self.refresh_interval > 0
+                and time.monotonic() - self._refreshed_at >= self.refresh_interval)
+
+    def ensure_loaded(self, db):
+        """
+        Build the index on first use; after that, catch up once
+        INGREDIENT_REFRESH_INTERVAL has passed. Matches don't wait on a
+        catch-up another thread is running, and a failed one is logged
+        and the current copy kept.
+        """
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    self._build(db)
+            return
+        if not self._stale() or not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            if self._stale():
+                self.catch_up(db)
+        except Exception:
+            # Retried after another interval, not on every match.
+            self._refreshed_at = time.monotonic()
+            current_app.logger.exception("Ingredient index catch-up failed")
+        finally:
+            self._build_lock.release()
+
+    def rebuild(self, db):
+        with self._build_lock:
+            self._build(db)
+
+    def _scan(self, db, since=None):
+        """
+        (high_water, [(userId, postId, recipe)]) for every recipe, or those
+        updated after `since`. Hook writes made meanwhile are journalled.
+        """
+        with self._lock:
+            self._journal = {}
+        high_water = (datetime.utcnow() - SCAN_OVERLAP).isoformat()
+        query = db.collection_group("created_recipes")
+        if since is not None:
+            query = query.where("dateUpdated", ">", since)
+        try:
+            entries = [(doc.reference.parent.parent.id, doc.id, doc.to_dict())
+                       for doc in query.stream()]
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        return high_water, entries
+
+    def _replay_journal(self):
+        for key, entry in self._journal.items():
+            if entry is None:
+                self._remove(key)
+            else:
+                self._add(*entry)
+        self._journal = None
+
+    def _build(self, db):
+        high_water, entries = self._scan(db)
+        built = IngredientIndex()
+        for entry in entries:
+            built._add(*entry)
+        with self._lock:
+            self.vocabulary, self.names = built.vocabulary, built.names
+            self.recipes, self.postings = built.recipes, built.postings
+            self.row_keys, self._free_rows = built.row_keys, built._free_rows
+            self._totals = built._totals
+            self._replay_journal()
+            self.high_water, self.loaded = high_water, True
+            self._refreshed_at = time.monotonic()
+
+    def catch_up(self, db):
+        """Re-index the recipes updated since the high-water mark."""
+        with self._build_lock:
+            high_water, entries = self._scan(db, since=self.high_water)
+            with self._lock:
+                for entry in entries:
+                    self._add(*entry)
+                self._replay_journal()
+                self.high_water = high_water
+                self._refreshed_at = time.monotonic()
+
+    def _rank_vectorized(self, bits, limit, max_missing):
+        np = self._np
+        rows = np.concatenate([np.fromiter(self.postings[bit], np.int64, len(self.postings[bit]))
+                               for bit in bits])
+        matched = np.bincount(rows, minlength=len(self.row_keys))
+        candidates = np.flatnonzero(matched)
+        matched = matched[candidates]
+        missing = self._totals[candidates] - matched
+        if max_missing is not None:
+            keep = missing <= max_missing
+            candidates, matched, missing = candidates[keep], matched[keep], missing[keep]
+        coverage = matched / (matched + missing)
+        # lexsort's last key is the primary one.
+        order = np.lexsort((candidates, missing, -coverage))[:limit]
+        return candidates[order].tolist()
+
+    def _rank_loop(self, bits, have_bits, limit, max_missing):
+        scored = []
+        for row in set().union(*(self.postings[bit] for bit in bits)):
+            bitset = self.recipes[self.row_keys[row]][3]
+            total = bitset.bit_count()
+            matched = (bitset & have_bits).bit_count()
+            missing = total - matched
+            if max_missing is not None and missing > max_missing:
+                continue
+            scored.append((-matched / total, missing, row))
+        return [row for _, _, row in heapq.nsmallest(limit, scored)]
+
+    def match(self, have, limit=20, max_missing=None):
+        """
+        Recipes ranked by how much of them `have` (ingredient names) covers:
+        coverage first, then fewest missing ingredients (ties by row).
+        """
+        with self._lock:
+            have_bits = 0
+            bits = []
+            for name in dict.fromkeys(filter(None, map(normalize_ingredient, have))):
+                bit = self.vocabulary.get(name)
+                if bit is not None and bit in self.postings:
+                    have_bits |= 1 << bit
+                    bits.append(bit)
+            if not bits:
+                return []
+            if self._np is not None:
+                rows = self._rank_vectorized(bits, limit, max_missing)
+            else:
+                rows = self._rank_loop(bits, have_bits, limit, max_missing)
+
+            results = []
+            for row in rows:
+                user_id, post_id, title, bitset, _ = self.recipes[self.row_keys[row]]
+                total = bitset.bit_count()
+                missing = total - (bitset & have_bits).bit_count()
+                results.append({
+                    "userId": user_id,
+                    "postId": post_id,
+                    "title": title,
+                    "coverage": round((total - missing) / total, 4),
+                    "missing": missing,
+                    "missingIngredients": [
+                        self.names[bit] for bit in self._bits(bitset & ~have_bits)],
+                })
+            return results
+
+
+def init_ingredient_index(app):
+    index = IngredientIndex(refresh_interval=app.config["INGREDIENT_REFRESH_INTERVAL"])
+    app.extensions["ingredient_index"] = index
+    return index
+
+
+def get_ingredient_index():
+    return current_app.extensions["ingredient_index"]
+
+
+def match_recipes(have, limit=20, max_missing=None):
+    index = get_ingredient_index()
+    index.ensure_loaded(get_db())
+    return index.match(have, limit=limit, max_missing=max_missing)
@@ -0,0 +1,86 @@
+"""
+Process start-up state: storage warm-up and readiness.
+
+With STORAGE_WARMUP on, create_app() starts warming the storage backend
+in a background thread (credentials, connections). GET /api/ready only
+reports ready once that has finished, so a load balancer can hold
+traffic off a fresh instance until its first requests will be fast.
+A failed warm-up is reported as "failed" and retried with exponential
+backoff (RETRY_DELAY doubling up to MAX_RETRY_DELAY seconds), so the
+instance turns ready once the backend recovers.
+
+Threads don't survive fork(), so a worker forked from a preloaded parent
+notices the pid change on its first readiness check and warms up again.
+"""
+import os
+import threading
+import time
+
+from flask import current_app
+
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+class Readiness:
+    def __init__(self, backend, warm_up=True, retry_delay=RETRY_DELAY,
+                 max_retry_delay=MAX_RETRY_DELAY):
+        self.backend = backend
+        self.warm_up = warm_up
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.state = READY
+        self.error = None
+        self.warmup_seconds = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        with self._lock:
+            self._pid = os.getpid()
+            if not self.warm_up:
+                self.state = READY
+                return
+            self.state = WARMING
+            self.error = None
+        threading.Thread(target=self._run, name="storage-warmup", daemon=True).start()
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            start = time.perf_counter()
+            try:
+                self.backend.warm_up()
+            except Exception as e:
+                self.state, self.error = FAILED, str(e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            self.warmup_seconds = time.perf_counter() - start
+            self.state, self.error = READY, None
+            return
+
+    def status(self):
+        if self._pid != os.getpid():
+            self.start()
+        status = {"status": self.state}
+        if self.error:
+            status["error"] = self.error
+        if self.warmup_seconds is not None:
+            status["warmupSeconds"] = round(self.warmup_seconds, 3)
+        return status
+
+
+def init_lifecycle(app):
+    readiness = Readiness(app.extensions["storage"], warm_up=app.config["STORAGE_WARMUP"])
+    app.extensions["readiness"] = readiness
+    return readiness
+
+
+def get_readiness():
+    return current_app.extensions["readiness"]
@@ -0,0 +1,359 @@
+"""
+Recipe likes.
+
+Who liked what is one document per like, so liking is idempotent:
+    users/<authorId>/created_recipes/<postId>/likes/<userId>
+Liking creates it (a second like hits AlreadyExists and changes nothing),
+unliking deletes it with an exists precondition.
+
+Totals live in a sharded counter next to it,
+    users/<authorId>/created_recipes/<postId>/like_shards/<0..LIKE_SHARDS-1>
+because one document only takes about one sustained write per second.
+Increments aren't written per like either: LikeCounter buffers them in
+process and a background thread flushes one Increment per recipe (on a
+random shard) every LIKE_FLUSH_INTERVAL seconds, all in one batch.
+
+Nothing else is written per like, so no single document takes every
+like of a popular recipe. Reads sum the shards: one get_all over the
+LIKE_SHARDS shard documents of every recipe on a list. A total is cached
+for LIKE_COUNT_TTL seconds, which is what keeps a busy list from reading
+the shards on every request, and this process's unflushed delta is added
+to it. isLiked is per requesting user, never stored on the recipe.
+
+Deleting a recipe deletes its likes and like_shards documents too
+(delete_recipe_likes()). A flush from another process racing the delete
+can still leave a shard behind; nothing lists shards, so it is only an
+orphan document.
+
+annotate_likes_async() does the same reads through the async client,
+for the ASGI mode.
+
+Deltas still buffered when a process dies are lost; the like documents
+are the source of truth if the totals ever need recounting.
+"""
+import asyncio
+import atexit
+import os
+import random
+import threading
+
+from flask import current_app
+
+from .cache import get_recipe_cache, cache_get, cache_set
+from .storage import get_async_db, get_db
+
+# Firestore caps a batch at 500 writes; a flush writes one shard per recipe.
+MAX_BATCH_WRITES = 500
+
+
+def like_count_cache_key(author_id, post_id):
+    return f"likes:{author_id}:{post_id}"
+
+
+def _recipe_ref(db, author_id, post_id):
+    return (
+        db.collection("users")
+        .document(author_id)
+        .collection("created_recipes")
+        .document(post_id)
+    )
+
+
+def _like_ref(db, author_id, post_id, user_id):
+    return _recipe_ref(db, author_id, post_id).collection("likes").document(user_id)
+
+
+class LikeCounter:
+    """In-process buffer of like increments, flushed to sharded counters."""
+
+    def __init__(self, app, shards=10, flush_interval=1.0):
+        self.app = app
+        self.shards = shards
+        self.flush_interval = flush_interval
+        self.pending = {}  # (authorId, postId) -> delta not yet written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, author_id, post_id, delta):
+        with self._lock:
+            key = (author_id, post_id)
+            self.pending[key] = self.pending.get(key, 0) + delta
+            if self._pid != os.getpid():
+                # First use in this process (threads don't survive fork).
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="like-flusher", daemon=True).start()
+
+    def pending_delta(self, author_id, post_id):
+        with self._lock:
+            return self.pending.get((author_id, post_id), 0)
+
+    def discard(self, author_id, post_id):
+        """Drop a deleted recipe's unflushed delta, so a flush doesn't recreate its docs."""
+        with self._lock:
+            self.pending.pop((author_id, post_id), None)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Error flushing likes")
+
+    def flush(self):
+        """Write every buffered delta; returns how many recipes were touched."""
+        from google.cloud.firestore import Increment
+
+        with self._flush_lock:
+            with self._lock:
+                deltas = {key: d for key, d in self.pending.items() if d}
+            if not deltas:
+                return 0
+            with self.app.app_context():
+                db = get_db()
+                items = list(deltas.items())
+                for start in range(0, len(items), MAX_BATCH_WRITES):
+                    chunk = items[start:start + MAX_BATCH_WRITES]
+                    batch = db.batch()
+                    for (author_id, post_id), delta in chunk:
+                        shard = _recipe_ref(db, author_id, post_id) \
+                            .collection("like_shards").document(str(random.randrange(self.shards)))
+                        batch.set(shard, {"count": Increment(delta)}, merge=True)
+                    batch.commit()
+                    # Only forget deltas once they're committed (a recipe
+                    # deleted meanwhile has no entry left to subtract from).
+                    with self._lock:
+                        for key, delta in chunk:
+                            if key not in self.pending:
+                                continue
+                            self.pending[key] -= delta
+                            if not self.pending[key]:
+                                del self.pending[key]
+                cache = get_recipe_cache()
+                cache.delete(*(like_count_cache_key(*key) for key in deltas))
+            return len(deltas)
+
+
+def init_like_counter(app):
+    counter = LikeCounter(
+        app,
+        shards=app.config["LIKE_SHARDS"],
+        flush_interval=app.config["LIKE_FLUSH_INTERVAL"],
+    )
+    atexit.register(lambda: counter.pending and counter.flush())
+    app.extensions["like_counter"] = counter
+    return counter
+
+
+def get_like_counter():
+    return current_app.extensions["like_counter"]
+
+
+def like_recipe(author_id, post_id, user_id):
+    """Record user_id's like; False if they had already liked it."""
+    from google.api_core import exceptions
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    db = get_db()
+    try:
+        _like_ref(db, author_id, post_id, user_id).create(
+            {"userId": user_id, "likedAt": SERVER_TIMESTAMP})
+    except exceptions.AlreadyExists:
+        return False
+    get_like_counter().add(author_id, post_id, 1)
+    return True
+
+
+def unlike_recipe(author_id, post_id, user_id):
+    """Remove user_id's like; False if there wasn't one."""
+    from google.api_core import exceptions
+
+    db = get_db()
+    try:
+        _like_ref(db, author_id, post_id, user_id).delete(
+            option=db.write_option(exists=True))
+    except exceptions.NotFound:
+        return False
+    get_like_counter().add(author_id, post_id, -1)
+    return True
+
+
+def _cached_like_counts(keys):
+    """({key: cached total}, [keys whose shards must be read])."""
+    cache = get_recipe_cache()
+    ttl = current_app.config["LIKE_COUNT_TTL"]
+    counts = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        cached = cache_get(cache, like_count_cache_key(*key)) if ttl > 0 else None
+        if cached is None:
+            missing.append(key)
+        else:
+            counts[key] = cached
+    return counts, missing
+
+
+def _shard_refs(db, keys):
+    shards = get_like_counter().shards
+    return [
+        _recipe_ref(db, *key).collection("like_shards").document(str(shard))
+        for key in keys
+        for shard in range(shards)
+    ]
+
+
+def _sum_shards(counts, missing, snapshots):
+    cache = get_recipe_cache()
+    ttl = current_app.config["LIKE_COUNT_TTL"]
+    totals = dict.fromkeys(missing, 0)
+    for snapshot in snapshots:
+        if snapshot.exists:
+            recipe_ref = snapshot.reference.parent.parent
+            key = (recipe_ref.parent.parent.id, recipe_ref.id)
+            totals[key] += (snapshot.to_dict() or {}).get("count", 0)
+    for key, total in totals.items():
+        counts[key] = total
+        if ttl > 0:
+            cache_set(cache, like_count_cache_key(*key), total, ttl=ttl)
+
+
+def _with_pending(counts, keys):
+    counter = get_like_counter()
+    return [max(counts[key] + counter.pending_delta(*key), 0) for key in keys]
+
+
+def get_like_counts(keys):
+    """
+    Totals for a list of (authorId, postId), in order. Cached sums are
+    used where present; the rest are read with one get_all over their
+    shards.
+    """
+    counts, missing = _cached_like_counts(keys)
+    if missing:
+        db = get_db()
+        _sum_shards(counts, missing, db.get_all(_shard_refs(db, missing)))
+    return _with_pending(counts, keys)
+
+
+async def get_like_counts_async(keys):
+    counts, missing = _cached_like_counts(keys)
+    if missing:
+        db = get_async_db()
+        _sum_shards(counts, missing, [s async for s in db.get_all(_shard_refs(db, missing))])
+    return _with_pending(counts, keys)
+
+
+def _like_doc_refs(db, author_id, post_id):
+    recipe_ref = _recipe_ref(db, author_id, post_id)
+    for name in ("like_shards", "likes"):
+        for doc in recipe_ref.collection(name).select([]).stream():
+            yield doc.reference
+
+
+def _forget_likes(author_id, post_id):
+    get_like_counter().discard(author_id, post_id)
+    get_recipe_cache().delete(like_count_cache_key(author_id, post_id))
+
+
+def delete_recipe_likes(author_id, post_id):
+    """
+    Delete a deleted recipe's likes and like_shards documents, in batches;
+    Firestore doesn't delete subcollections with their parent.
+    """
+    _forget_likes(author_id, post_id)
+    db = get_db()
+    batch = db.batch()
+    for ref in _like_doc_refs(db, author_id, post_id):
+        batch.delete(ref)
+        if len(batch) >= MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+    if len(batch):
+        batch.commit()
+
+
+async def delete_recipe_likes_async(author_id, post_id):
+    _forget_likes(author_id, post_id)
+    db = get_async_db()
+    recipe_ref = _recipe_ref(db, author_id, post_id)
+    batch = db.batch()
+    for name in ("like_shards", "likes"):
+        async for doc in recipe_ref.collection(name).select([]).stream():
+            batch.delete(doc.reference)
+            if len(batch) >= MAX_BATCH_WRITES:
+                await batch.commit()
+                batch = db.batch()
+    if len(batch):
+        await batch.commit()
+
+
+def get_liked(keys, user_id):
+    """Which of (authorId, postId) user_id has liked, with one get_all."""
+    if not user_id or not keys:
+        return [False] * len(keys)
+    db = get_db()
+    refs = [_like_ref(db, author_id, post_id, user_id) for author_id, post_id in keys]
+    liked = {snapshot.reference.path for snapshot in db.get_all(refs) if snapshot.exists}
+    return [ref.path in liked for ref in refs]
+
+
+async def get_liked_async(keys, user_id):
+    if not user_id or not keys:
+        return [False] * len(keys)
+    db = get_async_db()
+    refs = [_like_ref(db, author_id, post_id, user_id) for author_id, post_id in keys]
+    liked = {snapshot.reference.path async for snapshot in db.get_all(refs) if snapshot.exists}
+    return [ref.path in liked for ref in refs]
+
+
+def _like_keys(recipes, author_ids):
+    if isinstance(author_ids, str):
+        author_ids = [author_ids] * len(recipes)
+    return [(author_id, r.get("postId") or r.get("id"))
+            for author_id, r in zip(author_ids, recipes)]
+
+
+def annotate_likes(recipes, author_ids, viewer_id=None, fields=None):
+    """
+    Set `likes` and `isLiked` on recipe dicts (in place, and returned),
+    unless a `fields` projection left them out. `author_ids` is one
+    author per recipe, or a single ID for all of them.
+    """
+    want_likes = not fields or "likes" in fields
+    want_liked = not fields or "isLiked" in fields
+    if not recipes or not (want_likes or want_liked):
+        return recipes
+    keys = _like_keys(recipes, author_ids)
+    if want_likes:
+        for recipe, count in zip(recipes, get_like_counts(keys)):
+            recipe["likes"] = count
+    if want_liked:
+        for recipe, liked in zip(recipes, get_liked(keys, viewer_id)):
+            recipe["isLiked"] = liked
+    return recipes
+
+
+async def annotate_likes_async(recipes, author_ids, viewer_id=None, fields=None):
+    """annotate_likes(), with the counts and isLiked reads in flight together."""
+    want_likes = not fields or "likes" in fields
+    want_liked = not fields or "isLiked" in fields
+    if not recipes or not (want_likes or want_liked):
+        return recipes
+    keys = _like_keys(recipes, author_ids)
+    counts, liked = await asyncio.gather(
+        get_like_counts_async(keys) if want_likes else _nothing(),
+        get_liked_async(keys, viewer_id) if want_liked else _nothing(),
+    )
+    for i, recipe in enumerate(recipes):
+        if want_likes:
+            recipe["likes"] = counts[i]
+        if want_liked:
+            recipe["isLiked"] = liked[i]
+    return recipes
+
+
+async def _nothing():
+    return None
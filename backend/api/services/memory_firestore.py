@@ -0,0 +1,773 @@
+"""
+In-process stand-in for the part of the Firestore client API the services
+layer uses. Documents live in a dict keyed by their path, so nothing leaves
+the process. Every call that would be a network round trip against real
+Firestore (get, set, update, delete, queries) goes through _round_trip(),
+which can sleep for a configurable latency when benchmarking and is timed
+under the name of the RPC the real client would make.
+
+AsyncMemoryFirestore offers the same data through the async client API
+(google.cloud.firestore.AsyncClient) for the ASGI mode; its simulated
+latency is awaited, so it doesn't block the event loop.
+
+Errors are google.api_core exceptions so callers catch the same types
+either way; that module is imported on first error, not at import time.
+"""
+import asyncio
+import contextvars
+import copy
+import functools
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from .metrics import timed
+
+
+# Set while AsyncMemoryFirestore runs a call whose latency it has already
+# awaited (and timed), so _round_trip() only counts it.
+_awaited = contextvars.ContextVar("memory_firestore_awaited", default=False)
+
+
+def _exceptions():
+    from google.api_core import exceptions
+    return exceptions
+
+
+def _split(path):
+    parts = []
+    for segment in path:
+        parts.extend(p for p in segment.split("/") if p)
+    return tuple(parts)
+
+
+def _get_field(data, field_path):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _set_field(data, field_path, value):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _apply_transforms(data, previous, now):
+    """
+    Resolve SERVER_TIMESTAMP and Increment sentinels in `data`; increments
+    apply to the values in `previous` (the stored document, or {} when
+    the write replaces it).
+    """
+    # If the transforms module was never imported, no sentinel can exist.
+    transforms = sys.modules.get("google.cloud.firestore_v1.transforms")
+    if transforms is None:
+        return
+    for key, value in data.items():
+        before = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict):
+            _apply_transforms(value, before if isinstance(before, dict) else {}, now)
+        elif value is transforms.SERVER_TIMESTAMP:
+            data[key] = now
+        elif isinstance(value, transforms.Increment):
+            if isinstance(before, bool) or not isinstance(before, (int, float)):
+                before = 0
+            data[key] = before + value.value
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+class _StoredDoc:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class MemoryFirestore:
+    """
+    Firestore-compatible client backed by a dict.
+    `latency` is in seconds and is added to every simulated RPC.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.rpc_count = 0
+        self._docs = {}
+        self._lock = threading.RLock()
+        self._clock = datetime.now(timezone.utc)
+
+    def collection(self, *path):
+        return CollectionReference(self, _split(path))
+
+    def document(self, *path):
+        return DocumentReference(self, _split(path))
+
+    def collection_group(self, collection_id):
+        return Query(self, (collection_id,), all_descendants=True)
+
+    def reset(self):
+        with self._lock:
+            self._docs.clear()
+            self.rpc_count = 0
+
+    # -- internals shared by the reference/query classes --
+
+    def _round_trip(self, operation):
+        self.rpc_count += 1
+        if _awaited.get():
+            return
+        with timed("firestore", operation):
+            if self.latency:
+                time.sleep(self.latency)
+
+    def _tick(self):
+        # Commit timestamps must be strictly increasing, like Firestore's.
+        now = datetime.now(timezone.utc)
+        if now <= self._clock:
+            now = self._clock + timedelta(microseconds=1)
+        self._clock = now
+        return now
+
+    def _snapshot(self, path):
+        stored = self._docs.get(path)
+        reference = DocumentReference(self, path)
+        if stored is None:
+            return DocumentSnapshot(reference, None, None, None)
+        return DocumentSnapshot(
+            reference, copy.deepcopy(stored.data), stored.create_time, stored.update_time
+        )
+
+    def _commit(self, writes):
+        """
+        Apply a list of (kind, path, data, option) writes atomically with a
+        single commit timestamp. If any write fails, none are applied.
+        """
+        with self._lock:
+            now = self._tick()
+            backup = {path: self._docs.get(path) for _, path, _, _ in writes}
+            try:
+                return [self._apply(write, now) for write in writes]
+            except Exception:
+                for path, stored in backup.items():
+                    if stored is None:
+                        self._docs.pop(path, None)
+                    else:
+                        self._docs[path] = stored
+                raise
+
+    def _apply(self, write, now):
+        kind, path, data, option = write
+        stored = self._docs.get(path)
+        name = "/".join(path)
+        if option is not None:
+            option.check(name, stored)
+
+        if kind == "create":
+            if stored is not None:
+                raise _exceptions().AlreadyExists(f"Document already exists: {name}")
+            new_data = copy.deepcopy(data)
+        elif kind == "set":
+            new_data = copy.deepcopy(data)
+        elif kind == "merge":
+            new_data = copy.deepcopy(stored.data) if stored is not None else {}
+            new_data.update(copy.deepcopy(data))
+        elif kind == "update":
+            if stored is None:
+                raise _exceptions().NotFound(f"No document to update: {name}")
+            new_data = copy.deepcopy(stored.data)
+            for field_path, value in data.items():
+                _set_field(new_data, field_path, copy.deepcopy(value))
+        elif kind == "delete":
+            self._docs.pop(path, None)
+            return WriteResult(now)
+        else:
+            raise ValueError(f"Unknown write: {kind}")
+
+        keeps_fields = kind in ("merge", "update") and stored is not None
+        _apply_transforms(new_data, stored.data if keeps_fields else {}, now)
+        create_time = stored.create_time if stored is not None else now
+        self._docs[path] = _StoredDoc(new_data, create_time, now)
+        return WriteResult(now)
+
+    def _children(self, collection_path):
+        depth = len(collection_path) + 1
+        return [
+            path for path in self._docs
+            if len(path) == depth and path[:-1] == collection_path
+        ]
+
+    def _group_members(self, collection_id):
+        # Every document directly inside a collection named collection_id,
+        # at any depth (what a collection-group query scans).
+        return [path for path in self._docs if path[-2] == collection_id]
+
+    def write_option(self, **kwargs):
+        if len(kwargs) != 1 or not set(kwargs) <= {"last_update_time", "exists"}:
+            raise TypeError("write_option() takes exactly one of last_update_time or exists")
+        return _WriteOption(**kwargs)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self._round_trip("batch_get_documents")
+        with self._lock:
+            snapshots = []
+            for reference in references:
+                snapshot = self._snapshot(reference._path)
+                if transaction is not None:
+                    transaction._record_read(snapshot)
+                snapshots.append(snapshot)
+        yield from snapshots
+
+
+class _WriteOption:
+    """Precondition attached to a single write (see write_option())."""
+
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+    def check(self, name, stored):
+        if self.exists is not None:
+            if self.exists and stored is None:
+                raise _exceptions().NotFound(f"No document to update: {name}")
+            if not self.exists and stored is not None:
+                raise _exceptions().AlreadyExists(f"Document already exists: {name}")
+        if self.last_update_time is not None:
+            if stored is None or stored.update_time != self.last_update_time:
+                raise _exceptions().FailedPrecondition(
+                    f"Document {name} was modified since {self.last_update_time}"
+                )
+
+
+class WriteBatch:
+    """Buffers writes and applies them in one atomic commit."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference._path, document_data, None))
+
+    def set(self, reference, document_data, merge=False):
+        kind = "merge" if merge else "set"
+        self._writes.append((kind, reference._path, document_data, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference._path, field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference._path, None, option))
+
+    def commit(self):
+        self._client._round_trip("commit")
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class Transaction(WriteBatch):
+    """
+    Optimistic transaction. Reads record the update_time they saw; commit
+    raises Aborted if any of those documents changed since, which makes
+    firestore.transactional() retry the whole function, as on the server.
+    Implements the same private hooks firestore.transactional() drives.
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _record_read(self, snapshot):
+        self._reads.setdefault(snapshot.reference._path, snapshot.update_time)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references):
+        return self._client.get_all(references, transaction=self)
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        if self._read_only and self._writes:
+            raise _exceptions().InvalidArgument("Cannot write in a read-only transaction.")
+        self._client._round_trip("commit")
+        with self._client._lock:
+            for path, seen in self._reads.items():
+                stored = self._client._docs.get(path)
+                current = stored.update_time if stored is not None else None
+                if current != seen:
+                    raise _exceptions().Aborted("Transaction contention, please retry.")
+            results = self._client._commit(self._writes)
+        self._clean_up()
+        return results
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, create_time, update_time):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        return copy.deepcopy(_get_field(self._data or {}, field_path))
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return "/".join(self._path)
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._path[:-1])
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, self._path + _split((collection_id,)))
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._round_trip("batch_get_documents")
+        with self._client._lock:
+            snapshot = self._client._snapshot(self._path)
+            if transaction is not None:
+                transaction._record_read(snapshot)
+        if field_paths is not None and snapshot.exists:
+            snapshot._data = {f: snapshot._data[f] for f in field_paths if f in snapshot._data}
+        return snapshot
+
+    def _write(self, kind, data=None, option=None):
+        self._client._round_trip("commit")
+        return self._client._commit([(kind, self._path, data, option)])[0]
+
+    def create(self, document_data):
+        return self._write("create", document_data)
+
+    def set(self, document_data, merge=False):
+        return self._write("merge" if merge else "set", document_data)
+
+    def update(self, field_updates, option=None):
+        return self._write("update", field_updates, option)
+
+    def delete(self, option=None):
+        return self._write("delete", option=option).update_time
+
+
+def _compare(a, b):
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        # Mixed types: order by type name so results are at least stable.
+        return _compare(type(a).__name__, type(b).__name__)
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, parent_path, all_descendants=False):
+        self._client = client
+        self._parent_path = parent_path
+        self._all_descendants = all_descendants
+        self._filters = ()
+        self._orders = ()
+        self._limit = None
+        self._start_after = None
+        self._projection = None
+
+    def _copy(self, **changes):
+        # Narrowing a collection yields a plain Query, as in the real client.
+        query = Query(self._client, self._parent_path)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, field_path, op_string, value):
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op_string}")
+        return self._copy(_filters=self._filters + ((field_path, op_string, value),))
+
+    def limit(self, count):
+        return self._copy(_limit=count)
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if direction not in (self.ASCENDING, self.DESCENDING):
+            raise ValueError(f"Invalid direction: {direction}")
+        return self._copy(_orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths):
+        return self._copy(_projection=tuple(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        if not self._orders:
+            raise ValueError("Cursors require an order_by() on the query.")
+        cursor = document_fields_or_snapshot
+        if isinstance(cursor, DocumentSnapshot):
+            values = cursor.to_dict() or {}
+            values["__name__"] = cursor.reference
+        else:
+            values = dict(cursor)
+        return self._copy(_start_after=values)
+
+    def _sort_value(self, path, data, field_path):
+        if field_path == "__name__":
+            return path
+        return _get_field(data, field_path)
+
+    def _order_key(self):
+        orders = list(self._orders)
+        if orders and "__name__" not in [field for field, _ in orders]:
+            # Firestore breaks ties on document name in the last direction.
+            orders.append(("__name__", orders[-1][1]))
+        elif not orders:
+            orders = [("__name__", self.ASCENDING)]
+
+        def compare(left, right):
+            for field_path, direction in orders:
+                result = _compare(left[field_path], right[field_path])
+                if result:
+                    return -result if direction == self.DESCENDING else result
+            return 0
+
+        return orders, compare
+
+    def _cursor_values(self, orders):
+        values = {}
+        for field_path, _ in orders:
+            if field_path not in self._start_after:
+                break
+            value = self._start_after[field_path]
+            if field_path == "__name__":
+                if isinstance(value, DocumentReference):
+                    value = value._path
+                else:
+                    value = self._parent_path + (value,)
+            values[field_path] = value
+        return values
+
+    def _matches(self, data):
+        for field_path, op_string, value in self._filters:
+            try:
+                field_value = _get_field(data, field_path)
+            except KeyError:
+                return False
+            try:
+                if not _OPERATORS[op_string](field_value, value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _run(self):
+        orders, compare = self._order_key()
+        with self._client._lock:
+            rows = []
+            if self._all_descendants:
+                candidates = self._client._group_members(self._parent_path[-1])
+            else:
+                candidates = self._client._children(self._parent_path)
+            for path in candidates:
+                data = self._client._docs[path].data
+                if not self._matches(data):
+                    continue
+                try:
+                    row = {field: self._sort_value(path, data, field) for field, _ in orders}
+                except KeyError:
+                    # Documents missing an order_by field are left out.
+                    continue
+                rows.append((row, path))
+            rows.sort(key=lambda item: functools.cmp_to_key(compare)(item[0]))
+
+            if self._start_after is not None:
+                cursor = self._cursor_values(orders)
+                partial = [(field, d) for field, d in orders if field in cursor]
+                rows = [
+                    (row, path) for row, path in rows
+                    if self._after_cursor(row, cursor, partial)
+                ]
+
+            results = []
+            for _, path in rows[: self._limit]:
+                snapshot = self._client._snapshot(path)
+                if self._projection is not None:
+                    data = snapshot._data
+                    snapshot._data = {
+                        field: data[field] for field in self._projection if field in data
+                    }
+                results.append(snapshot)
+            return results
+
+    def _after_cursor(self, row, cursor, orders):
+        for field_path, direction in orders:
+            result = _compare(row[field_path], cursor[field_path])
+            if direction == self.DESCENDING:
+                result = -result
+            if result:
+                return result > 0
+        return False
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def stream(self, transaction=None):
+        self._client._round_trip("run_query")
+        snapshots = self._run()
+        if transaction is not None:
+            for snapshot in snapshots:
+                transaction._record_read(snapshot)
+        yield from snapshots
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._parent_path[-1]
+
+    @property
+    def parent(self):
+        if len(self._parent_path) == 1:
+            return None
+        return DocumentReference(self._client, self._parent_path[:-1])
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = uuid.uuid4().hex[:20]
+        return DocumentReference(self._client, self._parent_path + (document_id,))
+
+    def add(self, document_data, document_id=None):
+        doc_ref = self.document(document_id)
+        result = doc_ref.create(document_data)
+        return result.update_time, doc_ref
+
+
+class AsyncMemoryFirestore:
+    """
+    A MemoryFirestore behind the async client API: the same references,
+    queries and batches, but get/stream/commit are awaited. Snapshots
+    are the sync ones, which only carry data.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    @property
+    def rpc_count(self):
+        return self._db.rpc_count
+
+    async def _call(self, operation, fn, *args, **kwargs):
+        with timed("firestore", operation):
+            if self._db.latency:
+                await asyncio.sleep(self._db.latency)
+        token = _awaited.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _awaited.reset(token)
+
+    def collection(self, *path):
+        return AsyncCollectionReference(self, self._db.collection(*path))
+
+    def document(self, *path):
+        return AsyncDocumentReference(self, self._db.document(*path))
+
+    def collection_group(self, collection_id):
+        return AsyncQuery(self, self._db.collection_group(collection_id))
+
+    def write_option(self, **kwargs):
+        return self._db.write_option(**kwargs)
+
+    def batch(self):
+        return AsyncWriteBatch(self, self._db.batch())
+
+    async def get_all(self, references, field_paths=None):
+        refs = [reference._ref for reference in references]
+        snapshots = await self._call("batch_get_documents",
+                                     lambda: list(self._db.get_all(refs, field_paths)))
+        for snapshot in snapshots:
+            yield snapshot
+
+
+class AsyncWriteBatch:
+    def __init__(self, client, batch):
+        self._client = client
+        self._batch = batch
+
+    def __len__(self):
+        return len(self._batch)
+
+    def create(self, reference, document_data):
+        self._batch.create(reference._ref, document_data)
+
+    def set(self, reference, document_data, merge=False):
+        self._batch.set(reference._ref, document_data, merge=merge)
+
+    def update(self, reference, field_updates, option=None):
+        self._batch.update(reference._ref, field_updates, option=option)
+
+    def delete(self, reference, option=None):
+        self._batch.delete(reference._ref, option=option)
+
+    async def commit(self):
+        return await self._client._call("commit", self._batch.commit)
+
+
+class AsyncDocumentReference:
+    def __init__(self, client, ref):
+        self._client = client
+        self._ref = ref
+
+    @property
+    def id(self):
+        return self._ref.id
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    @property
+    def parent(self):
+        return AsyncCollectionReference(self._client, self._ref.parent)
+
+    def collection(self, collection_id):
+        return AsyncCollectionReference(self._client, self._ref.collection(collection_id))
+
+    async def get(self, field_paths=None):
+        return await self._client._call("batch_get_documents", self._ref.get, field_paths)
+
+    async def create(self, document_data):
+        return await self._client._call("commit", self._ref.create, document_data)
+
+    async def set(self, document_data, merge=False):
+        return await self._client._call("commit", self._ref.set, document_data, merge=merge)
+
+    async def update(self, field_updates, option=None):
+        return await self._client._call("commit", self._ref.update, field_updates, option=option)
+
+    async def delete(self, option=None):
+        return await self._client._call("commit", self._ref.delete, option=option)
+
+
+class AsyncQuery:
+    def __init__(self, client, query):
+        self._client = client
+        self._query = query
+
+    def _wrap(self, query):
+        return AsyncQuery(self._client, query)
+
+    def where(self, field_path, op_string, value):
+        return self._wrap(self._query.where(field_path, op_string, value))
+
+    def limit(self, count):
+        return self._wrap(self._query.limit(count))
+
+    def order_by(self, field_path, direction=Query.ASCENDING):
+        return self._wrap(self._query.order_by(field_path, direction))
+
+    def select(self, field_paths):
+        return self._wrap(self._query.select(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._wrap(self._query.start_after(document_fields_or_snapshot))
+
+    async def stream(self):
+        snapshots = await self._client._call("run_query", lambda: list(self._query.stream()))
+        for snapshot in snapshots:
+            yield snapshot
+
+    async def get(self):
+        return [snapshot async for snapshot in self.stream()]
+
+
+class AsyncCollectionReference(AsyncQuery):
+    @property
+    def id(self):
+        return self._query.id
+
+    def document(self, document_id=None):
+        return AsyncDocumentReference(self._client, self._query.document(document_id))
+
+    async def add(self, document_data, document_id=None):
+        doc_ref = self.document(document_id)
+        result = await doc_ref.create(document_data)
+        return result.update_time, doc_ref
@@ -0,0 +1,343 @@
+"""
+Request and dependency metrics, served at GET /metrics in the Prometheus
+text format.
+
+  - http_requests_total{blueprint,route,method,status}
+  - http_request_duration_seconds{blueprint,route,method}  (histogram)
+  - dependency_call_duration_seconds{dependency,operation} (histogram)
+  - dependency_errors_total{dependency,operation}
+
+`route` is the URL rule ("/api/recipes/<post_id>"), not the path, so
+label cardinality stays bounded. Streamed responses are timed until the
+last chunk is written. Dependency calls are timed where they leave the
+process: every Firestore RPC (through the client's API object, sync or
+async, streams until they're exhausted) and every Cloudinary
+upload/destroy.
+
+The same dependency timings (plus JSON serialization) are also summed
+per request, for the Server-Timing header; see request_timings().
+
+Recording is meant to sit on every request and RPC, so it takes no
+locks: each thread updates its own counters and histograms, and a scrape
+merges them. The shards of threads that have exited (werkzeug's threaded
+server starts one per request) are folded into a single retired shard
+when the next thread registers or on a scrape, so their number stays
+bounded by the live threads. Each process (e.g. gunicorn worker) reports its own
+numbers, so scrape workers individually or aggregate them in Prometheus.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+
+# Seconds; upper bounds of the histogram buckets (+Inf is implied).
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "http_requests_total": ("counter", "Requests served, by route and status."),
+    "http_request_duration_seconds": ("histogram", "Time to serve a request, by route."),
+    "dependency_call_duration_seconds": ("histogram", "Time spent in Firestore and Cloudinary calls."),
+    "dependency_errors_total": ("counter", "Firestore and Cloudinary calls that raised."),
+    "image_bytes_received_total": ("counter", "Bytes of uploaded images as the client sent them."),
+    "image_bytes_uploaded_total": ("counter", "Bytes of those images sent on to Cloudinary."),
+    "image_preprocess_duration_seconds": ("histogram", "Time to decode, downscale and re-encode an image."),
+}
+
+
+class Metrics:
+    """Counters and histograms aggregated per thread, merged on collect()."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []        # (thread, (counters, histograms))
+        self._retired = ({}, {})  # what exited threads recorded
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            # (counters, histograms) owned by this thread; the lock is only
+            # taken once per thread, to register it for collect().
+            shard = self._local.shard = ({}, {})
+            with self._lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _prune(self):
+        # A thread that has exited won't write to its shard again, so it
+        # can be merged without copying. Called with the lock held.
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def inc(self, name, labels, amount=1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        slots = histograms.get(key)
+        if slots is None:
+            # One count per bucket, then +Inf, then the running sum.
+            slots = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[-1] += value
+
+    def collect(self):
+        """Merged ({(name, labels): value}, {(name, labels): slots})."""
+        merged = ({}, {})
+        with self._lock:
+            self._prune()
+            _merge(merged, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            for counters, histograms in [self._retired, *(s for _, s in self._shards)]:
+                counters.clear()
+                histograms.clear()
+
+    def render(self):
+        """Everything collected, in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), slots in histograms.items():
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), slots):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(slots[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        out = []
+        for name in sorted(series):
+            kind, help_text = HELP.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(sorted(series[name]))
+        return "\n".join(out) + "\n"
+
+
+def _merge(into, shard):
+    """Add one shard's counters and histograms into `into`."""
+    counters, histograms = into
+    shard_counters, shard_histograms = shard
+    # dict.copy() is atomic under the GIL, iteration isn't.
+    for key, value in shard_counters.copy().items():
+        counters[key] = counters.get(key, 0) + value
+    for key, slots in shard_histograms.copy().items():
+        merged = histograms.setdefault(key, [0] * len(slots))
+        for i, value in enumerate(list(slots)):
+            merged[i] += value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# One registry per process, shared by every app and thread in it.
+METRICS = Metrics()
+
+
+# Seconds spent per dependency during the current request; None outside one.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def request_timings():
+    """{"firestore": seconds, ...} so far in this request (empty outside one)."""
+    return _request_timings.get() or {}
+
+
+def add_request_timing(name, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def record_dependency_call(dependency, operation, seconds, failed=False):
+    add_request_timing(dependency, seconds)
+    labels = (("dependency", dependency), ("operation", operation))
+    METRICS.observe("dependency_call_duration_seconds", labels, seconds)
+    if failed:
+        METRICS.inc("dependency_errors_total", labels)
+
+
+@contextmanager
+def timed(dependency, operation):
+    """Time the enclosed call as one `dependency` `operation`."""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record_dependency_call(dependency, operation, time.perf_counter() - start, failed)
+
+
+class _TimedStream:
+    """A server-streaming RPC's response iterator, timed until exhausted."""
+
+    def __init__(self, stream, operation, start):
+        self._stream = stream
+        self._operation = operation
+        self._start = start
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self._finish(False)
+            raise
+        except BaseException:
+            self._finish(True)
+            raise
+
+    def _finish(self, failed):
+        if not self._done:
+            self._done = True
+            record_dependency_call("firestore", self._operation,
+                                   time.perf_counter() - self._start, failed)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _TimedAsyncStream(_TimedStream):
+    """The async client's equivalent, timed until the last item is read."""
+
+    def __init__(self, stream, operation, start):
+        super().__init__(stream.__aiter__(), operation, start)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._finish(False)
+            raise
+        except BaseException:
+            self._finish(True)
+            raise
+
+
+class TimedFirestoreAPI:
+    """
+    Wraps the Firestore client's generated API object, through which every
+    RPC goes (commit, batch_get_documents, run_query, ...), and times each
+    call. Streaming responses are timed until they've been read.
+    """
+
+    STREAMING = frozenset({
+        "batch_get_documents", "run_query", "run_aggregation_query", "execute_pipeline",
+    })
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except BaseException:
+                record_dependency_call("firestore", name, time.perf_counter() - start, True)
+                raise
+            if name in self.STREAMING:
+                return _TimedStream(iter(result), name, start)
+            record_dependency_call("firestore", name, time.perf_counter() - start)
+            return result
+
+        return call
+
+
+class TimedAsyncFirestoreAPI(TimedFirestoreAPI):
+    """TimedFirestoreAPI for the async client, whose RPC methods are coroutines."""
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await attr(*args, **kwargs)
+            except BaseException:
+                record_dependency_call("firestore", name, time.perf_counter() - start, True)
+                raise
+            if name in self.STREAMING:
+                return _TimedAsyncStream(result, name, start)
+            record_dependency_call("firestore", name, time.perf_counter() - start)
+            return result
+
+        return call
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+    _request_timings.set({})
+
+
+def _record_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _record_request(exc=None):
+    start = g.pop("_metrics_start", None)
+    if start is None:
+        return
+    _request_timings.set(None)
+    status = 500 if exc is not None else g.pop("_metrics_status", 500)
+    rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    labels = (("blueprint", request.blueprint or ""), ("route", rule), ("method", request.method))
+    METRICS.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+    METRICS.inc("http_requests_total", labels + (("status", str(status)),))
+
+
+def init_metrics(app):
+    # teardown_request runs after a streamed body has been fully written.
+    app.before_request(_start_timer)
+    app.after_request(_record_status)
+    app.teardown_request(_record_request)
+    app.extensions["metrics"] = METRICS
+    return METRICS
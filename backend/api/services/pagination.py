@@ -0,0 +1,52 @@
+"""
+Opaque page cursors for list endpoints.
+
+A cursor is the sort key of the last item on a page (for recipes:
+datePosted and postId), JSON-encoded and base64url'd so clients treat it
+as a token. The next page starts strictly after that key, so paging never
+needs an offset scan and is stable while new recipes are being added.
+"""
+import base64
+import binascii
+import json
+
+CURSOR_VERSION = 1
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(*values):
+    raw = json.dumps([CURSOR_VERSION, *values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, size):
+    """
+    Return the `size` values stored in `token`.
+    Raises ValueError for anything we didn't issue.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != size + 1
+        or values[0] != CURSOR_VERSION
+    ):
+        raise ValueError("Invalid cursor")
+    return values[1:]
+
+
+def parse_page_size(raw):
+    """Parse a `limit` query param, falling back to DEFAULT_PAGE_SIZE."""
+    if raw is None or raw == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
@@ -0,0 +1,229 @@
+"""
+Opt-in request profiling and the Server-Timing header.
+
+A request is profiled when either
+  - its route is listed in PROFILE_ROUTES ("*" for all) and it falls in
+    the PROFILE_SAMPLE_RATE fraction of requests, or
+  - it carries `X-Profile: <PROFILE_SECRET>` (ignored while no secret is
+    configured), for profiling one request on demand.
+Routes are named by endpoint ("recipes.update_recipe_route"), view name
+without the "_route" suffix ("update_recipe") or URL rule
+("/api/recipes/<post_id>").
+
+PROFILE_FORMAT picks what's written to PROFILE_DIR, one file per request:
+  - "collapsed" (default): a background thread samples the request
+    thread's stack every PROFILE_INTERVAL_MS; one "frame;frame;... count"
+    line per stack, ready for flamegraph.pl or speedscope. Cheap enough to
+    leave on for a fraction of production traffic.
+  - "pstats": cProfile for the whole request (`python -m pstats file`).
+    Exact call counts, but it slows the profiled request down noticeably.
+Only the newest PROFILE_KEEP files are kept.
+
+Profiled requests (and every request when SERVER_TIMING is on) get a
+Server-Timing header with the time spent in Firestore, Cloudinary and
+JSON serialization, plus the total. Streamed bodies are sent after the
+header, so their time isn't in it.
+"""
+import cProfile
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import current_app, g, request
+
+from .metrics import request_timings
+
+PROFILE_HEADER = "X-Profile"
+SERVER_TIMING_PARTS = ("firestore", "cloudinary", "serialization")
+FORMATS = {"collapsed": ".collapsed", "pstats": ".prof"}
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse_stack(frame):
+    """A frame's stack as "outermost;...;innermost"."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.counts[collapse_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class CallProfiler:
+    """cProfile over the request thread."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class RequestProfiler:
+    def __init__(self, directory="profiles", routes=(), sample_rate=0.0, secret="",
+                 fmt="collapsed", interval=0.005, keep=100):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown PROFILE_FORMAT '{fmt}' (expected one of: {', '.join(FORMATS)}).")
+        self.directory = directory
+        self.routes = frozenset(routes)
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.format = fmt
+        self.interval = interval
+        self.keep = keep
+        self._rotate_lock = threading.Lock()
+
+    def _route_selected(self):
+        if not self.routes or not self.sample_rate or request.url_rule is None:
+            return False
+        if "*" not in self.routes:
+            endpoint = request.endpoint or ""
+            view = endpoint.rsplit(".", 1)[-1]
+            names = {endpoint, view, view.removesuffix("_route"), request.url_rule.rule}
+            if self.routes.isdisjoint(names):
+                return False
+        return random.random() < self.sample_rate
+
+    def should_profile(self):
+        header = request.headers.get(PROFILE_HEADER)
+        # As bytes: compare_digest() only takes ASCII str.
+        if header and self.secret and hmac.compare_digest(header.encode(),
+                                                          self.secret.encode()):
+            return True
+        return self._route_selected()
+
+    def start(self):
+        if self.format == "collapsed":
+            profiler = StackSampler(threading.get_ident(), self.interval)
+        else:
+            profiler = CallProfiler()
+        try:
+            profiler.start()
+        except ValueError:
+            # cProfile allows one active profiler at a time (Python 3.12+).
+            return None, None
+        name = "{}-{}-{}{}".format(
+            time.strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:8],
+            (request.endpoint or "unmatched").replace(".", "-"), FORMATS[self.format])
+        return profiler, name
+
+    def finish(self, profiler, name):
+        profiler.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.write(os.path.join(self.directory, name))
+        self._rotate()
+
+    def _rotate(self):
+        with self._rotate_lock:
+            suffixes = tuple(FORMATS.values())
+            paths = [os.path.join(self.directory, n) for n in os.listdir(self.directory)
+                     if n.endswith(suffixes)]
+            if len(paths) <= self.keep:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.keep]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+def server_timing(total):
+    timings = request_timings()
+    parts = [f"{name};dur={timings.get(name, 0.0) * 1000:.1f}" for name in SERVER_TIMING_PARTS]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _start_profile():
+    profiler = get_profiler()
+    if profiler.should_profile():
+        running, name = profiler.start()
+        if running is not None:
+            g._profile = (running, name)
+    if current_app.config["SERVER_TIMING"] or "_profile" in g:
+        g._timing_start = time.perf_counter()
+
+
+def _add_server_timing(response):
+    start = g.get("_timing_start")
+    if start is not None:
+        response.headers["Server-Timing"] = server_timing(time.perf_counter() - start)
+    if "_profile" in g:
+        response.headers["X-Profile-File"] = g._profile[1]
+    return response
+
+
+def _write_profile(exc=None):
+    profile = g.pop("_profile", None)
+    if profile is None:
+        return
+    try:
+        get_profiler().finish(*profile)
+    except OSError:
+        current_app.logger.exception("Could not write profile %s", profile[1])
+
+
+def init_profiling(app):
+    profiler = RequestProfiler(
+        directory=app.config["PROFILE_DIR"],
+        routes=[r.strip() for r in app.config["PROFILE_ROUTES"].split(",") if r.strip()],
+        sample_rate=app.config["PROFILE_SAMPLE_RATE"],
+        secret=app.config["PROFILE_SECRET"],
+        fmt=app.config["PROFILE_FORMAT"],
+        interval=app.config["PROFILE_INTERVAL_MS"] / 1000.0,
+        keep=app.config["PROFILE_KEEP"],
+    )
+    app.before_request(_start_profile)
+    app.after_request(_add_server_timing)
+    app.teardown_request(_write_profile)
+    app.extensions["profiler"] = profiler
+    return profiler
+
+
+def get_profiler():
+    return current_app.extensions["profiler"]
@@ -1,97 +1,834 @@
+import asyncio
+import json
+import time
 import uuid
-from firebase_admin import firestore
-import cloudinary
-import cloudinary.uploader
+from datetime import datetime
+from flask import current_app
+from .cache import get_recipe_cache, cache_get, cache_set
+from .image_pool import upload_all, destroy_all, upload_all_async, destroy_all_async
+from .image_processing import get_image_preprocessor
+from .likes import delete_recipe_likes, delete_recipe_likes_async
+from .ingredients import get_ingredient_index
+from .search import get_search_index
+from .storage import get_async_db, get_backend, get_db
+
+# How many times a precondition write is retried after losing a race.
+UPDATE_ATTEMPTS = 3
+
+# Firestore caps a batched write at 500 operations.
+IMPORT_BATCH_SIZE = 500
+EXPORT_PAGE_SIZE = 200
+# Fields kept from an imported line; anything else (e.g. computed likes)
+# is dropped.
+IMPORT_FIELDS = (
+    "postId", "title", "description", "cookingTime", "difficulty", "servings",
+    "datePosted", "ingredients", "instructions", "imageList",
+)
+MAX_REPORTED_ERRORS = 100
+
+# What list screens show. Each recipe has a summary document with just
+# these (and coverImage) at users/<userId>/recipe_summaries/<postId>,
+# written in the same batch as the recipe, so ?view=summary lists and
+# feeds don't read the ingredients and instructions.
+SUMMARY_FIELDS = ("postId", "title", "cookingTime", "difficulty", "datePosted")
+# Recipe fields a summary is built from; an update touching none of them
+# leaves the summary alone.
+SUMMARY_SOURCES = frozenset(SUMMARY_FIELDS) | {"imageList"}
+
+
+class RecipeConflict(Exception):
+    """The recipe kept changing underneath an update; the client should retry."""
+
+
+def recipes_epoch_cache_key(user_id):
+    return f"recipes-epoch:{user_id}"
+
+
+def recipe_cache_key(user_id, post_id, epoch):
+    return f"recipe:{user_id}:{epoch}:{post_id}"
+
+
+def recipe_list_cache_key(user_id, epoch):
+    return f"recipes:{user_id}:{epoch}"
+
+
+def recipe_summaries_cache_key(user_id, epoch):
+    return f"recipe-summaries:{user_id}:{epoch}"
+
+
+def recipes_version_cache_key(user_id, epoch):
+    return f"recipes-version:{user_id}:{epoch}"
+
+
+def feed_cache_key(limit, summaries=False):
+    return f"feed:{'summaries' if summaries else 'first'}:{limit}"
+
+
+def _cache_epoch(cache, user_id):
+    """
+    The user's cache epoch, part of the key of every cached entry about
+    their recipes. Read it (starting one if there is none) before reading
+    Firestore: a write starts a new epoch once it has committed, so a
+    read that fetched before the write but stores after it stores under
+    the old epoch, where nothing looks any more, instead of overwriting
+    the invalidation. Entries of old epochs age out with the TTL.
+    """
+    key = recipes_epoch_cache_key(user_id)
+    epoch = cache.get(key)
+    if epoch is None:
+        epoch = uuid.uuid4().hex
+        cache.set(key, epoch)
+    return epoch
+
+
+def invalidate_recipe_cache(user_id):
+    """Drop every cached entry about the user's recipes by starting a new epoch."""
+    get_recipe_cache().set(recipes_epoch_cache_key(user_id), uuid.uuid4().hex)
+
+
+def _recipe_ref(db, user_id, post_id):
+    return (
+        db.collection("users")
+        .document(user_id)
+        .collection("created_recipes")
+        .document(post_id)
+    )
+
+
+def _summary_ref(db, user_id, post_id):
+    return (
+        db.collection("users")
+        .document(user_id)
+        .collection("recipe_summaries")
+        .document(post_id)
+    )
+
+
+def _collection_name(summaries):
+    return "recipe_summaries" if summaries else "created_recipes"
+
+
+def recipe_summary(recipe):
+    """The summary document for a (full) recipe."""
+    summary = {field: recipe.get(field) for field in SUMMARY_FIELDS}
+    images = recipe.get("imageList") or []
+    summary["coverImage"] = images[0].get("url") if images else None
+    return summary
+
+
+def _bump_recipes_version(writer, db, user_id):
+    """
+    Add a recipesVersion increment on the user's document to `writer` (a
+    batch or transaction), so it commits together with the recipe write.
+    It's a merge, so one commit works whether or not the user document
+    exists; for a userId without one it creates a document holding only
+    recipesVersion (no username or email, so no lookup ever finds it).
+
+    Every recipe write by one author lands on this one document, which
+    sustains about one write per second. An author writing faster than
+    that (a bulk import is one write per batch) sees commits slow down
+    or fail with contention errors.
+    """
+    from google.cloud.firestore import Increment
+
+    writer.set(db.collection("users").document(user_id),
+               {"recipesVersion": Increment(1)}, merge=True)
+
+
+def _commit_with_version(db, user_id, fill):
+    """
+    Commit a batch filled by fill(batch) plus the recipesVersion bump, in
+    one round trip. Returns the write results.
+    """
+    batch = db.batch()
+    fill(batch)
+    _bump_recipes_version(batch, db, user_id)
+    return batch.commit()
+
+
+async def _commit_with_version_async(db, user_id, fill):
+    batch = db.batch()
+    fill(batch)
+    _bump_recipes_version(batch, db, user_id)
+    return await batch.commit()
+
+
+def get_recipes_version(user_id):
+    """
+    A number that changes whenever any of the user's recipes is created,
+    updated or deleted, for list ETags. Cached like the list itself.
+    None if the user has no document (no recipe write has bumped it yet).
+    """
+    cache = get_recipe_cache()
+    key = recipes_version_cache_key(user_id, _cache_epoch(cache, user_id))
+    cached = cache_get(cache, key)
+    if cached is not None:
+        return cached
+    doc = get_db().collection("users").document(user_id).get(field_paths=["recipesVersion"])
+    if not doc.exists:
+        return None
+    version = (doc.to_dict() or {}).get("recipesVersion", 0)
+    cache_set(cache, key, version)
+    return version
+
+
+def _index_recipe(user_id, post_id, recipe):
+    # Keep this process's in-memory indexes in step with the write.
+    get_search_index().add(user_id, post_id, recipe)
+    get_ingredient_index().add(user_id, post_id, recipe)
+
+
+def _unindex_recipe(user_id, post_id):
+    get_search_index().remove(user_id, post_id)
+    get_ingredient_index().remove(user_id, post_id)
+
+
+def _now():
+    # Every recipe write stamps dateUpdated, so the in-process indexes
+    # can re-read just what changed since they last caught up.
+    return datetime.utcnow().isoformat()
+
+
+def _project(recipe, fields):
+    projected = {f: recipe[f] for f in fields if f in recipe}
+    projected["id"] = recipe["id"]
+    return projected
 
 
 def create_recipe_in_firebase(user_id, recipe_data):
-    db = firestore.client()
+    db = get_db()
     user_ref = db.collection("users").document(user_id)
     subcol_ref = user_ref.collection("created_recipes")
 
     post_id = recipe_data.get("postId") or str(uuid.uuid4())
     recipe_data["postId"] = post_id
+    recipe_data["dateUpdated"] = _now()
 
     doc_ref = subcol_ref.document(post_id)
-    doc_ref.set(recipe_data)
+
+    def fill(batch):
+        batch.set(doc_ref, recipe_data)
+        batch.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe_data))
+
+    _commit_with_version(db, user_id, fill)
+    invalidate_recipe_cache(user_id)
+    _index_recipe(user_id, post_id, recipe_data)
     return post_id
 
 
-def get_all_recipes_from_firebase(user_id):
-    print(f"Fetching recipes for user: {user_id}")
-    db = firestore.client()
+def get_all_recipes_from_firebase(user_id, fields=None, summaries=False):
+    """
+    All of a user's recipes, served from the recipe cache when possible.
+    Only the full documents are cached; a `fields` projection is applied
+    to the cached list, so every projection shares one cache entry.
+    With `summaries`, the recipes' summary documents instead (cached
+    separately).
+    """
+    return list(iter_all_recipes_from_firebase(user_id, fields, summaries))
+
+
+def iter_all_recipes_from_firebase(user_id, fields=None, summaries=False):
+    """
+    Like get_all_recipes_from_firebase, but yields each recipe as its
+    document arrives from the query stream, so a response can be written
+    while the rest are still being read. The list is cached once the
+    stream is exhausted. A read error is raised, wherever in the stream
+    it happens, so a partial list never passes for the whole one.
+    """
+    cache = get_recipe_cache()
+    epoch = _cache_epoch(cache, user_id)
+    key = (recipe_summaries_cache_key if summaries else recipe_list_cache_key)(user_id, epoch)
+    cached = cache_get(cache, key)
+    if cached is not None:
+        yield from ([_project(r, fields) for r in cached] if fields else cached)
+        return
+
+    db = get_db()
     recipes_ref = db.collection("users").document(
-        user_id).collection("created_recipes")
+        user_id).collection(_collection_name(summaries))
+    if fields and not cache.enabled:
+        recipes_ref = recipes_ref.select(fields)
 
+    recipes = []
     try:
-        docs = recipes_ref.get()
-        print(f"Query returned {len(docs)} documents")
-
-        recipes = []
-        for doc in docs:
+        for doc in recipes_ref.stream():
             recipe_data = doc.to_dict()
             recipe_data["id"] = doc.id
+            if not cache.enabled:
+                yield recipe_data
+                continue
+            # Callers may annotate what they get; cache the document as read.
             recipes.append(recipe_data)
+            yield _project(recipe_data, fields) if fields else dict(recipe_data)
+    except Exception:
+        current_app.logger.exception("Error fetching recipes for user %s", user_id)
+        raise
 
-        print(f"Returning {len(recipes)} recipes")
-        return recipes
-    except Exception as e:
-        print(f"Error fetching recipes: {e}")
-        return []
+    if cache.enabled:
+        cache_set(cache, key, recipes)
 
 
-def get_recipe_from_firebase(user_id, post_id):
-    db = firestore.client()
-    doc_ref = (
+def get_recipes_page_from_firebase(user_id, limit, cursor=None, fields=None, summaries=False):
+    """
+    One page of a user's recipes, newest first (datePosted, then postId).
+    `cursor` is the (datePosted, postId) of the last recipe on the previous
+    page; `fields` optionally limits which fields are read, `summaries`
+    reads the summary documents instead.
+    Returns (recipes, next_cursor); next_cursor is None on the last page.
+    """
+    db = get_db()
+    query = (
         db.collection("users")
         .document(user_id)
-        .collection("created_recipes")
-        .document(post_id)
+        .collection(_collection_name(summaries))
+        .order_by("datePosted", direction="DESCENDING")
+        .order_by("__name__", direction="DESCENDING")
     )
-    doc = doc_ref.get()
-    return doc.to_dict() if doc.exists else None
+    if fields:
+        # datePosted is always read so we can build the next cursor.
+        query = query.select(list(dict.fromkeys([*fields, "datePosted"])))
+    if cursor:
+        date_posted, post_id = cursor
+        query = query.start_after({"datePosted": date_posted, "__name__": post_id})
 
+    # Read one extra doc to learn whether another page exists.
+    docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    docs = docs[:limit]
 
-def update_recipe_in_firebase(user_id, post_id, updated_data):
-    db = firestore.client()
-    doc_ref = (
+    recipes = []
+    for doc in docs:
+        recipe_data = doc.to_dict()
+        if fields and "datePosted" not in fields:
+            recipe_data.pop("datePosted", None)
+        recipe_data["id"] = doc.id
+        recipes.append(recipe_data)
+
+    next_cursor = None
+    if has_more and docs:
+        next_cursor = (docs[-1].get("datePosted"), docs[-1].id)
+    return recipes, next_cursor
+
+
+def iter_recipes_from_firebase(user_id, page_size=None):
+    """
+    Yield every one of a user's recipes, reading page_size documents at a
+    time (ordered by document ID, so no index is needed), so memory use
+    doesn't grow with the number of recipes. Bypasses the cache.
+    """
+    page_size = page_size or EXPORT_PAGE_SIZE
+    db = get_db()
+    query = (
         db.collection("users")
         .document(user_id)
         .collection("created_recipes")
-        .document(post_id)
+        .order_by("__name__")
+        .limit(page_size)
+    )
+    last = None
+    while True:
+        page = query.start_after(last) if last is not None else query
+        docs = list(page.stream())
+        for doc in docs:
+            recipe = doc.to_dict()
+            recipe["id"] = doc.id
+            yield recipe
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def import_recipes_to_firebase(user_id, lines, batch_size=(IMPORT_BATCH_SIZE - 1) // 2):
+    """
+    Import NDJSON `lines` (bytes or str, one recipe object per line) as
+    the user's recipes, parsing as they arrive and committing every
+    batch_size recipes (each with its summary, plus the recipesVersion
+    bump) in one batched write. A line with a postId
+    replaces that recipe. Bad lines are skipped and reported.
+    Returns {"imported", "failed", "errors": [{"line", "error"}],
+    "seconds", "recipesPerSecond"}.
+    """
+    db = get_db()
+    recipes_ref = db.collection("users").document(user_id).collection("created_recipes")
+    start = time.perf_counter()
+    report = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line_no, error):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_no, "error": error})
+
+    def commit(pending):
+        def fill(batch):
+            for _, post_id, recipe in pending:
+                batch.set(recipes_ref.document(post_id), recipe)
+                batch.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe))
+
+        try:
+            _commit_with_version(db, user_id, fill)
+        except Exception as e:
+            for line_no, _, _ in pending:
+                fail(line_no, f"Write failed: {e}")
+            return
+        report["imported"] += len(pending)
+        invalidate_recipe_cache(user_id)
+        for _, post_id, recipe in pending:
+            _index_recipe(user_id, post_id, recipe)
+
+    pending, pending_ids = [], set()
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            fail(line_no, f"Invalid JSON: {e}")
+            continue
+        if not isinstance(data, dict):
+            fail(line_no, "Expected a JSON object")
+            continue
+        recipe = {field: data[field] for field in IMPORT_FIELDS if field in data}
+        post_id = recipe.get("postId") or str(uuid.uuid4())
+        if not isinstance(post_id, str) or "/" in post_id:
+            fail(line_no, "Invalid postId")
+            continue
+        recipe["postId"] = post_id
+        recipe.setdefault("datePosted", datetime.utcnow().isoformat())
+        recipe["dateUpdated"] = _now()
+        if post_id in pending_ids:
+            # One write per document per batch: flush before repeating one.
+            commit(pending)
+            pending, pending_ids = [], set()
+        pending.append((line_no, post_id, recipe))
+        pending_ids.add(post_id)
+        if len(pending) == batch_size:
+            commit(pending)
+            pending, pending_ids = [], set()
+    if pending:
+        commit(pending)
+
+    seconds = time.perf_counter() - start
+    report["seconds"] = round(seconds, 3)
+    report["recipesPerSecond"] = round(report["imported"] / seconds, 1) if seconds else None
+    return report
+
+
+def backfill_recipe_summaries():
+    """
+    Write the summary document of every existing recipe, e.g. for recipes
+    created before summaries existed. Safe to re-run; returns how many
+    summaries were written.
+    """
+    db = get_db()
+    user_ids = set()
+    written = 0
+    batch = db.batch()
+    for doc in db.collection_group("created_recipes").stream():
+        user_id = doc.reference.parent.parent.id
+        batch.set(_summary_ref(db, user_id, doc.id),
+                  recipe_summary(dict(doc.to_dict(), postId=doc.id)))
+        user_ids.add(user_id)
+        written += 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+    if len(batch):
+        batch.commit()
+    for user_id in user_ids:
+        invalidate_recipe_cache(user_id)
+    return written
+
+
+def get_feed_page_from_firebase(limit, cursor=None, fields=None, summaries=False):
+    """
+    One page of everyone's recipes, newest first, from a collection-group
+    query over every users/<userId>/created_recipes (needs the
+    created_recipes.datePosted collection-group index in
+    firestore.indexes.json), or over recipe_summaries with `summaries`.
+    Each recipe carries its author's userId.
+    `cursor` is the (datePosted, userId, postId) of the last recipe on
+    the previous page.
+
+    The first page gets most of the traffic, so it's cached for
+    FEED_CACHE_TTL seconds; a new recipe may take that long to show up.
+    Returns (recipes, next_cursor); next_cursor is None on the last page.
+    """
+    cache = get_recipe_cache()
+    ttl = current_app.config["FEED_CACHE_TTL"]
+    cache_first_page = cursor is None and cache.enabled and ttl > 0
+    if cache_first_page:
+        cached = cache_get(cache, feed_cache_key(limit, summaries))
+        if cached is not None:
+            recipes, next_cursor = cached["recipes"], cached["nextCursor"]
+            if fields:
+                recipes = [dict(_project(r, fields), userId=r["userId"]) for r in recipes]
+            return recipes, next_cursor
+
+    db = get_db()
+    query = (
+        db.collection_group(_collection_name(summaries))
+        .order_by("datePosted", direction="DESCENDING")
+        .order_by("__name__", direction="DESCENDING")
     )
-    if not doc_ref.get().exists:
+    if fields and not cache_first_page:
+        query = query.select(list(dict.fromkeys([*fields, "datePosted"])))
+    if cursor:
+        date_posted, user_id, post_id = cursor
+        # Collection-group cursors need the full document path, not an ID.
+        query = query.start_after({
+            "datePosted": date_posted,
+            "__name__": (_summary_ref if summaries else _recipe_ref)(db, user_id, post_id),
+        })
+
+    # Read one extra doc to learn whether another page exists.
+    docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    recipes = []
+    for doc in docs:
+        recipe_data = doc.to_dict()
+        recipe_data["id"] = doc.id
+        recipe_data["userId"] = doc.reference.parent.parent.id
+        recipes.append(recipe_data)
+
+    next_cursor = None
+    if has_more and docs:
+        last = docs[-1]
+        next_cursor = [last.get("datePosted"), last.reference.parent.parent.id, last.id]
+
+    if cache_first_page:
+        cache_set(cache, feed_cache_key(limit, summaries),
+                  {"recipes": recipes, "nextCursor": next_cursor}, ttl=ttl)
+    if fields:
+        recipes = [dict(_project(r, fields), userId=r["userId"]) for r in recipes]
+    return recipes, next_cursor
+
+
+def get_recipe_from_firebase(user_id, post_id):
+    return get_recipe_with_update_time_from_firebase(user_id, post_id)[0]
+
+
+def get_recipe_with_update_time_from_firebase(user_id, post_id):
+    """
+    (recipe, update_time) through the recipe cache; update_time is the
+    document's last write time as a string, for ETags. (None, None) if
+    the recipe doesn't exist.
+    """
+    db = get_db()
+    doc_ref = _recipe_ref(db, user_id, post_id)
+    cache = get_recipe_cache()
+    key = recipe_cache_key(user_id, post_id, _cache_epoch(cache, user_id))
+    cached = cache_get(cache, key)
+    if cached is not None:
+        return cached["recipe"], cached["updateTime"]
+
+    doc = doc_ref.get()
+    if not doc.exists:
+        return None, None
+    recipe = doc.to_dict()
+    update_time = str(doc.update_time)
+    cache_set(cache, key, {"recipe": recipe, "updateTime": update_time})
+    return recipe, update_time
+
+
+def get_recipe_image_status_from_firebase(user_id, post_id):
+    """
+    Just the imageStatus field, read straight from Firestore: the status
+    is written by a background worker, possibly in another process, so a
+    cached copy of the recipe could be stale. Returns None if the recipe
+    doesn't exist, {} if it has no pending image work.
+    """
+    db = get_db()
+    doc = _recipe_ref(db, user_id, post_id).get(field_paths=["imageStatus"])
+    if not doc.exists:
         return None
-    doc_ref.update(updated_data)
-    return doc_ref.get().to_dict()
+    return (doc.to_dict() or {}).get("imageStatus", {})
+
+
+def update_recipe_in_firebase(user_id, post_id, updated_data):
+    """
+    Apply a partial update and return the merged recipe.
+    One read plus one write: the update carries a last-update-time
+    precondition, and the result is merged locally from the snapshot we
+    read, so no read-back is needed. If someone else wrote in between,
+    re-read and try again (RecipeConflict after UPDATE_ATTEMPTS).
+    Returns None if the recipe doesn't exist.
+    """
+    from google.api_core import exceptions
+
+    db = get_db()
+    doc_ref = _recipe_ref(db, user_id, post_id)
+    updated_data = dict(updated_data, dateUpdated=_now())
+    for _ in range(UPDATE_ATTEMPTS):
+        snapshot = doc_ref.get()
+        if not snapshot.exists:
+            return None
+        recipe = snapshot.to_dict()
+        recipe.update(updated_data)
+
+        def fill(batch):
+            batch.update(
+                doc_ref,
+                updated_data,
+                option=db.write_option(last_update_time=snapshot.update_time),
+            )
+            if SUMMARY_SOURCES.intersection(updated_data):
+                batch.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe))
+
+        try:
+            _commit_with_version(db, user_id, fill)
+        except exceptions.NotFound:
+            return None
+        except exceptions.FailedPrecondition:
+            continue
+        _recipe_updated(user_id, post_id, recipe)
+        return recipe
+    raise RecipeConflict(post_id)
+
+
+def update_recipe_images_in_firebase(user_id, post_id, updated_data,
+                                     remove_ids=(), new_images=()):
+    """
+    Update a recipe whose imageList changes. The imageList is recomputed
+    from the document as read inside a transaction (drop remove_ids,
+    append new_images), so two concurrent edits can't drop each other's
+    images. Still one read and one write when uncontended.
+    Returns (recipe, removed_images); recipe is None if it doesn't exist.
+    """
+    from firebase_admin import firestore
+
+    db = get_db()
+    doc_ref = _recipe_ref(db, user_id, post_id)
+    remove_ids = set(remove_ids)
+
+    @firestore.transactional
+    def apply(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None, []
+        current_images = snapshot.to_dict().get("imageList", [])
+        removed = [img for img in current_images if img["publicId"] in remove_ids]
+        kept = [img for img in current_images if img["publicId"] not in remove_ids]
+        changes = dict(updated_data, imageList=kept + list(new_images), dateUpdated=_now())
+        recipe = snapshot.to_dict()
+        recipe.update(changes)
+        transaction.update(doc_ref, changes)
+        transaction.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe))
+        _bump_recipes_version(transaction, db, user_id)
+        return recipe, removed
+
+    try:
+        recipe, removed = apply(db.transaction(max_attempts=UPDATE_ATTEMPTS))
+    except ValueError:
+        # firestore.transactional gives up with ValueError once retries are spent.
+        raise RecipeConflict(post_id)
+    if recipe is not None:
+        _recipe_updated(user_id, post_id, recipe)
+    return recipe, removed
+
+
+def _recipe_updated(user_id, post_id, recipe):
+    # The entry isn't refreshed with what we committed: two updates of one
+    # recipe could store theirs in the opposite order to their commits.
+    invalidate_recipe_cache(user_id)
+    _index_recipe(user_id, post_id, recipe)
 
 
 def delete_recipe_from_firebase(user_id, post_id):
-    db = firestore.client()
-    doc_ref = (
-        db.collection("users")
-        .document(user_id)
-        .collection("created_recipes")
-        .document(post_id)
-    )
-    if not doc_ref.get().exists:
-        return False
-    doc_ref.delete()
-    return True
+    """Single delete with an exists precondition; False if it wasn't there."""
+    from google.api_core import exceptions
+
+    db = get_db()
+    doc_ref = _recipe_ref(db, user_id, post_id)
+
+    def fill(batch):
+        batch.delete(doc_ref, option=db.write_option(exists=True))
+        batch.delete(_summary_ref(db, user_id, post_id))
 
+    try:
+        _commit_with_version(db, user_id, fill)
+        deleted = True
+    except exceptions.NotFound:
+        deleted = False
+    # Drop cached copies either way; a miss here may mean the cache was stale.
+    invalidate_recipe_cache(user_id)
+    _unindex_recipe(user_id, post_id)
+    if deleted:
+        delete_recipe_likes(user_id, post_id)
+    return deleted
+
+
+def _image_entries(results):
+    return [
+        {"url": result["secure_url"], "publicId": result["public_id"]}
+        for result in results
+    ]
 
-def upload_images_to_cloudinary(file_list):
-    image_entries = []
-    for file_obj in file_list:
-        public_id = "recipe_" + str(uuid.uuid4())
-        result = cloudinary.uploader.upload(
-            file_obj, public_id=public_id, folder="recipe_images"
-        )
-        image_entries.append(
-            {"url": result["secure_url"], "publicId": result["public_id"]}
-        )
-    return image_entries
+
+def upload_images_to_cloudinary(file_list, on_upload=None):
+    """
+    Downscale the files (see image_processing), then upload them all
+    concurrently on the shared image pool, preserving order. Raises
+    ImageTooLarge before uploading anything if a file is over the limit,
+    ImageUploadError (after cleaning up) if any upload fails.
+    """
+    file_list = get_image_preprocessor().prepare(file_list)
+    files = [(file_obj, "recipe_" + str(uuid.uuid4())) for file_obj in file_list]
+    return _image_entries(upload_all(
+        get_backend(), files, "recipe_images",
+        timeout=current_app.config["IMAGE_UPLOAD_TIMEOUT"],
+        on_complete=on_upload,
+    ))
 
 
 def delete_image_from_cloudinary(public_id):
-    cloudinary.uploader.destroy(public_id)
+    get_backend().destroy_image(public_id)
+
+
+def delete_images_from_cloudinary(public_ids):
+    """Bulk destroy: one multi-ID call per 100 images."""
+    if public_ids:
+        destroy_all(get_backend(), public_ids)
+
+
+# -- coroutines for the ASGI mode, through the async client --
+#
+# Same documents, cache entries and index updates as the functions above.
+# Writes that the sync side does in a transaction use a precondition and
+# retry instead, so they stay one read and one write with no transaction
+# round trips.
+
+
+async def upload_images_async(file_list):
+    """upload_images_to_cloudinary() with every upload awaited at once."""
+    file_list = await get_image_preprocessor().prepare_async(file_list)
+    files = [(file_obj, "recipe_" + str(uuid.uuid4())) for file_obj in file_list]
+    return _image_entries(await upload_all_async(
+        get_backend(), files, "recipe_images",
+        timeout=current_app.config["IMAGE_UPLOAD_TIMEOUT"],
+    ))
+
+
+async def delete_images_async(public_ids):
+    if public_ids:
+        await destroy_all_async(get_backend(), public_ids)
+
+
+async def create_recipe_async(user_id, recipe_data):
+    db = get_async_db()
+    post_id = recipe_data.get("postId") or str(uuid.uuid4())
+    recipe_data["postId"] = post_id
+    recipe_data["dateUpdated"] = _now()
+
+    def fill(batch):
+        batch.set(_recipe_ref(db, user_id, post_id), recipe_data)
+        batch.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe_data))
+
+    await _commit_with_version_async(db, user_id, fill)
+    invalidate_recipe_cache(user_id)
+    _index_recipe(user_id, post_id, recipe_data)
+    return post_id
+
+
+async def get_recipe_with_update_time_async(user_id, post_id):
+    cache = get_recipe_cache()
+    key = recipe_cache_key(user_id, post_id, _cache_epoch(cache, user_id))
+    cached = cache_get(cache, key)
+    if cached is not None:
+        return cached["recipe"], cached["updateTime"]
+
+    doc = await _recipe_ref(get_async_db(), user_id, post_id).get()
+    if not doc.exists:
+        return None, None
+    recipe = doc.to_dict()
+    update_time = str(doc.update_time)
+    cache_set(cache, key, {"recipe": recipe, "updateTime": update_time})
+    return recipe, update_time
+
+
+async def update_recipe_async(user_id, post_id, updated_data, remove_ids=(), new_files=()):
+    """
+    update_recipe_in_firebase() and update_recipe_images_in_firebase() in
+    one: apply `updated_data`, drop `remove_ids` from the imageList and
+    append `new_files` once uploaded. The uploads and the first read of
+    the recipe run side by side. The write carries a last-update-time
+    precondition and is retried on a race (RecipeConflict after
+    UPDATE_ATTEMPTS), so the imageList is always recomputed from what is
+    stored. Uploads the write didn't use are destroyed again.
+    Returns (recipe, removed_images); recipe is None if it doesn't exist.
+    """
+    from google.api_core import exceptions
+
+    db = get_async_db()
+    doc_ref = _recipe_ref(db, user_id, post_id)
+    remove_ids = set(remove_ids)
+    new_images = []
+    if new_files:
+        snapshot, new_images = await asyncio.gather(
+            doc_ref.get(), upload_images_async(new_files), return_exceptions=True)
+        if isinstance(new_images, BaseException):
+            raise new_images
+        if isinstance(snapshot, BaseException):
+            await delete_images_async([img["publicId"] for img in new_images])
+            raise snapshot
+    else:
+        snapshot = await doc_ref.get()
+    unused = [img["publicId"] for img in new_images]
+
+    for attempt in range(UPDATE_ATTEMPTS):
+        if attempt:
+            snapshot = await doc_ref.get()
+        if not snapshot.exists:
+            await delete_images_async(unused)
+            return None, []
+        recipe = snapshot.to_dict()
+        changes = dict(updated_data, dateUpdated=_now())
+        removed = []
+        if remove_ids or new_images:
+            current_images = recipe.get("imageList", [])
+            removed = [img for img in current_images if img["publicId"] in remove_ids]
+            kept = [img for img in current_images if img["publicId"] not in remove_ids]
+            changes["imageList"] = kept + new_images
+        recipe.update(changes)
+
+        def fill(batch):
+            batch.update(doc_ref, changes,
+                         option=db.write_option(last_update_time=snapshot.update_time))
+            if SUMMARY_SOURCES.intersection(changes):
+                batch.set(_summary_ref(db, user_id, post_id), recipe_summary(recipe))
+
+        try:
+            await _commit_with_version_async(db, user_id, fill)
+        except exceptions.NotFound:
+            await delete_images_async(unused)
+            return None, []
+        except exceptions.FailedPrecondition:
+            continue
+        _recipe_updated(user_id, post_id, recipe)
+        return recipe, removed
+    await delete_images_async(unused)
+    raise RecipeConflict(post_id)
+
+
+async def delete_recipe_async(user_id, post_id):
+    from google.api_core import exceptions
+
+    db = get_async_db()
+
+    def fill(batch):
+        batch.delete(_recipe_ref(db, user_id, post_id), option=db.write_option(exists=True))
+        batch.delete(_summary_ref(db, user_id, post_id))
+
+    try:
+        await _commit_with_version_async(db, user_id, fill)
+        deleted = True
+    except exceptions.NotFound:
+        deleted = False
+    invalidate_recipe_cache(user_id)
+    _unindex_recipe(user_id, post_id)
+    if deleted:
+        await delete_recipe_likes_async(user_id, post_id)
+    return deleted
@@ -0,0 +1,305 @@
+"""
+Preference-based recipe recommendations.
+
+Every recipe is a TF-IDF vector over the words in its title, description
+and ingredients (tokenized like search). The vectors are L2-normalized
+rows of one contiguous float32 matrix, so recommending is a single
+matrix-vector product against a user vector built from the user's
+`preferences` and `saved_recipes`, followed by an argpartition top-k.
+
+Loading or building the matrix is the expensive part and never runs on
+a request: a background thread, started by the first recommendation
+request in each process, does it every RECOMMEND_RELOAD_INTERVAL
+seconds and swaps the finished vectors in.
+  - RECOMMEND_MODEL_PATH: .npz written by the offline job
+    (`flask --app start_server build-recommendations`, e.g. from cron).
+    The thread loads it, and again whenever the file changes. A file that
+    fails to load is logged and skipped; the current vectors stay until
+    it changes again.
+  - Without a model file the thread builds the matrix from a
+    collection-group scan. A failed build is logged and the current
+    vectors kept.
+Until the first vectors are in, the endpoint returns 503.
+
+Needs the optional `numpy` package; without it the endpoint returns 503.
+"""
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+
+from .search import tokenize
+from .storage import get_db
+
+VECTOR_FIELDS = ("title", "description", "ingredients")
+MODEL_VERSION = 1
+# How much a user's stated preferences count next to their saved recipes.
+PREFERENCE_WEIGHT = 1.0
+
+
+class RecommendationsUnavailable(RuntimeError):
+    """numpy isn't installed, or no vectors have been loaded yet."""
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RecommendationsUnavailable(
+            "Recommendations require the 'numpy' package."
+        )
+    return numpy
+
+
+def _recipe_text(recipe):
+    parts = []
+    for field in VECTOR_FIELDS:
+        value = recipe.get(field)
+        if isinstance(value, (list, tuple)):
+            value = " ".join(map(str, value))
+        if value:
+            parts.append(str(value))
+    return " ".join(parts)
+
+
+def top_k(scores, k):
+    """
+    Indices of the k highest scores, best first. `scores` may be 1-D (one
+    user) or 2-D (one row per user, scored as a batch); argpartition keeps
+    this O(n) per row instead of a full sort.
+    """
+    np = _numpy()
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class RecipeVectors:
+    """The recipe matrix plus what's needed to vectorize a user."""
+
+    def __init__(self, matrix, idf, vocabulary, keys, titles):
+        self.matrix = matrix          # (recipes, terms) float32, rows L2-normalized
+        self.idf = idf                # (terms,) float32
+        self.vocabulary = vocabulary  # term -> column
+        self.keys = keys              # row -> (userId, postId)
+        self.titles = titles          # row -> title
+        self.rows_by_post = {}
+        self.rows_by_user = {}
+        for row, (user_id, post_id) in enumerate(keys):
+            self.rows_by_post[post_id] = row
+            self.rows_by_user.setdefault(user_id, []).append(row)
+
+    @classmethod
+    def build(cls, db, max_features=4096):
+        np = _numpy()
+        keys, titles, counts = [], [], []
+        df = Counter()
+        for doc in db.collection_group("created_recipes").stream():
+            recipe = doc.to_dict()
+            tf = Counter(tokenize(_recipe_text(recipe)))
+            keys.append((doc.reference.parent.parent.id, doc.id))
+            titles.append(recipe.get("title"))
+            counts.append(tf)
+            df.update(tf.keys())
+
+        # Keep the most widely used terms; rare ones add width, not signal.
+        terms = [term for term, _ in sorted(df.items(), key=lambda t: (-t[1], t[0]))[:max_features]]
+        vocabulary = {term: col for col, term in enumerate(terms)}
+        n = len(keys)
+        idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+
+        matrix = np.zeros((n, len(terms)), dtype=np.float32)
+        for row, tf in enumerate(counts):
+            for term, count in tf.items():
+                col = vocabulary.get(term)
+                if col is not None:
+                    matrix[row, col] = count
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return cls(np.ascontiguousarray(matrix), idf, vocabulary, keys, titles)
+
+    def save(self, path):
+        """Write the model to `path` atomically."""
+        np = _numpy()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(MODEL_VERSION),
+                    matrix=self.matrix,
+                    idf=self.idf,
+                    terms=np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str),
+                    keys=np.array(self.keys, dtype=str).reshape(-1, 2),
+                    titles=np.array([t or "" for t in self.titles], dtype=str),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        np = _numpy()
+        with np.load(path) as data:
+            if int(data["version"]) != MODEL_VERSION:
+                raise ValueError(f"Unsupported recommendation model version in {path}")
+            vocabulary = {str(term): col for col, term in enumerate(data["terms"])}
+            keys = [(str(user_id), str(post_id)) for user_id, post_id in data["keys"]]
+            return cls(np.ascontiguousarray(data["matrix"]), data["idf"], vocabulary,
+                       keys, [str(t) for t in data["titles"]])
+
+    def user_vector(self, preferences, saved_post_ids):
+        """Normalized preference terms plus the mean of saved recipe rows."""
+        np = _numpy()
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        tf = Counter(tokenize(" ".join(map(str, preferences))))
+        for term, count in tf.items():
+            col = self.vocabulary.get(term)
+            if col is not None:
+                vector[col] = count * self.idf[col]
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector *= PREFERENCE_WEIGHT / norm
+
+        rows = [self.rows_by_post[p] for p in saved_post_ids if p in self.rows_by_post]
+        if rows:
+            vector += self.matrix[rows].mean(axis=0)
+        return vector
+
+    def recommend(self, preferences, saved_post_ids, limit=20, exclude_user=None):
+        np = _numpy()
+        if not len(self.keys):
+            return []
+        vector = self.user_vector(preferences, saved_post_ids)
+        if not vector.any():
+            return []
+        scores = self.matrix @ vector
+        # Don't recommend what the user already saved or wrote.
+        hidden = [self.rows_by_post[p] for p in saved_post_ids if p in self.rows_by_post]
+        hidden += self.rows_by_user.get(exclude_user, [])
+        scores[hidden] = -np.inf
+
+        results = []
+        for row in top_k(scores, limit):
+            if not scores[row] > 0:
+                break
+            user_id, post_id = self.keys[row]
+            results.append({"userId": user_id, "postId": post_id,
+                            "title": self.titles[row], "score": round(float(scores[row]), 4)})
+        return results
+
+
+class Recommender:
+    """
+    Holds the current RecipeVectors. A background thread loads or builds
+    them as configured; requests only read the finished ones.
+    """
+
+    def __init__(self, app, model_path=None, reload_interval=60):
+        self.app = app
+        self.model_path = model_path
+        self.reload_interval = reload_interval
+        self.vectors = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._refreshed = threading.Event()
+        self._pid = None
+
+    def _maybe_reload(self):
+        """Load the model file if it changed; True if the current vectors came from it."""
+        try:
+            mtime = os.stat(self.model_path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._mtime:
+            # Remember the attempt either way, so a bad file isn't retried until it changes.
+            self._mtime = mtime
+            try:
+                self.vectors = RecipeVectors.load(self.model_path)
+            except Exception:
+                self.app.logger.exception(
+                    "Could not load recommendation model %s", self.model_path)
+                return self.vectors is not None
+        return True
+
+    def refresh(self, db):
+        """
+        Load the model file if it changed, else (without one) rebuild from
+        Firestore, and swap the result in. Failures are logged and leave
+        the current vectors in place.
+        """
+        try:
+            if self.model_path and self._maybe_reload():
+                return
+            self.vectors = RecipeVectors.build(db)
+        except Exception:
+            self.app.logger.exception("Could not rebuild recommendation vectors")
+        finally:
+            self._refreshed.set()
+
+    def _run(self):
+        while True:
+            with self.app.app_context():
+                self.refresh(get_db())
+            time.sleep(self.reload_interval)
+
+    def wait_refreshed(self, timeout=None):
+        """Block until the first refresh has finished (used by tests)."""
+        return self._refreshed.wait(timeout)
+
+    def current(self):
+        """The current vectors; RecommendationsUnavailable until there are any."""
+        _numpy()
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use in this process (threads don't survive fork).
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="recommend-refresh", daemon=True).start()
+        vectors = self.vectors
+        if vectors is None:
+            raise RecommendationsUnavailable(
+                "Recommendations are still being prepared, please retry shortly.")
+        return vectors
+
+
+def init_recommender(app):
+    recommender = Recommender(
+        app,
+        model_path=app.config["RECOMMEND_MODEL_PATH"] or None,
+        reload_interval=app.config["RECOMMEND_RELOAD_INTERVAL"],
+    )
+    app.extensions["recommender"] = recommender
+    return recommender
+
+
+def get_recommender():
+    return current_app.extensions["recommender"]
+
+
+def recommend_for_user(user_id, limit=20):
+    """
+    Recommendations for a user, or None if the user doesn't exist.
+    saved_recipes entries may be postIds or {"postId": ...} dicts.
+    """
+    db = get_db()
+    user = db.collection("users").document(user_id).get(
+        field_paths=["preferences", "saved_recipes"])
+    if not user.exists:
+        return None
+    data = user.to_dict() or {}
+    saved = [s.get("postId") if isinstance(s, dict) else s
+             for s in data.get("saved_recipes") or []]
+    vectors = get_recommender().current()
+    return vectors.recommend(data.get("preferences") or [], [s for s in saved if s],
+                             limit=limit, exclude_user=user_id)
@@ -0,0 +1,350 @@
+"""
+In-process full-text search over recipes.
+
+An inverted index (term -> {recipe: term frequency}) over title,
+description, ingredients and instructions, ranked with BM25. Title terms
+count TITLE_WEIGHT times so a match there outranks one buried in the
+instructions.
+
+The index is kept current by hooks in recipe_database (create, update,
+delete). Each process has its own copy, so writes handled by another
+worker are picked up by a catch-up: re-reading just the recipes whose
+dateUpdated is past the index's high-water mark (a
+created_recipes.dateUpdated collection-group index).
+  - SEARCH_INDEX_PATH: snapshot file, written only by
+    `flask --app start_server build-search-index`. Restored at start-up
+    when present, so workers don't rescan Firestore on boot; the first
+    search catches up from the snapshot's high-water mark.
+  - Without a snapshot the index is built from a collection-group scan
+    of created_recipes on the first search.
+  - SEARCH_REFRESH_INTERVAL: after this many seconds the next search
+    catches up again (0 = never), so other workers' writes show up.
+A catch-up can't see deletions: a recipe deleted through another worker
+stays findable here until the index is next built from scratch (the
+next build-search-index, or a restart without a snapshot).
+Builds and catch-ups read Firestore outside the index lock and swap the
+result in, so searches keep being answered from the old copy meanwhile;
+once the index is loaded, a search finding a catch-up already running
+doesn't wait for it.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .storage import get_db
+
+SNAPSHOT_VERSION = 2
+# The high-water mark is taken this far before a scan starts, to cover
+# writes stamped just before it but committed after it read past them.
+SCAN_OVERLAP = timedelta(minutes=5)
+INDEXED_FIELDS = ("title", "description", "ingredients", "instructions")
+TITLE_WEIGHT = 2
+
+# BM25 parameters (the usual defaults).
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or the to "
+    "with into then than until your you".split()
+)
+# Longest suffix first; each entry is (suffix, replacement).
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"),
+    ("iveness", "ive"), ("ations", "ate"), ("ation", "ate"),
+    ("ingly", ""), ("edly", ""), ("ness", ""), ("ment", ""),
+    ("ies", "y"), ("ing", ""), ("ed", ""), ("ly", ""), ("es", ""), ("s", ""),
+)
+
+
+def stem(word):
+    """
+    Light suffix-stripping stemmer: enough to make "tomatoes"/"tomato" and
+    "chopped"/"chopping"/"chop" meet, without a stemming dependency.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)] + replacement
+            break
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+        word = word[:-1]  # chopp -> chop
+    return word
+
+
+def tokenize(text):
+    return [stem(t) for t in _TOKEN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _field_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(_field_text(v) for v in value)
+    if isinstance(value, dict):
+        return " ".join(_field_text(v) for v in value.values())
+    return str(value)
+
+
+def recipe_terms(recipe):
+    """Term frequencies for a recipe, with title terms weighted up."""
+    counts = Counter()
+    for field in INDEXED_FIELDS:
+        weight = TITLE_WEIGHT if field == "title" else 1
+        for term in tokenize(_field_text(recipe.get(field))):
+            counts[term] += weight
+    return counts
+
+
+class SearchIndex:
+    def __init__(self, refresh_interval=0):
+        self.refresh_interval = refresh_interval
+        self.postings = {}  # term -> {doc_key: tf}
+        self.docs = {}      # doc_key -> {"userId", "postId", "title", "tf", "length"}
+        self.total_length = 0
+        self.loaded = False
+        # dateUpdated up to which Firestore is reflected; behind means a
+        # restored snapshot still has to catch up from it.
+        self.high_water = None
+        self.behind = False
+        self._refreshed_at = 0.0  # time.monotonic() of the last build or catch-up
+        self._lock = threading.RLock()
+        # One build or catch-up at a time; searches don't wait on it.
+        self._build_lock = threading.RLock()
+        # Hook writes made while a scan runs (doc_key -> entry, None for
+        # a removal), replayed over its result.
+        self._journal = None
+
+    @staticmethod
+    def _key(user_id, post_id):
+        return f"{user_id}/{post_id}"
+
+    def _add(self, user_id, post_id, title, tf):
+        key = self._key(user_id, post_id)
+        self._remove(key)
+        length = sum(tf.values())
+        self.docs[key] = {"userId": user_id, "postId": post_id, "title": title,
+                          "tf": dict(tf), "length": length}
+        self.total_length += length
+        for term, count in tf.items():
+            self.postings.setdefault(term, {})[key] = count
+
+    def _remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        self.total_length -= doc["length"]
+        for term in doc["tf"]:
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+
+    # -- hooks; before the first build they are no-ops, the build covers them --
+
+    def add(self, user_id, post_id, recipe):
+        entry = (user_id, post_id, recipe.get("title"), recipe_terms(recipe))
+        with self._lock:
+            if self._journal is not None:
+                self._journal[self._key(user_id, post_id)] = entry
+            if self.loaded:
+                self._add(*entry)
+
+    def remove(self, user_id, post_id):
+        key = self._key(user_id, post_id)
+        with self._lock:
+            if self._journal is not None:
+                self._journal[key] = None
+            if self.loaded:
+                self._remove(key)
+
+    def _stale(self):
+        return self.behind or (
+            self.refresh_interval > 0
+            and time.monotonic() - self._refreshed_at >= self.refresh_interval)
+
+    def ensure_loaded(self, db):
+        """
+        Build the index on first use; after that, catch up when a restored
+        snapshot is behind or SEARCH_REFRESH_INTERVAL has passed. A failed
+        catch-up is logged and the current copy kept.
+        """
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    self.rebuild(db)
+            return
+        if not self._stale() or not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            if self._stale():
+                self.catch_up(db)
+        except Exception:
+            # Retried after another interval, not on every search.
+            self._refreshed_at = time.monotonic()
+            current_app.logger.exception("Search index catch-up failed")
+        finally:
+            self._build_lock.release()
+
+    def _scan(self, db, since=None):
+        """
+        (high_water, entries) for every recipe, or those updated after
+        `since`. Hook writes made meanwhile are journalled.
+        """
+        with self._lock:
+            self._journal = {}
+        high_water = (datetime.utcnow() - SCAN_OVERLAP).isoformat()
+        query = db.collection_group("created_recipes")
+        if since is not None:
+            query = query.where("dateUpdated", ">", since)
+        try:
+            entries = []
+            for doc in query.stream():
+                recipe = doc.to_dict()
+                entries.append((doc.reference.parent.parent.id, doc.id,
+                                recipe.get("title"), recipe_terms(recipe)))
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        return high_water, entries
+
+    def _replay_journal(self):
+        for key, entry in self._journal.items():
+            if entry is None:
+                self._remove(key)
+            else:
+                self._add(*entry)
+        self._journal = None
+
+    def rebuild(self, db):
+        """Re-index every recipe with one collection-group scan."""
+        with self._build_lock:
+            high_water, entries = self._scan(db)
+            built = SearchIndex()
+            for entry in entries:
+                built._add(*entry)
+            with self._lock:
+                self.postings, self.docs = built.postings, built.docs
+                self.total_length = built.total_length
+                self._replay_journal()
+                self.high_water, self.behind, self.loaded = high_water, False, True
+                self._refreshed_at = time.monotonic()
+
+    def catch_up(self, db):
+        """Re-index the recipes updated since the high-water mark."""
+        with self._build_lock:
+            high_water, entries = self._scan(db, since=self.high_water)
+            with self._lock:
+                for entry in entries:
+                    self._add(*entry)
+                self._replay_journal()
+                self.high_water, self.behind = high_water, False
+                self._refreshed_at = time.monotonic()
+
+    def search(self, query, limit=20, user_id=None):
+        """
+        BM25-ranked matches for `query`, best first, as
+        {"userId", "postId", "title", "score"}. `user_id` restricts results
+        to one author's recipes.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.docs)
+            if not terms or not n:
+                return []
+            avg_length = self.total_length / n
+            scores = Counter()
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    length = self.docs[key]["length"]
+                    norm = K1 * (1 - B + B * length / avg_length)
+                    scores[key] += idf * tf * (K1 + 1) / (tf + norm)
+
+            results = []
+            for key, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+                doc = self.docs[key]
+                if user_id is not None and doc["userId"] != user_id:
+                    continue
+                results.append({"userId": doc["userId"], "postId": doc["postId"],
+                                "title": doc["title"], "score": round(score, 4)})
+                if len(results) == limit:
+                    break
+            return results
+
+    def snapshot(self, path):
+        """Write the index to `path` atomically (gzip'd JSON)."""
+        with self._lock:
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "highWater": self.high_water,
+                "docs": {key: {f: doc[f] for f in ("userId", "postId", "title", "tf")}
+                         for key, doc in self.docs.items()},
+            }
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as raw, \
+                        gzip.open(raw, "wt", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def restore(self, path):
+        """
+        Load a snapshot written by snapshot(); False if there isn't a
+        usable one. ensure_loaded() then catches up from its high-water mark.
+        """
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != SNAPSHOT_VERSION:
+            return False
+        restored = SearchIndex()
+        for doc in data["docs"].values():
+            restored._add(doc["userId"], doc["postId"], doc["title"], doc["tf"])
+        with self._lock:
+            self.postings, self.docs = restored.postings, restored.docs
+            self.total_length = restored.total_length
+            self.high_water = data["highWater"]
+            self.behind = self.loaded = True
+        return True
+
+
+def init_search_index(app):
+    index = SearchIndex(refresh_interval=app.config["SEARCH_REFRESH_INTERVAL"])
+    path = app.config["SEARCH_INDEX_PATH"]
+    if path:
+        index.restore(path)
+    app.extensions["search_index"] = index
+    return index
+
+
+def get_search_index():
+    return current_app.extensions["search_index"]
+
+
+def search_recipes(query, limit=20, user_id=None):
+    index = get_search_index()
+    index.ensure_loaded(get_db())
+    return index.search(query, limit=limit, user_id=user_id)
@@ -0,0 +1,481 @@
+"""
+Storage backends used by the services layer.
+
+create_app() picks one from the STORAGE_BACKEND setting:
+  - "firestore": Firestore for users/recipes, Cloudinary for images (default)
+  - "memory":    in-process stand-ins for both, with an optional injected
+                 latency (STORAGE_LATENCY_MS) per simulated round trip
+
+Services never talk to firestore/cloudinary directly; they go through
+get_db() and get_backend() so the whole API can run without a network.
+Both backends time their Firestore RPCs and image calls into the
+dependency metrics (see metrics.py).
+
+The ASGI mode (api/asgi.py) uses each backend's async side as well: an
+async Firestore client and awaitable image uploads/deletes, created per
+event loop.
+
+The Firebase/Firestore/Cloudinary SDKs take hundreds of milliseconds to
+import, so they are imported inside the functions that need them and the
+Firebase app is initialized on first use rather than in create_app().
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import weakref
+
+from flask import current_app
+
+from .auth_tokens import FirebaseTokenVerifier, InvalidToken
+from .memory_firestore import AsyncMemoryFirestore, MemoryFirestore
+from .metrics import TimedAsyncFirestoreAPI, TimedFirestoreAPI, timed
+
+
+def firebase_credentials_path():
+    """
+    If FLASK_ENV == 'testing', use Firebase_Test.
+    Otherwise, use GOOGLE_APPLICATION_CREDENTIALS for dev or prod.
+    """
+    env_mode = os.getenv("FLASK_ENV", "development").lower()
+    if env_mode == "testing":
+        cred_path = os.getenv("Firebase_Test")
+        if not cred_path:
+            raise ValueError(
+                "TEST_FIREBASE_CREDENTIALS not set, but FLASK_ENV=testing."
+            )
+    else:
+        cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        if not cred_path:
+            raise ValueError(
+                "GOOGLE_APPLICATION_CREDENTIALS not set (non-testing mode)."
+            )
+    return cred_path
+
+
+def setup_firebase():
+    """
+    Initialize the default Firebase app from firebase_credentials_path(),
+    unless it already exists. Returns the app.
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        # If default app already exists, do nothing
+        return firebase_admin.get_app()
+    except ValueError:
+        pass  # Means no default app has been initialized yet
+
+    cred = credentials.Certificate(firebase_credentials_path())
+    return firebase_admin.initialize_app(cred)
+
+
+class StorageBackend:
+    """
+    What the services layer needs from storage:
+      - client():              Firestore-compatible client (users, recipes)
+      - upload_image():        store one image, returns Cloudinary-style result
+      - destroy_image():       remove one image by public ID
+      - destroy_images():      remove many images in a single call
+      - create_custom_token(): mint the token returned by /api/login
+      - verify_id_token():     claims of a bearer ID token, or InvalidToken
+      - warm_up():             open connections/credentials ahead of traffic
+    and, for the ASGI mode:
+      - async_client():        AsyncClient-compatible Firestore client
+      - upload_image_async(), destroy_images_async(): awaitable versions
+      - aclose():              release the running loop's async clients
+    """
+
+    name = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls()
+
+    def client(self):
+        raise NotImplementedError
+
+    def upload_image(self, file_obj, public_id, folder, timeout=None):
+        raise NotImplementedError
+
+    def destroy_image(self, public_id):
+        raise NotImplementedError
+
+    def destroy_images(self, public_ids):
+        raise NotImplementedError
+
+    def create_custom_token(self, uid, claims=None):
+        raise NotImplementedError
+
+    def verify_id_token(self, token):
+        raise NotImplementedError
+
+    def warm_up(self):
+        pass
+
+    def async_client(self):
+        raise NotImplementedError
+
+    async def upload_image_async(self, file_obj, public_id, folder, timeout=None):
+        return await asyncio.to_thread(self.upload_image, file_obj, public_id, folder, timeout)
+
+    async def destroy_images_async(self, public_ids):
+        return await asyncio.to_thread(self.destroy_images, public_ids)
+
+    async def aclose(self):
+        pass
+
+
+class FirestoreBackend(StorageBackend):
+    """
+    Production backend: the default Firebase app plus Cloudinary.
+    Owns one long-lived Firestore client (and so one gRPC channel) per
+    process instead of looking it up on every call.
+    """
+
+    name = "firestore"
+
+    def __init__(self):
+        self._client = None
+        self._pid = None
+        self._cloudinary_ready = False
+        self._lock = threading.Lock()
+        # Async clients are bound to the event loop that made them.
+        self._loop_clients = weakref.WeakKeyDictionary()
+        self._auth_client = None
+        self._auth_pid = None
+        self._token_verifier = None
+
+    @classmethod
+    def from_config(cls, config):
+        # Don't parse credentials yet, but fail at start-up if they're missing.
+        firebase_credentials_path()
+        return cls()
+
+    def client(self):
+        # gRPC channels don't survive fork(), so a worker forked from a
+        # preloaded parent notices the new pid and builds its own client.
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    self._client = self._new_client()
+                    self._pid = pid
+        return self._client
+
+    def _new_client(self):
+        # Same construction as firebase_admin.firestore.client(), but not
+        # cached on the Firebase app, which would be shared across a fork.
+        from google.cloud import firestore as google_firestore
+
+        app = setup_firebase()
+        client = google_firestore.Client(
+            credentials=app.credential.get_credential(), project=app.project_id
+        )
+        # Every RPC goes through this API object, so wrapping it times them all.
+        client._firestore_api_internal = TimedFirestoreAPI(client._firestore_api)
+        return client
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_clients.get(loop)
+        if state is None or state["pid"] != os.getpid():
+            state = self._loop_clients[loop] = {"pid": os.getpid(), "firestore": None, "http": None}
+        return state
+
+    def async_client(self):
+        state = self._loop_state()
+        if state["firestore"] is None:
+            from google.cloud import firestore as google_firestore
+
+            app = setup_firebase()
+            client = google_firestore.AsyncClient(
+                credentials=app.credential.get_credential(), project=app.project_id
+            )
+            client._firestore_api_internal = TimedAsyncFirestoreAPI(client._firestore_api)
+            state["firestore"] = client
+        return state["firestore"]
+
+    def _http(self):
+        state = self._loop_state()
+        if state["http"] is None:
+            try:
+                import httpx
+            except ImportError:
+                raise RuntimeError("The ASGI mode with STORAGE_BACKEND=firestore requires the 'httpx' package.")
+            state["http"] = httpx.AsyncClient()
+        return state["http"]
+
+    async def aclose(self):
+        state = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        if state["http"] is not None:
+            await state["http"].aclose()
+        transport = getattr(state["firestore"], "_transport", None)
+        if transport is not None:
+            await transport.close()
+
+    def _cloudinary(self):
+        import cloudinary
+        import cloudinary.api
+        import cloudinary.uploader
+
+        if not self._cloudinary_ready:
+            # Configure Cloudinary using CLOUDINARY_URL, e.g.
+            #   export CLOUDINARY_URL=cloudinary://<api_key>:<api_secret>@<cloud_name>
+            cloudinary.config(cloudinary_url=os.getenv("CLOUDINARY_URL"))
+            self._cloudinary_ready = True
+        return cloudinary
+
+    def warm_up(self):
+        """
+        Fetch an access token and open the channel with one cheap read, so
+        the first real request doesn't pay for either (or for the imports).
+        """
+        import google.auth.transport.requests
+
+        credentials = setup_firebase().credential.get_credential()
+        credentials.refresh(google.auth.transport.requests.Request())
+        self.client().collection("_warmup").document("ping").get()
+        self._cloudinary()
+        self._auth()
+        self._verifier().keys.get()
+
+    def upload_image(self, file_obj, public_id, folder, timeout=None):
+        cloudinary = self._cloudinary()
+        with timed("cloudinary", "upload"):
+            return cloudinary.uploader.upload(
+                file_obj, public_id=public_id, folder=folder, timeout=timeout
+            )
+
+    def destroy_image(self, public_id):
+        cloudinary = self._cloudinary()
+        with timed("cloudinary", "destroy"):
+            return cloudinary.uploader.destroy(public_id)
+
+    def destroy_images(self, public_ids):
+        # Admin API: one request for up to 100 IDs (note it is rate limited
+        # per hour, unlike uploader.destroy).
+        cloudinary = self._cloudinary()
+        with timed("cloudinary", "delete_resources"):
+            return cloudinary.api.delete_resources(list(public_ids))
+
+    async def _cloudinary_call(self, operation, method, url, **kwargs):
+        cloudinary = self._cloudinary()
+        with timed("cloudinary", operation):
+            response = await self._http().request(method, url, **kwargs)
+        result = response.json()
+        if "error" in result:
+            raise cloudinary.exceptions.Error(result["error"].get("message"))
+        return result
+
+    async def upload_image_async(self, file_obj, public_id, folder, timeout=None):
+        """Upload API over httpx, signed like cloudinary.uploader.upload."""
+        from cloudinary.utils import cloudinary_api_url, sign_request
+
+        self._cloudinary()
+        params = sign_request({"timestamp": int(time.time()), "public_id": public_id,
+                               "folder": folder}, {})
+        data = file_obj.read() if hasattr(file_obj, "read") else bytes(file_obj)
+        filename = getattr(file_obj, "filename", None) or public_id
+        return await self._cloudinary_call(
+            "upload", "POST", cloudinary_api_url("upload"),
+            data=params, files={"file": (filename, data)}, timeout=timeout,
+        )
+
+    async def destroy_images_async(self, public_ids):
+        from cloudinary.utils import base_api_url
+
+        config = self._cloudinary().config()
+        return await self._cloudinary_call(
+            "delete_resources", "DELETE", base_api_url(["resources", "image", "upload"]),
+            params=[("public_ids[]", public_id) for public_id in public_ids],
+            auth=(config.api_key, config.api_secret),
+        )
+
+    def _auth(self):
+        # One auth client per process: it holds the signer built from the
+        # service account key, so minting a token doesn't set that up again.
+        pid = os.getpid()
+        if self._auth_client is None or self._auth_pid != pid:
+            from firebase_admin import auth
+
+            self._auth_client = auth.Client(setup_firebase())
+            self._auth_pid = pid
+        return self._auth_client
+
+    def _verifier(self):
+        if self._token_verifier is None:
+            self._token_verifier = FirebaseTokenVerifier(setup_firebase().project_id)
+        return self._token_verifier
+
+    def create_custom_token(self, uid, claims=None):
+        return self._auth().create_custom_token(uid, developer_claims=claims)
+
+    def verify_id_token(self, token):
+        return self._verifier().verify(token)
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Everything kept in process memory. `latency` (seconds) is slept on
+    every simulated Firestore RPC and every image upload/destroy, so
+    benchmarks see realistic round-trip costs without a network.
+    """
+
+    name = "memory"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.db = MemoryFirestore(latency=latency)
+        self.async_db = AsyncMemoryFirestore(self.db)
+        self._token_key = os.urandom(32)
+        self.images = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(latency=config.get("STORAGE_LATENCY_MS", 0) / 1000.0)
+
+    def client(self):
+        return self.db
+
+    def _round_trip(self, operation, timeout=None):
+        with timed("cloudinary", operation):
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"Simulated request timed out after {timeout}s")
+            if self.latency:
+                time.sleep(self.latency)
+
+    def async_client(self):
+        return self.async_db
+
+    async def _async_round_trip(self, operation, timeout=None):
+        with timed("cloudinary", operation):
+            if timeout is not None and self.latency > timeout:
+                await asyncio.sleep(timeout)
+                raise TimeoutError(f"Simulated request timed out after {timeout}s")
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+    def upload_image(self, file_obj, public_id, folder, timeout=None):
+        self._round_trip("upload", timeout)
+        return self._store_image(file_obj, public_id, folder)
+
+    async def upload_image_async(self, file_obj, public_id, folder, timeout=None):
+        await self._async_round_trip("upload", timeout)
+        return self._store_image(file_obj, public_id, folder)
+
+    def _store_image(self, file_obj, public_id, folder):
+        data = file_obj.read() if hasattr(file_obj, "read") else bytes(file_obj)
+        full_id = f"{folder}/{public_id}" if folder else public_id
+        with self._lock:
+            self.images[full_id] = data
+        return {
+            "secure_url": f"memory://images/{full_id}",
+            "public_id": full_id,
+            "bytes": len(data),
+        }
+
+    def destroy_image(self, public_id):
+        self._round_trip("destroy")
+        with self._lock:
+            found = self.images.pop(public_id, None) is not None
+        return {"result": "ok" if found else "not found"}
+
+    def destroy_images(self, public_ids):
+        self._round_trip("delete_resources")
+        return self._drop_images(public_ids)
+
+    async def destroy_images_async(self, public_ids):
+        await self._async_round_trip("delete_resources")
+        return self._drop_images(public_ids)
+
+    def _drop_images(self, public_ids):
+        deleted = {}
+        with self._lock:
+            for public_id in public_ids:
+                found = self.images.pop(public_id, None) is not None
+                deleted[public_id] = "deleted" if found else "not_found"
+        return {"deleted": deleted}
+
+    def create_custom_token(self, uid, claims=None):
+        # Unsigned JWT with the same shape as a Firebase custom token.
+        now = int(time.time())
+        payload = {"uid": uid, "iat": now, "exp": now + 3600}
+        if claims:
+            payload["claims"] = claims
+        return _encode_part({"alg": "none", "typ": "JWT"}) + b"." + _encode_part(payload) + b"."
+
+    def create_id_token(self, uid, claims=None, expires_in=3600):
+        """
+        What a client would get by exchanging a custom token with Firebase
+        Auth: an ID token for `uid` with `claims`, here HMAC-signed with a
+        per-backend key so only this backend accepts it.
+        """
+        now = int(time.time())
+        payload = {"iss": "memory", "sub": uid, "iat": now, "exp": now + expires_in,
+                   **(claims or {})}
+        signing_input = _encode_part({"alg": "HS256", "typ": "JWT"}) + b"." + _encode_part(payload)
+        signature = hmac.new(self._token_key, signing_input, hashlib.sha256).digest()
+        return (signing_input + b"." + base64.urlsafe_b64encode(signature).rstrip(b"=")).decode()
+
+    def verify_id_token(self, token):
+        try:
+            header, payload, signature = token.encode("ascii").split(b".")
+            expected = hmac.new(self._token_key, header + b"." + payload, hashlib.sha256).digest()
+            valid = hmac.compare_digest(_decode_part(signature), expected)
+            claims = json.loads(_decode_part(payload)) if valid else None
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if claims is None:
+            raise InvalidToken("Bad signature")
+        if claims.get("exp", 0) <= time.time():
+            raise InvalidToken("Token expired")
+        return claims
+
+
+def _encode_part(part):
+    raw = json.dumps(part, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+
+def _decode_part(part):
+    return base64.urlsafe_b64decode(part + b"=" * (-len(part) % 4))
+
+
+BACKENDS = {
+    FirestoreBackend.name: FirestoreBackend,
+    MemoryBackend.name: MemoryBackend,
+}
+
+
+def init_storage(app):
+    """Build the configured backend and attach it to the app."""
+    name = app.config["STORAGE_BACKEND"]
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown STORAGE_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})."
+        )
+    backend = BACKENDS[name].from_config(app.config)
+    app.extensions["storage"] = backend
+    return backend
+
+
+def get_backend():
+    return current_app.extensions["storage"]
+
+
+def get_db():
+    return get_backend().client()
+
+
+def get_async_db():
+    return get_backend().async_client()
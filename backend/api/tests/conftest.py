@@ -8,9 +8,11 @@ from firebase_admin import delete_app, get_app
 @pytest.fixture(scope="session")
 def app():
     """
-    Force FLASK_ENV=testing and ensure Firebase_Test is set
-    before creating the Flask app. This will cause setup_firebase() to
-    initialize the *default* app with test credentials.
+    If Firebase_Test is set, force FLASK_ENV=testing before creating the
+    Flask app. setup_firebase() then initializes the *default* app with
+    test credentials on first use.
+    Without Firebase_Test we run against the in-memory storage backend,
+    so the suite works offline.
     """
     # If a default app is already loaded from a previous run, delete it
     try:
@@ -19,16 +21,16 @@ def app():
     except ValueError:
         pass
 
-    # Mark environment as 'testing'
-    os.environ["FLASK_ENV"] = "testing"
-
-    # Ensure Firebase_Test is set
     test_cred_path = os.getenv("Firebase_Test")
-    if not test_cred_path:
-        raise RuntimeError("Firebase_Test not set, but FLASK_ENV=testing")
-
-    # Create our Flask app, which calls 'setup_firebase()'
-    flask_app = create_app()
+    if test_cred_path:
+        # Mark environment as 'testing'
+        os.environ["FLASK_ENV"] = "testing"
+        backend = "firestore"
+    else:
+        backend = "memory"
+
+    # Create our Flask app; Firebase itself is set up lazily on first use
+    flask_app = create_app({"STORAGE_BACKEND": backend})
     flask_app.config["TESTING"] = True
 
     yield flask_app
@@ -48,3 +50,14 @@ def client(app):
     now initialized with test credentials.
     """
     return app.test_client()
+
+
+@pytest.fixture
+def memory_app():
+    """
+    A fresh app on the in-memory backend, for tests that count storage
+    round trips or inspect stored data directly.
+    """
+    flask_app = create_app({"STORAGE_BACKEND": "memory"})
+    flask_app.config["TESTING"] = True
+    return flask_app
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+from io import BytesIO
+
+from werkzeug.test import EnvironBuilder
+
+from backend.api import create_app
+from backend.api.asgi import AsgiApp
+
+
+def _asgi(**config):
+    app = create_app({"STORAGE_BACKEND": "memory", "PASSWORD_HASH_WORKERS": 0, **config})
+    app.config["TESTING"] = True
+    return AsgiApp(app)
+
+
+async def _call(asgi, method, path, query="", json_body=None, data=None, headers=()):
+    """One request through the ASGI callable; (status, headers, parsed body)."""
+    headers, body = [(k.encode(), v.encode()) for k, v in headers], b""
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers.append((b"content-type", b"application/json"))
+    elif data is not None:
+        environ = EnvironBuilder(method=method, data=data).get_environ()
+        body = environ["wsgi.input"].read()
+        headers.append((b"content-type", environ["CONTENT_TYPE"].encode()))
+    scope = {
+        "type": "http", "method": method, "path": path, "root_path": "",
+        "query_string": query.encode(), "headers": headers, "http_version": "1.1",
+        "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+    }
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return requests.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi(scope, receive, send)
+    assert sent[-1] == {"type": "http.response.body", "body": b""}
+    raw = b"".join(message.get("body", b"") for message in sent[1:])
+    response_headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    is_json = "json" in response_headers.get("content-type", "")
+    return sent[0]["status"], response_headers, json.loads(raw) if raw and is_json else raw
+
+
+def test_auth_and_recipe_crud():
+    """
+    Test Flow:
+      1. Register (a second claim on the name or email is a 409) and log in.
+      2. Create a recipe with two images, read it, swap one image for a
+         new one, and check only the swapped-out image was destroyed.
+      3. The list endpoint (served by the sync app) sees the update;
+         delete it and the recipe is gone.
+    """
+    asgi = _asgi()
+    images = asgi.app.extensions["storage"].images
+
+    async def scenario():
+        user = {"username": "asyncuser", "email": "async@example.com", "password": "pw123456"}
+        status, _, body = await _call(asgi, "POST", "/api/register", json_body=user)
+        assert status == 201
+        user_id = body["userId"]
+        status, _, body = await _call(asgi, "POST", "/api/register",
+                                      json_body=dict(user, email="other@example.com"))
+        assert (status, body["error"]) == (409, "User already exists")
+        status, _, body = await _call(asgi, "POST", "/api/register",
+                                      json_body=dict(user, username="other"))
+        assert (status, body["error"]) == (409, "Email already exists")
+        status, _, body = await _call(asgi, "POST", "/api/login",
+                                      json_body={"username": "AsyncUser", "password": "pw123456"})
+        assert (status, body["userId"]) == (200, user_id)
+        status, _, _ = await _call(asgi, "POST", "/api/login",
+                                   json_body={"username": "asyncuser", "password": "wrong"})
+        assert status == 401
+
+        status, _, body = await _call(asgi, "POST", "/api/recipes", data={
+            "userId": user_id, "title": "Soup",
+            "images": [(BytesIO(b"one"), "one.png"), (BytesIO(b"two"), "two.png")],
+        })
+        assert status == 201
+        post_id = body["postId"]
+        status, headers, recipe = await _call(asgi, "GET", f"/api/recipes/{post_id}",
+                                              f"userId={user_id}")
+        assert status == 200 and headers["etag"]
+        assert (recipe["title"], recipe["likes"], len(recipe["imageList"])) == ("Soup", 0, 2)
+        first, second = (img["publicId"] for img in recipe["imageList"])
+
+        status, _, body = await _call(asgi, "PUT", f"/api/recipes/{post_id}", data={
+            "userId": user_id, "title": "Stew", "removePublicIds": first,
+            "images": [(BytesIO(b"three"), "three.png")],
+        })
+        assert status == 200
+        kept = [img["publicId"] for img in body["recipe"]["imageList"]]
+        assert kept[0] == second and len(kept) == 2
+        assert sorted(images) == sorted(kept)
+
+        status, _, listed = await _call(asgi, "GET", "/api/recipes", f"userId={user_id}")
+        assert status == 200 and [r["title"] for r in listed] == ["Stew"]
+
+        status, _, _ = await _call(asgi, "DELETE", f"/api/recipes/{post_id}", f"userId={user_id}")
+        assert status == 200
+        status, _, _ = await _call(asgi, "GET", f"/api/recipes/{post_id}", f"userId={user_id}")
+        assert status == 404
+        status, _, _ = await _call(asgi, "PUT", f"/api/recipes/{post_id}",
+                                   json_body={"userId": user_id, "title": "Gone"})
+        assert status == 404
+
+    asyncio.run(scenario())
+
+
+def test_requests_and_uploads_overlap():
+    """
+    Test Flow:
+      1. With 100 ms of simulated latency per call, create a recipe with
+         four images: the uploads run side by side, so it takes about two
+         round trips (uploads, then the commit), not five.
+      2. 50 concurrent reads of it, each three round trips (recipe, like
+         shards, isLiked; the cache is off), finish in far less than the
+         15 s they'd take one after another.
+    """
+    asgi = _asgi(STORAGE_LATENCY_MS=100, RECIPE_CACHE_BACKEND="none", LIKE_COUNT_TTL=0)
+
+    async def scenario():
+        start = time.perf_counter()
+        status, _, body = await _call(asgi, "POST", "/api/recipes", data={
+            "userId": "u1", "title": "Pie",
+            "images": [(BytesIO(b"%d" % i), f"{i}.png") for i in range(4)],
+        })
+        assert status == 201
+        assert time.perf_counter() - start < 0.4
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            _call(asgi, "GET", f"/api/recipes/{body['postId']}", "userId=u1&viewerId=v")
+            for _ in range(50)))
+        assert all(status == 200 for status, _, _ in results)
+        assert time.perf_counter() - start < 2
+
+    asyncio.run(scenario())
+
+
+def test_preflight_and_undeclared_methods():
+    """
+    Test Flow:
+      1. CORS preflights to async routes get Flask's 200 with CORS
+         headers, as under WSGI.
+      2. A method the route doesn't declare is a 405 from the sync app.
+    """
+    asgi = _asgi()
+    preflight = {"Origin": "http://localhost:3000", "Access-Control-Request-Method": "POST"}
+
+    async def scenario():
+        for path in ("/api/recipes", "/api/login", "/api/register", "/api/recipes/abc"):
+            status, headers, _ = await _call(asgi, "OPTIONS", path, headers=preflight.items())
+            assert status == 200, path
+            assert headers["access-control-allow-origin"] == preflight["Origin"]
+        status, _, _ = await _call(asgi, "PATCH", "/api/recipes/abc")
+        assert status == 405
+
+    asyncio.run(scenario())
+
+
+def test_oversized_bodies_refused_early():
+    """
+    Test Flow:
+      1. A Content-Length over RECIPE_MAX_REQUEST_BYTES is a 413 before
+         any of the body is read.
+      2. A body without one is cut off with a 413 as soon as it passes
+         the limit; the remaining chunks are never read.
+    """
+    asgi = _asgi(RECIPE_MAX_REQUEST_BYTES=1000)
+
+    async def post(headers, chunks):
+        scope = {"type": "http", "method": "POST", "path": "/api/recipes", "query_string": b"",
+                 "headers": headers, "http_version": "1.1"}
+        messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi(scope, receive, send)
+        return sent[0]["status"], len(messages)
+
+    async def scenario():
+        assert await post([(b"content-length", b"5000")], [b"x" * 600] * 9) == (413, 9)
+        assert await post([], [b"x" * 600] * 9) == (413, 7)
+
+    asyncio.run(scenario())
@@ -0,0 +1,161 @@
+import base64
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from backend.api import create_app
+from backend.api.services.auth_tokens import FirebaseTokenVerifier, InvalidToken, PublicKeyCache
+
+
+def _app(**config):
+    app = create_app({"STORAGE_BACKEND": "memory", "PASSWORD_HASH_WORKERS": 0, **config})
+    app.config["TESTING"] = True
+    return app
+
+
+def _login(client, username="tokenuser"):
+    client.post("/api/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw123456"})
+    return client.post("/api/login", json={"username": username, "password": "pw123456"}).get_json()
+
+
+def test_token_decides_the_user():
+    """
+    Test Flow:
+      1. The login token carries the userId claim; an ID token with it
+         creates a recipe under that user without any userId parameter.
+      2. Naming another user next to the token is a 403; a forged or
+         expired token is a 401.
+      3. viewerId for isLiked comes from the token too.
+    """
+    app = _app()
+    backend = app.extensions["storage"]
+    client = app.test_client()
+    login = _login(client)
+    payload = login["firebase_custom_token"].split(".")[1]
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    assert claims["claims"] == {"userId": login["userId"]}
+
+    user_id = login["userId"]
+    auth = {"Authorization": "Bearer " + backend.create_id_token("tokenuser", claims["claims"])}
+    resp = client.post("/api/recipes", json={"title": "Soup"}, headers=auth)
+    assert resp.status_code == 201
+    post_id = resp.get_json()["postId"]
+    assert client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id}).status_code == 200
+
+    resp = client.put(f"/api/recipes/{post_id}", json={"userId": "someone-else", "title": "X"},
+                      headers=auth)
+    assert resp.status_code == 403
+    forged = auth["Authorization"][:-2] + "AA"
+    resp = client.delete(f"/api/recipes/{post_id}", headers={"Authorization": forged})
+    assert resp.status_code == 401
+    assert resp.headers["WWW-Authenticate"].startswith("Bearer")
+    expired = backend.create_id_token("tokenuser", claims["claims"], expires_in=-10)
+    resp = client.delete(f"/api/recipes/{post_id}", headers={"Authorization": "Bearer " + expired})
+    assert resp.status_code == 401
+
+    client.post(f"/api/recipes/{post_id}/like", json={"userId": user_id}, headers=auth)
+    recipe = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id},
+                        headers=auth).get_json()
+    assert recipe["isLiked"] is True
+
+
+def test_claims_cached_and_tokens_required():
+    """
+    Test Flow:
+      1. Repeat requests with one token verify its signature once.
+      2. With AUTH_REQUIRED, a request without a token is a 401, but
+         registration, login and readiness stay open.
+    """
+    app = _app(AUTH_REQUIRED=True)
+    backend = app.extensions["storage"]
+    verified = []
+    verify = backend.verify_id_token
+    backend.verify_id_token = lambda token: verified.append(token) or verify(token)
+    client = app.test_client()
+
+    login = _login(client, "required")
+    assert client.get("/api/ready").status_code == 200
+    assert client.get("/api/recipes", query_string={"userId": login["userId"]}).status_code == 401
+
+    auth = {"Authorization": "Bearer " + backend.create_id_token(
+        "required", {"userId": login["userId"]})}
+    for _ in range(3):
+        resp = client.get("/api/recipes", query_string={"userId": login["userId"]}, headers=auth)
+        assert resp.status_code == 200
+        resp.close()
+    assert len(verified) == 1
+
+
+def test_preflights_and_unknown_urls_need_no_token():
+    """
+    Test Flow:
+      1. With AUTH_REQUIRED, CORS preflights to protected routes get a
+         200 with CORS headers, not a 401.
+      2. An unknown URL is a 404, not a 401.
+    """
+    client = _app(AUTH_REQUIRED=True).test_client()
+    preflight = {"Origin": "http://localhost:3000", "Access-Control-Request-Method": "PUT"}
+    for path in ("/api/recipes", "/api/recipes/abc"):
+        resp = client.options(path, headers=preflight)
+        assert resp.status_code == 200, path
+        assert resp.headers["Access-Control-Allow-Origin"] == preflight["Origin"]
+    assert client.get("/api/nothing-here").status_code == 404
+
+
+def test_firebase_tokens_verified_with_cached_keys():
+    """
+    Test Flow:
+      1. Sign RS256 tokens with a local key; the verifier accepts one for
+         its project and rejects other audiences and issuers.
+      2. Keys are fetched once, refreshed in the background near expiry
+         (the cached keys are served meanwhile) and in the foreground
+         once expired.
+    """
+    from google.auth import crypt, jwt
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo)
+    signer = crypt.RSASigner.from_string(private_pem, key_id="k1")
+
+    fetches = []
+
+    def fetch(url):
+        fetches.append(time.time())
+        return {"k1": public_pem.decode()}, max_age
+
+    max_age = 3600
+    verifier = FirebaseTokenVerifier("demo", PublicKeyCache(fetch=fetch, refresh_margin=300))
+
+    def token(**overrides):
+        now = int(time.time())
+        claims = {"iss": "https://securetoken.google.com/demo", "aud": "demo", "sub": "alice",
+                  "iat": now, "exp": now + 600, "userId": "u1", **overrides}
+        return jwt.encode(signer, claims).decode()
+
+    assert verifier.verify(token())["userId"] == "u1"
+    with pytest.raises(InvalidToken):
+        verifier.verify(token(aud="other"))
+    with pytest.raises(InvalidToken):
+        verifier.verify(token(iss="https://securetoken.google.com/other"))
+    verifier.verify(token())
+    assert len(fetches) == 1
+
+    keys = verifier.keys
+    keys._expires = time.time() + 60
+    keys.get()
+    for _ in range(100):
+        if len(fetches) == 2 and not keys._lock.locked():
+            break
+        time.sleep(0.01)
+    assert len(fetches) == 2 and keys._expires > time.time() + 3000
+
+    keys._expires = time.time() - 1
+    keys.get()
+    assert len(fetches) == 3
@@ -0,0 +1,53 @@
+import json
+
+from backend.api.services import recipe_database
+
+
+def test_import_then_export_round_trip(memory_app, monkeypatch):
+    """
+    Test Flow:
+      1. Import NDJSON with good lines, a bad JSON line and a non-object;
+         expect per-line errors and the good lines written in batches.
+      2. Export with a small page size; expect every imported recipe back.
+    """
+    monkeypatch.setattr(recipe_database, "EXPORT_PAGE_SIZE", 2)
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+
+    lines = [json.dumps({"title": f"Recipe {i}", "likes": 99}) for i in range(5)]
+    lines.insert(2, "{not json")
+    lines.insert(4, "[1, 2]")
+    lines.append(json.dumps({"postId": "fixed", "title": "Kept ID"}))
+    body = "\n".join(lines) + "\n"
+
+    resp = client.post("/api/recipes/import", query_string={"userId": "bulk"},
+                       data=body, content_type="application/x-ndjson")
+    assert resp.status_code == 200, resp.get_json()
+    report = resp.get_json()
+    assert report["imported"] == 6
+    assert report["failed"] == 2
+    assert [e["line"] for e in report["errors"]] == [3, 5]
+
+    before = db.rpc_count
+    resp = client.get("/api/recipes/export", query_string={"userId": "bulk"})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    exported = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert db.rpc_count - before == 4  # pages of 2, 2, 2, then an empty one
+    assert len(exported) == 6
+    assert "likes" not in exported[0]
+    assert "fixed" in {r["postId"] for r in exported}
+    assert sorted(r["title"] for r in exported) == sorted(
+        [f"Recipe {i}" for i in range(5)] + ["Kept ID"])
+
+
+def test_import_commits_in_batches(memory_app):
+    """batch_size recipes go to Firestore in one commit"""
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("u").set({"username": "u"})
+    lines = (json.dumps({"title": f"R{i}"}) for i in range(7))
+    with memory_app.app_context():
+        before = db.rpc_count
+        report = recipe_database.import_recipes_to_firebase("u", lines, batch_size=3)
+        assert db.rpc_count - before == 3
+    assert report["imported"] == 7 and report["failed"] == 0
@@ -0,0 +1,104 @@
+import time
+import uuid
+
+from backend.api.services.cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    """Going over max_entries drops the entry touched longest ago"""
+    cache = LRUCache(max_entries=2, ttl=0)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"   # 'b' is now least recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_respects_byte_budget_and_ttl():
+    """Entries are bounded by total size and expire after their TTL"""
+    cache = LRUCache(max_entries=100, max_bytes=10, ttl=0)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "12345")
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("a") is None
+
+    cache.set("short", "x", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_recipe_reads_are_cached_and_invalidated(memory_app):
+    """
+    Test Flow:
+      1. Create a recipe and read it twice; only the first read hits storage.
+      2. Update it; the next read sees the new title.
+      3. Delete it; the next read is a 404.
+    """
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+
+    user_id = uuid.uuid4().hex
+    db.collection("users").document(user_id).set({"username": user_id})
+    create_resp = client.post("/api/recipes", json={"userId": user_id, "title": "Soup"})
+    post_id = create_resp.get_json()["postId"]
+
+    client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    reads = db.rpc_count
+    resp = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    assert resp.get_json()["title"] == "Soup"
+    assert db.rpc_count == reads
+
+    client.get("/api/recipes", query_string={"userId": user_id})
+    reads = db.rpc_count
+    assert len(client.get("/api/recipes", query_string={"userId": user_id}).get_json()) == 1
+    assert db.rpc_count == reads
+
+    client.put(f"/api/recipes/{post_id}", json={"userId": user_id, "title": "Stew"})
+    resp = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    assert resp.get_json()["title"] == "Stew"
+    listed = client.get("/api/recipes", query_string={"userId": user_id}).get_json()
+    assert listed[0]["title"] == "Stew"
+
+    client.delete(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    resp = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    assert resp.status_code == 404
+    assert client.get("/api/recipes", query_string={"userId": user_id}).get_json() == []
+
+    stats = client.get("/api/cache/stats").get_json()
+    assert stats["backend"] == "memory"
+    assert stats["hits"] >= 2
+
+
+def test_read_racing_a_write_cannot_cache_stale_data(memory_app, monkeypatch):
+    """
+    Test Flow:
+      1. A list read fetches from Firestore; before it stores the result,
+         an update commits and invalidates the cache.
+      2. The next read still sees the update: the late store went under
+         the epoch the write retired.
+    """
+    from backend.api.services import recipe_database
+
+    client = memory_app.test_client()
+    post_id = client.post("/api/recipes", json={"userId": "race", "title": "Soup"}) \
+        .get_json()["postId"]
+    real_cache_set = recipe_database.cache_set
+
+    def cache_set_after_write(cache, key, value, ttl=None):
+        if key.startswith("recipes:race:"):
+            client.put(f"/api/recipes/{post_id}", json={"userId": "race", "title": "Stew"})
+        real_cache_set(cache, key, value, ttl)
+
+    monkeypatch.setattr(recipe_database, "cache_set", cache_set_after_write)
+    with memory_app.test_request_context():
+        stale = recipe_database.get_all_recipes_from_firebase("race")
+    assert [r["title"] for r in stale] == ["Soup"]
+    monkeypatch.setattr(recipe_database, "cache_set", real_cache_set)
+
+    resp = client.get("/api/recipes", query_string={"userId": "race"})
+    assert [r["title"] for r in resp.get_json()] == ["Stew"]
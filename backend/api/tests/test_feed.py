@@ -0,0 +1,63 @@
+import uuid
+
+
+def test_feed_pages_across_users(memory_app):
+    """
+    Test Flow:
+      1. Create recipes for two users, with interleaved post dates.
+      2. Page through /api/feed two at a time; expect every recipe once,
+         newest first, each tagged with its author.
+    """
+    db = memory_app.extensions["storage"].db
+    authors = {}
+    for i in range(5):
+        user_id = f"user{i % 2}"
+        post_id = uuid.uuid4().hex
+        db.collection("users").document(user_id).collection("created_recipes") \
+            .document(post_id).set({
+                "postId": post_id,
+                "title": f"Recipe {i}",
+                "datePosted": f"2024-01-0{i + 1}T00:00:00",
+            })
+        authors[f"Recipe {i}"] = user_id
+
+    client = memory_app.test_client()
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, "fields": "title"}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/feed", query_string=params)
+        assert resp.status_code == 200, resp.get_json()
+        body = resp.get_json()
+        for recipe in body["recipes"]:
+            assert set(recipe) == {"title", "postId", "id", "userId"}
+            assert recipe["userId"] == authors[recipe["title"]]
+            seen.append(recipe["title"])
+        pages += 1
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert seen == [f"Recipe {i}" for i in reversed(range(5))]
+
+
+def test_feed_first_page_is_cached(memory_app):
+    """The first page is served from cache until FEED_CACHE_TTL runs out"""
+    client = memory_app.test_client()
+    client.post("/api/recipes", json={"userId": "u1", "title": "First"})
+    db = memory_app.extensions["storage"].db
+
+    assert len(client.get("/api/feed").get_json()["recipes"]) == 1
+    reads = db.rpc_count
+    client.post("/api/recipes", json={"userId": "u2", "title": "Second"})
+    writes = db.rpc_count - reads
+
+    resp = client.get("/api/feed")
+    assert [r["title"] for r in resp.get_json()["recipes"]] == ["First"]
+    assert db.rpc_count == reads + writes
+
+    memory_app.extensions["recipe_cache"].delete("feed:first:20")
+    titles = [r["title"] for r in client.get("/api/feed").get_json()["recipes"]]
+    assert titles == ["Second", "First"]
@@ -0,0 +1,53 @@
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from backend.api.services.hashing import PasswordHasher
+
+
+def test_pool_and_inline_hashes_verify():
+    """Hashes from the process pool and inline mode are interchangeable"""
+    pooled = PasswordHasher(workers=1, method="pbkdf2:sha256:1000")
+    inline = PasswordHasher(workers=0, method="pbkdf2:sha256:1000")
+    try:
+        # Workers must never be forked from the threaded server process.
+        assert pooled._pool._mp_context.get_start_method() != "fork"
+        pooled_hash = pooled.hash_password("hunter2")
+        assert check_password_hash(pooled_hash, "hunter2")
+        assert inline.verify_password(pooled_hash, "hunter2")
+        assert not pooled.verify_password(inline.hash_password("hunter2"), "wrong")
+    finally:
+        pooled.shutdown()
+
+
+def test_needs_rehash_when_params_change():
+    """Only hashes made with other parameters need upgrading"""
+    hasher = PasswordHasher(workers=0, method="pbkdf2:sha256:2000")
+    assert not hasher.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:2000"))
+    assert hasher.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:1000"))
+    assert hasher.needs_rehash(generate_password_hash("pw", "scrypt"))
+
+
+def test_login_upgrades_outdated_hash(memory_app):
+    """
+    Test Flow:
+      1. Store a user whose hash uses old parameters.
+      2. Log in; expect success and the stored hash to use the new method.
+    """
+    db = memory_app.extensions["storage"].db
+    old_hash = generate_password_hash("oldpassword", "pbkdf2:sha256:1000")
+    db.collection("users").document("u1").set({
+        "userId": "u1",
+        "username": "olduser",
+        "email": "old@example.com",
+        "password_hash": old_hash,
+    })
+
+    client = memory_app.test_client()
+    resp = client.post("/api/login", json={"username": "olduser", "password": "oldpassword"})
+    assert resp.status_code == 200, resp.get_json()
+
+    new_hash = db.collection("users").document("u1").get().to_dict()["password_hash"]
+    assert new_hash.startswith("scrypt:")
+    assert check_password_hash(new_hash, "oldpassword")
+
+    resp = client.post("/api/login", json={"username": "olduser", "password": "oldpassword"})
+    assert resp.status_code == 200
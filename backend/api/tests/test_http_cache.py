@@ -0,0 +1,167 @@
+import gzip
+import json
+
+
+def test_recipe_etag_and_304(memory_app):
+    """
+    Test Flow:
+      1. GET a recipe; expect a weak ETag and Cache-Control.
+      2. Repeat with If-None-Match; expect 304 and no Firestore read.
+      3. Update the recipe; the old ETag no longer matches.
+    """
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+    post_id = client.post("/api/recipes", json={"userId": "u1", "title": "Soup"}).get_json()["postId"]
+    params = {"userId": "u1"}
+
+    resp = client.get(f"/api/recipes/{post_id}", query_string=params)
+    etag = resp.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert resp.headers["Cache-Control"] == "private, max-age=0"
+
+    before = db.rpc_count
+    resp = client.get(f"/api/recipes/{post_id}", query_string=params,
+                      headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.get_data() == b""
+    assert db.rpc_count == before
+
+    client.put(f"/api/recipes/{post_id}", json={"userId": "u1", "title": "Stew"})
+    resp = client.get(f"/api/recipes/{post_id}", query_string=params,
+                      headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_json()["title"] == "Stew"
+
+
+def test_list_etag_follows_recipes_version(memory_app):
+    """Any create/update/delete bumps the version behind the list ETag"""
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("u2").set({"username": "u2"})
+    post_id = client.post("/api/recipes", json={"userId": "u2", "title": "A"}).get_json()["postId"]
+    # Without likes in the projection, the version alone is the validator.
+    params = {"userId": "u2", "fields": "title"}
+
+    resp = client.get("/api/recipes", query_string=params)
+    resp.close()  # streamed; closing ends the request context
+    etag = resp.headers["ETag"]
+    before = db.rpc_count
+    resp = client.get("/api/recipes", query_string=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert db.rpc_count == before  # version came from the cache
+
+    paged = client.get("/api/recipes", query_string={**params, "limit": 5},
+                       headers={"If-None-Match": etag})
+    assert paged.status_code == 304
+
+    for change in (
+        lambda: client.put(f"/api/recipes/{post_id}", json={"userId": "u2", "title": "B"}),
+        lambda: client.post("/api/recipes", json={"userId": "u2", "title": "C"}),
+        lambda: client.delete(f"/api/recipes/{post_id}", query_string={"userId": "u2"}),
+    ):
+        change()
+        resp = client.get("/api/recipes", query_string=params, headers={"If-None-Match": etag})
+        resp.close()
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+    stored = db.collection("users").document("u2").get().to_dict()
+    assert stored["recipesVersion"] == 4
+
+
+def test_etag_covers_likes_and_viewer(memory_app):
+    """
+    Test Flow:
+      1. A like changes the ETag of the recipe and of a paged list, though
+         no recipe was written.
+      2. Another viewer gets a different ETag (isLiked is theirs); every
+         response varies on Authorization.
+      3. The streamed full list with likes carries no ETag at all.
+    """
+    client = memory_app.test_client()
+    memory_app.extensions["storage"].db.collection("users").document("u4").set({"username": "u4"})
+    post_id = client.post("/api/recipes", json={"userId": "u4", "title": "Pie"}).get_json()["postId"]
+    one = (f"/api/recipes/{post_id}", {"userId": "u4", "viewerId": "v1"})
+    page = ("/api/recipes", {"userId": "u4", "viewerId": "v1", "limit": 5})
+
+    etags = {}
+    for path, params in (one, page):
+        resp = client.get(path, query_string=params)
+        assert "Authorization" in resp.headers["Vary"]
+        etags[path] = resp.headers["ETag"]
+        assert client.get(path, query_string=params,
+                          headers={"If-None-Match": etags[path]}).status_code == 304
+        other = client.get(path, query_string={**params, "viewerId": "v2"})
+        assert other.headers["ETag"] != etags[path]
+
+    client.post(f"/api/recipes/{post_id}/like", json={"userId": "u4", "viewerId": "v1"})
+    for path, params in (one, page):
+        resp = client.get(path, query_string=params, headers={"If-None-Match": etags[path]})
+        assert resp.status_code == 200
+        body = resp.get_json()
+        recipe = body["recipes"][0] if "recipes" in body else body
+        assert (recipe["likes"], recipe["isLiked"]) == (1, True)
+
+    resp = client.get("/api/recipes", query_string={"userId": "u4"})
+    resp.close()
+    assert "ETag" not in resp.headers and "Authorization" in resp.headers["Vary"]
+
+
+def test_large_lists_are_gzipped(memory_app):
+    """Big JSON bodies are compressed for clients that accept gzip"""
+    client = memory_app.test_client()
+    for i in range(20):
+        client.post("/api/recipes", json={"userId": "u3", "title": f"Recipe {i}",
+                                          "instructions": "Stir well. " * 20})
+
+    resp = client.get("/api/recipes", query_string={"userId": "u3"},
+                      headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(json.loads(gzip.decompress(resp.get_data()))) == 20
+
+    plain = client.get("/api/recipes", query_string={"userId": "u3"})
+    assert "Content-Encoding" not in plain.headers
+    assert len(plain.get_json()) == 20
+
+
+def test_unknown_author_writes_in_one_commit(memory_app):
+    """
+    Test Flow:
+      1. A userId with no user document has no list ETag.
+      2. Create, edit (fields and images) and delete recipes as that
+         userId; every write succeeds, a create in one commit.
+      3. Its user document now holds only recipesVersion, and its lists
+         carry an ETag.
+      4. Deleting a recipe that doesn't exist is also one commit.
+    """
+    from io import BytesIO
+
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+    resp = client.get("/api/recipes", query_string={"userId": "ghost", "limit": 5})
+    assert "ETag" not in resp.headers
+
+    before = db.rpc_count
+    client.post("/api/recipes", json={"userId": "ghost", "title": "Pie"})
+    assert db.rpc_count - before == 1
+    post_id = client.post("/api/recipes", data={
+        "userId": "ghost", "title": "Soup", "images": [(BytesIO(b"img"), "soup.png")],
+    }).get_json()["postId"]
+    assert client.put(f"/api/recipes/{post_id}",
+                      json={"userId": "ghost", "title": "Stew"}).status_code == 200
+    image_id = client.get(f"/api/recipes/{post_id}", query_string={"userId": "ghost"}) \
+        .get_json()["imageList"][0]["publicId"]
+    assert client.put(f"/api/recipes/{post_id}", data={
+        "userId": "ghost", "removePublicIds": image_id}).status_code == 200
+    assert client.delete(f"/api/recipes/{post_id}",
+                         query_string={"userId": "ghost"}).status_code == 200
+
+    assert db.collection("users").document("ghost").get().to_dict() == {"recipesVersion": 5}
+    resp = client.get("/api/recipes", query_string={"userId": "ghost", "limit": 5})
+    assert [r["title"] for r in resp.get_json()["recipes"]] == ["Pie"]
+    assert "ETag" in resp.headers
+
+    before = db.rpc_count
+    assert client.delete("/api/recipes/nope", query_string={"userId": "ghost"}).status_code == 404
+    assert db.rpc_count - before == 1
@@ -0,0 +1,144 @@
+import uuid
+from io import BytesIO
+
+from backend.api import create_app
+from backend.api.services import image_jobs
+from backend.api.services.image_jobs import DirectoryJobBackend, ImageJob
+
+from test_recipe import MINIMAL_PNG
+
+
+def test_async_create_returns_202_and_finishes_in_background():
+    """
+    Test Flow:
+      1. In async mode, create a recipe with two images; expect 202 and a
+         recipe that exists immediately with imageStatus pending.
+      2. Wait for the worker, then check status is done and imageList
+         holds both images.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "IMAGE_PROCESSING_MODE": "async"})
+    client = app.test_client()
+    user_id = uuid.uuid4().hex
+
+    resp = client.post(
+        "/api/recipes",
+        data={"userId": user_id, "title": "Async Pie",
+              "images": [(BytesIO(MINIMAL_PNG), "a.png"), (BytesIO(MINIMAL_PNG), "b.png")]},
+        content_type="multipart/form-data"
+    )
+    assert resp.status_code == 202, resp.get_json()
+    post_id = resp.get_json()["postId"]
+    assert resp.get_json()["status"] == "pending"
+
+    status_resp = client.get(f"/api/recipes/{post_id}/status", query_string={"userId": user_id})
+    assert status_resp.status_code == 200
+    assert status_resp.get_json()["status"] in ("pending", "processing", "done")
+
+    assert app.extensions["image_jobs"].wait_idle(timeout=5)
+
+    status = client.get(f"/api/recipes/{post_id}/status", query_string={"userId": user_id}).get_json()
+    assert status["status"] == "done"
+    assert status["completed"] == 2
+
+    recipe = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id}).get_json()
+    assert recipe["title"] == "Async Pie"
+    assert len(recipe["imageList"]) == 2
+
+
+def test_status_for_sync_recipe_and_missing_recipe(memory_app):
+    """Recipes without background work are 'done'; unknown recipes are 404"""
+    client = memory_app.test_client()
+    user_id = uuid.uuid4().hex
+    post_id = client.post("/api/recipes", json={"userId": user_id, "title": "Plain"}).get_json()["postId"]
+
+    resp = client.get(f"/api/recipes/{post_id}/status", query_string={"userId": user_id})
+    assert resp.get_json() == {"postId": post_id, "status": "done"}
+
+    resp = client.get("/api/recipes/nope/status", query_string={"userId": user_id})
+    assert resp.status_code == 404
+
+
+def test_directory_job_backend_replays_unfinished_jobs(tmp_path):
+    """Jobs spooled to disk but never acked come back after a restart"""
+    backend = DirectoryJobBackend(str(tmp_path))
+    job = ImageJob("user1", "post1", [("a.png", "image/png", MINIMAL_PNG)])
+    backend.put(job)
+
+    restarted = DirectoryJobBackend(str(tmp_path))
+    replayed = restarted.get(timeout=1)
+    assert replayed.job_id == job.job_id
+    assert replayed.files == job.files
+
+    restarted.ack(replayed)
+    assert DirectoryJobBackend(str(tmp_path)).get(timeout=0.01) is None
+
+
+def test_failed_job_marks_recipe_and_destroys_uploads(monkeypatch):
+    """
+    Test Flow:
+      1. Make the recipe write after the uploads raise.
+      2. The recipe's imageStatus ends up failed, not pending, and the
+         images that were uploaded are destroyed.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "IMAGE_PROCESSING_MODE": "async"})
+    client = app.test_client()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("Firestore unavailable")
+
+    monkeypatch.setattr(image_jobs, "update_recipe_images_in_firebase", broken)
+    resp = client.post("/api/recipes", data={
+        "userId": "jobs", "title": "Doomed",
+        "images": [(BytesIO(MINIMAL_PNG), "a.png"), (BytesIO(MINIMAL_PNG), "b.png")],
+    })
+    assert resp.status_code == 202
+    post_id = resp.get_json()["postId"]
+    assert app.extensions["image_jobs"].wait_idle(timeout=5)
+
+    status = client.get(f"/api/recipes/{post_id}/status", query_string={"userId": "jobs"}).get_json()
+    assert status["status"] == "failed"
+    assert status["failures"][0]["error"] == "Firestore unavailable"
+    assert app.extensions["storage"].images == {}
+
+
+def test_job_that_cannot_be_queued_leaves_no_recipe(monkeypatch):
+    """
+    Test Flow:
+      1. Make the job backend's put raise, as a full spool disk would.
+      2. The create is a 500, and no pending recipe is left behind.
+      3. The queue doesn't count the job as in flight.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "IMAGE_PROCESSING_MODE": "async"})
+    job_queue = app.extensions["image_jobs"]
+
+    def full_disk(job):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(job_queue.backend, "put", full_disk)
+    resp = app.test_client().post("/api/recipes", data={
+        "userId": "jobs", "title": "Unqueued", "images": [(BytesIO(MINIMAL_PNG), "a.png")],
+    })
+    assert resp.status_code == 500
+    assert resp.get_json() == {"error": "Could not queue image processing"}
+
+    recipes = app.test_client().get("/api/recipes", query_string={"userId": "jobs"}).get_json()
+    assert recipes == []
+    assert job_queue.jobs == {} and job_queue.wait_idle(timeout=0)
+
+
+def test_directory_jobs_claimed_by_one_process(tmp_path):
+    """
+    Test Flow:
+      1. Two processes replay the same spooled job; only one gets it.
+      2. A claim whose holder died is replayed once the lease is up.
+    """
+    DirectoryJobBackend(str(tmp_path)).put(
+        ImageJob("user1", "post1", [("a.png", "image/png", MINIMAL_PNG)]))
+    first, second = DirectoryJobBackend(str(tmp_path)), DirectoryJobBackend(str(tmp_path))
+    claimed = first.get(timeout=0.01)
+    assert claimed is not None
+    assert second.get(timeout=0.01) is None
+
+    assert DirectoryJobBackend(str(tmp_path)).get(timeout=0.01) is None
+    replayed = DirectoryJobBackend(str(tmp_path), lease=0).get(timeout=0.01)
+    assert replayed.job_id == claimed.job_id
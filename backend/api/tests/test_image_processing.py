@@ -0,0 +1,134 @@
+from io import BytesIO
+
+import pytest
+
+from backend.api import create_app
+from backend.api.services import image_processing
+from backend.api.services.metrics import METRICS
+
+
+def _app(**config):
+    app = create_app({"STORAGE_BACKEND": "memory", **config})
+    app.config["TESTING"] = True
+    return app
+
+
+def _image_bytes():
+    counters = METRICS.collect()[0]
+    return {name: sum(v for (n, labels), v in counters.items() if n == name)
+            for name in ("image_bytes_received_total", "image_bytes_uploaded_total")}
+
+
+def test_photos_downscaled_before_upload():
+    """
+    Test Flow:
+      1. Create a recipe with two large noisy JPEGs, one carrying EXIF
+         (a GPS tag and a rotate-90 orientation).
+      2. What reached the image store is WebP, no larger than
+         IMAGE_MAX_DIMENSION, turned upright and without EXIF, but with
+         the source's ICC color profile.
+      3. The byte counters show far fewer bytes uploaded than received.
+    """
+    np = pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+
+    def photo(exif=None):
+        pixels = np.random.default_rng(0).integers(0, 255, (1600, 2400, 3), dtype=np.uint8)
+        out = BytesIO()
+        Image.fromarray(pixels).save(out, format="JPEG", quality=95, exif=exif or b"",
+                                     icc_profile=icc_profile)
+        return out.getvalue()
+
+    ImageCms = pytest.importorskip("PIL.ImageCms")
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+    exif[0x8825] = {1: "N", 2: (43.0, 9.0, 0.0)}  # GPSInfo
+    app = _app(IMAGE_MAX_DIMENSION=800, IMAGE_FORMAT="webp", IMAGE_PREPROCESS_WORKERS=2)
+    images = app.extensions["storage"].images
+    before = _image_bytes()
+
+    resp = app.test_client().post("/api/recipes", data={
+        "userId": "img", "title": "Salad",
+        "images": [(BytesIO(photo(exif)), "turned.jpg"), (BytesIO(photo()), "plain.jpg")],
+    })
+    assert resp.status_code == 201, resp.get_json()
+
+    stored = [Image.open(BytesIO(data)) for data in images.values()]
+    assert sorted(img.size for img in stored) == [(533, 800), (800, 533)]
+    assert all(img.format == "WEBP" and not img.getexif() for img in stored)
+    assert all(img.info.get("icc_profile") == icc_profile for img in stored)
+
+    after = _image_bytes()
+    received = after["image_bytes_received_total"] - before["image_bytes_received_total"]
+    uploaded = after["image_bytes_uploaded_total"] - before["image_bytes_uploaded_total"]
+    assert received > 1_000_000 and uploaded * 4 < received
+
+
+def test_upload_limits_and_passthrough():
+    """
+    Test Flow:
+      1. A file over IMAGE_MAX_BYTES is a 413 naming it; nothing is uploaded.
+      2. A body over RECIPE_MAX_REQUEST_BYTES is a 413 before it's parsed.
+      3. With IMAGE_PREPROCESS=false files are uploaded exactly as sent.
+    """
+    app = _app(IMAGE_MAX_BYTES=1000, RECIPE_MAX_REQUEST_BYTES=5000)
+    images = app.extensions["storage"].images
+    client = app.test_client()
+
+    resp = client.post("/api/recipes", data={
+        "userId": "img", "title": "Big",
+        "images": [(BytesIO(b"x" * 10), "small.png"), (BytesIO(b"x" * 2000), "big.png")],
+    })
+    assert resp.status_code == 413
+    assert resp.get_json() == {"error": "Image too large", "filename": "big.png",
+                               "maxBytes": 1000}
+    assert images == {}
+
+    resp = client.post("/api/recipes", data={
+        "userId": "img", "title": "Huge", "images": [(BytesIO(b"x" * 6000), "huge.png")]})
+    assert resp.status_code == 413
+
+    app = _app(IMAGE_PREPROCESS="false")
+    resp = app.test_client().post("/api/recipes", data={
+        "userId": "img", "title": "Raw", "images": [(BytesIO(b"raw bytes"), "raw.jpg")]})
+    assert resp.status_code == 201
+    assert list(app.extensions["storage"].images.values()) == [b"raw bytes"]
+
+
+def test_original_kept_when_reencoding_does_not_shrink_it():
+    """
+    Test Flow:
+      1. Upload a tiny, flat PNG that needs no resizing and has no EXIF.
+      2. Its JPEG re-encoding at quality 95 is larger, so the original
+         bytes are what reach the image store.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    out = BytesIO()
+    Image.new("RGB", (16, 16), (200, 40, 40)).save(out, format="PNG", optimize=True)
+    original = out.getvalue()
+
+    app = _app(IMAGE_FORMAT="jpeg", IMAGE_QUALITY=95)
+    resp = app.test_client().post("/api/recipes", data={
+        "userId": "img", "title": "Dot", "images": [(BytesIO(original), "dot.png")]})
+    assert resp.status_code == 201, resp.get_json()
+    assert list(app.extensions["storage"].images.values()) == [original]
+
+
+def test_auto_passes_through_without_pillow(monkeypatch):
+    """
+    Test Flow:
+      1. Pretend Pillow isn't installed.
+      2. With IMAGE_PREPROCESS=auto files are uploaded exactly as sent.
+      3. With IMAGE_PREPROCESS=true the app refuses to start.
+    """
+    monkeypatch.setattr(image_processing, "_have_pillow", lambda: False)
+
+    app = _app(IMAGE_PREPROCESS="auto")
+    resp = app.test_client().post("/api/recipes", data={
+        "userId": "img", "title": "Raw", "images": [(BytesIO(b"raw bytes"), "raw.jpg")]})
+    assert resp.status_code == 201
+    assert list(app.extensions["storage"].images.values()) == [b"raw bytes"]
+
+    with pytest.raises(RuntimeError, match="Pillow"):
+        _app(IMAGE_PREPROCESS="true")
@@ -0,0 +1,140 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from backend.api.services.ingredients import IngredientIndex, parse_ingredients
+
+
+def test_parse_ingredients_normalizes_lines():
+    """Amounts, units and prep notes are dropped; plurals are stemmed"""
+    assert parse_ingredients("2 cups chopped Tomatoes, 1 tbsp olive oil\n3 cloves garlic (minced)") == [
+        "tomato", "olive oil", "garlic"]
+    assert parse_ingredients(["Eggs", "eggs", "salt to taste"]) == ["egg", "salt"]
+
+
+def test_match_ranks_by_coverage_then_missing(memory_app):
+    """
+    Test Flow:
+      1. Create recipes with overlapping ingredients.
+      2. Match on eggs/flour/milk; the fully covered recipe comes first,
+         and missing ingredients are listed for partial matches.
+      3. Delete the top recipe; it no longer matches.
+    """
+    client = memory_app.test_client()
+    ids = {}
+    for title, ingredients in [
+        ("Pancakes", "2 eggs, 1 cup flour, 1 cup milk"),
+        ("Omelette", "3 eggs, milk, cheese, salt"),
+        ("Salad", "lettuce, tomatoes, olive oil"),
+    ]:
+        resp = client.post("/api/recipes", json={
+            "userId": "cook", "title": title, "ingredients": ingredients})
+        ids[title] = resp.get_json()["postId"]
+
+    resp = client.get("/api/recipes/match", query_string={"ingredients": "Eggs,flour,milk"})
+    assert resp.status_code == 200, resp.get_json()
+    results = resp.get_json()["results"]
+    assert [r["title"] for r in results] == ["Pancakes", "Omelette"]
+    assert results[0]["coverage"] == 1.0
+    assert results[1]["missing"] == 2
+    assert sorted(results[1]["missingIngredients"]) == ["cheese", "salt"]
+
+    resp = client.get("/api/recipes/match", query_string={"ingredients": "eggs,milk", "maxMissing": 1})
+    assert [r["title"] for r in resp.get_json()["results"]] == ["Pancakes"]
+
+    client.delete(f"/api/recipes/{ids['Pancakes']}", query_string={"userId": "cook"})
+    resp = client.get("/api/recipes/match", query_string={"ingredients": "eggs,flour,milk"})
+    assert [r["title"] for r in resp.get_json()["results"]] == ["Omelette"]
+    assert client.get("/api/recipes/match").status_code == 400
+
+
+def test_update_replaces_ingredient_bits():
+    """Re-adding a recipe drops bits for ingredients it no longer uses"""
+    index = IngredientIndex()
+    index.loaded = True
+    index.add("u", "p", {"title": "Toast", "ingredients": "bread, butter"})
+    index.add("u", "p", {"title": "Toast", "ingredients": "bread, jam"})
+    assert index.match(["butter"]) == []
+    assert index.match(["jam"])[0]["missingIngredients"] == ["bread"]
+
+
+def test_writes_during_build_are_kept(memory_app):
+    """
+    Test Flow:
+      1. Start a build over one stored recipe; mid-scan, a write hook adds
+         another and deletes the stored one.
+      2. The swapped-in index reflects both writes, not just the scan.
+    """
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("u").collection("created_recipes").document("old") \
+        .set({"title": "Toast", "ingredients": "bread, butter"})
+    index = IngredientIndex()
+
+    class ScanWithWrites:
+        def collection_group(self, name):
+            return self
+
+        def stream(self):
+            for doc in db.collection_group("created_recipes").stream():
+                index.add("u", "new", {"title": "Jam Toast", "ingredients": "bread, jam"})
+                index.remove("u", "old")
+                yield doc
+
+    index.ensure_loaded(ScanWithWrites())
+    assert [r["title"] for r in index.match(["bread"])] == ["Jam Toast"]
+
+
+def test_vectorized_and_loop_scoring_agree():
+    """
+    Test Flow:
+      1. Index a few hundred random recipes, then remove and re-add some
+         so rows are reused.
+      2. For a spread of queries, numpy scoring and the pure-Python loop
+         return the same ranking.
+    """
+    pytest.importorskip("numpy")
+    rng = random.Random(0)
+    pantry = ["egg", "flour", "milk", "butter", "sugar", "salt", "garlic", "onion",
+              "tomato", "basil", "rice", "bean", "cheese", "lemon", "pepper"]
+    index = IngredientIndex()
+    index.loaded = True
+    for i in range(300):
+        index.add("u", f"p{i}", {"title": f"R{i}", "ingredients": rng.sample(pantry, rng.randint(1, 6))})
+    for i in range(0, 300, 7):
+        index.remove("u", f"p{i}")
+    for i in range(300, 330):
+        index.add("u", f"p{i}", {"title": f"R{i}", "ingredients": rng.sample(pantry, 3)})
+
+    for _ in range(20):
+        have = rng.sample(pantry, rng.randint(1, 5))
+        max_missing = rng.choice([None, 0, 2])
+        vectorized = index.match(have, limit=15, max_missing=max_missing)
+        index._np, numpy = None, index._np
+        try:
+            assert index.match(have, limit=15, max_missing=max_missing) == vectorized
+        finally:
+            index._np = numpy
+
+
+def test_other_workers_recipes_match_after_the_refresh_interval(memory_app):
+    """
+    Test Flow:
+      1. Build the index, then store a recipe straight in Firestore, as
+         another worker would.
+      2. It doesn't match until INGREDIENT_REFRESH_INTERVAL has passed;
+         then the next match catches up and finds it.
+    """
+    db = memory_app.extensions["storage"].db
+    index = IngredientIndex(refresh_interval=60)
+    index.ensure_loaded(db)
+    db.collection("users").document("w2").collection("created_recipes").document("p1").set(
+        {"title": "Dal", "ingredients": "lentils, onion",
+         "dateUpdated": datetime.utcnow().isoformat()})
+
+    index.ensure_loaded(db)
+    assert index.match(["lentils"]) == []
+
+    index._refreshed_at -= 60
+    index.ensure_loaded(db)
+    assert [r["postId"] for r in index.match(["lentils"])] == ["p1"]
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.api import create_app
+from backend.api.controllers import recipes as recipes_controller
+from backend.api.services.json_provider import OrjsonProvider, stream_json_array
+from backend.api.services.memory_firestore import Query
+
+
+def test_orjson_provider_matches_stdlib():
+    """
+    Test Flow:
+      1. Build one app per provider.
+      2. Encode the same document with each; expect the same JSON value,
+         datetimes as HTTP dates in both.
+    """
+    pytest.importorskip("orjson")
+    fast = create_app({"STORAGE_BACKEND": "memory", "JSON_PROVIDER": "auto"})
+    slow = create_app({"STORAGE_BACKEND": "memory", "JSON_PROVIDER": "stdlib"})
+    assert isinstance(fast.json, OrjsonProvider)
+    assert not isinstance(slow.json, OrjsonProvider)
+
+    doc = {"title": "Crème brûlée", "servings": 4, "imageList": [{"url": "x"}],
+           "datePosted": datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)}
+    assert json.loads(fast.json.dumps(doc)) == json.loads(slow.json.dumps(doc))
+    assert json.loads(fast.json.dumps(doc))["datePosted"] == "Wed, 01 May 2024 12:00:00 GMT"
+
+    with fast.app_context():
+        resp = fast.json.response(doc)
+    assert resp.mimetype == "application/json"
+    assert resp.get_json()["title"] == "Crème brûlée"
+
+
+def test_unknown_json_provider_is_rejected():
+    with pytest.raises(ValueError):
+        create_app({"STORAGE_BACKEND": "memory", "JSON_PROVIDER": "simplejson"})
+
+
+def test_stream_json_array(memory_app):
+    """Chunks join into one valid array, empty or not"""
+    assert "".join(stream_json_array(memory_app, iter([]))) == "[]\n"
+    chunks = list(stream_json_array(memory_app, ({"n": i} for i in range(3))))
+    assert len(chunks) == 4
+    assert json.loads("".join(chunks)) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_recipe_list_is_streamed(memory_app):
+    """
+    Test Flow:
+      1. Create recipes and list them; expect a streamed JSON array with
+         likes annotated.
+      2. List again with a projection; served from the cache, the cached
+         documents carry no likes.
+    """
+    client = memory_app.test_client()
+    for i in range(3):
+        client.post("/api/recipes", json={"userId": "s1", "title": f"Recipe {i}"})
+
+    resp = client.get("/api/recipes", query_string={"userId": "s1"})
+    assert resp.is_streamed
+    recipes = resp.get_json()
+    assert sorted(r["title"] for r in recipes) == ["Recipe 0", "Recipe 1", "Recipe 2"]
+    assert all(r["likes"] == 0 for r in recipes)
+
+    resp = client.get("/api/recipes", query_string={"userId": "s1", "fields": "title"})
+    assert all(set(r) == {"id", "postId", "title"} for r in resp.get_json())
+    cache = memory_app.extensions["recipe_cache"]
+    epoch = cache.get("recipes-epoch:s1")
+    cached = json.loads(cache.get(f"recipes:s1:{epoch}"))
+    assert not any("likes" in r for r in cached)
+
+
+def test_failed_list_read_never_looks_complete(memory_app, monkeypatch):
+    """
+    Test Flow:
+      1. Make the recipe query fail before its first document; the list
+         is a 500, not an empty 200.
+      2. Make it fail after two documents, with one recipe per chunk; the
+         streamed body raises instead of closing the array.
+      3. Nothing was cached: with the query working again, all three
+         recipes are listed.
+    """
+    memory_app.config["PROPAGATE_EXCEPTIONS"] = False
+    client = memory_app.test_client()
+    for i in range(3):
+        client.post("/api/recipes", json={"userId": "s2", "title": f"Recipe {i}"})
+    working = Query.stream
+
+    def failing_after(count):
+        def stream(self, transaction=None):
+            for i, doc in enumerate(working(self, transaction)):
+                if i == count:
+                    raise RuntimeError("Firestore unavailable")
+                yield doc
+        return stream
+
+    monkeypatch.setattr(Query, "stream", failing_after(0))
+    resp = client.get("/api/recipes", query_string={"userId": "s2"})
+    assert resp.status_code == 500
+
+    monkeypatch.setattr(recipes_controller, "STREAM_CHUNK_SIZE", 1)
+    monkeypatch.setattr(Query, "stream", failing_after(2))
+    resp = client.get("/api/recipes", query_string={"userId": "s2"})
+    assert resp.status_code == 200 and resp.is_streamed
+    with pytest.raises(RuntimeError):
+        resp.get_data()
+    resp.close()
+
+    monkeypatch.setattr(Query, "stream", working)
+    recipes = client.get("/api/recipes", query_string={"userId": "s2"}).get_json()
+    assert len(recipes) == 3
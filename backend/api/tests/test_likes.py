@@ -0,0 +1,105 @@
+from backend.api import create_app
+
+
+def _create(client, user_id="author", title="Likeable"):
+    return client.post("/api/recipes", json={"userId": user_id, "title": title}).get_json()["postId"]
+
+
+def test_like_is_idempotent_and_per_viewer():
+    """
+    Test Flow:
+      1. Like a recipe twice as one viewer, once as another; expect 2.
+      2. isLiked is true only for a viewer who liked it.
+      3. Unlike twice; expect the count to drop by one.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "LIKE_FLUSH_INTERVAL": 60})
+    client = app.test_client()
+    post_id = _create(client)
+
+    for viewer in ("v1", "v1", "v2"):
+        resp = client.post(f"/api/recipes/{post_id}/like",
+                           json={"userId": "author", "viewerId": viewer})
+        assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["likes"] == 2
+
+    recipe = client.get(f"/api/recipes/{post_id}",
+                        query_string={"userId": "author", "viewerId": "v1"}).get_json()
+    assert recipe["likes"] == 2 and recipe["isLiked"] is True
+    recipe = client.get(f"/api/recipes/{post_id}",
+                        query_string={"userId": "author", "viewerId": "v3"}).get_json()
+    assert recipe["isLiked"] is False
+
+    for _ in range(2):
+        resp = client.delete(f"/api/recipes/{post_id}/like",
+                             query_string={"userId": "author", "viewerId": "v2"})
+    assert resp.get_json()["likes"] == 1
+
+    resp = client.post("/api/recipes/nope/like", json={"userId": "author", "viewerId": "v1"})
+    assert resp.status_code == 404
+
+
+def test_flush_coalesces_into_shards():
+    """Buffered likes become one Increment per recipe, summed on read"""
+    app = create_app({"STORAGE_BACKEND": "memory", "LIKE_FLUSH_INTERVAL": 60,
+                      "LIKE_COUNT_TTL": 0, "LIKE_SHARDS": 4})
+    client = app.test_client()
+    post_a, post_b = _create(client, title="A"), _create(client, title="B")
+    for i in range(5):
+        client.post(f"/api/recipes/{post_a}/like", json={"userId": "author", "viewerId": f"v{i}"})
+    client.post(f"/api/recipes/{post_b}/like", json={"userId": "author", "viewerId": "v0"})
+
+    counter = app.extensions["like_counter"]
+    db = app.extensions["storage"].db
+    before = db.rpc_count
+    assert counter.flush() == 2
+    assert db.rpc_count == before + 1  # one batch commit
+    assert counter.pending == {}
+
+    shards = db.collection("users").document("author").collection("created_recipes") \
+        .document(post_a).collection("like_shards").get()
+    assert sum(s.to_dict()["count"] for s in shards) == 5
+
+    recipes = client.get("/api/recipes", query_string={"userId": "author", "viewerId": "v0"}).get_json()
+    assert {r["title"]: (r["likes"], r["isLiked"]) for r in recipes} == {
+        "A": (5, True), "B": (1, True)}
+
+
+def test_lists_sum_the_shards_and_delete_cleans_up():
+    """
+    Test Flow:
+      1. Flush likes on several recipes; only shards are written, summaries untouched.
+      2. Listing them reads every recipe's shards in one get_all.
+      3. A recipe with no summary document yet still reports its likes.
+      4. Deleting a recipe deletes its likes and like_shards documents and
+         leaves no summary behind.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "LIKE_FLUSH_INTERVAL": 60,
+                      "LIKE_COUNT_TTL": 0, "LIKE_SHARDS": 10, "RECIPE_CACHE_TTL": 0})
+    client = app.test_client()
+    db = app.extensions["storage"].db
+    post_ids = [_create(client, title=f"R{i}") for i in range(5)]
+    summaries = db.collection("users").document("author").collection("recipe_summaries")
+    summary_before = summaries.document(post_ids[3]).get().to_dict()
+    for i, post_id in enumerate(post_ids):
+        for v in range(i):
+            client.post(f"/api/recipes/{post_id}/like", json={"userId": "author", "viewerId": f"v{v}"})
+    app.extensions["like_counter"].flush()
+    recipe_ref = db.collection("users").document("author").collection("created_recipes")
+    assert summaries.document(post_ids[3]).get().to_dict() == summary_before
+
+    before = db.rpc_count
+    resp = client.get("/api/recipes", query_string={"userId": "author", "view": "summary"})
+    recipes = resp.get_json()
+    assert db.rpc_count - before == 3  # list, like shards, isLiked
+    assert sorted(r["likes"] for r in recipes) == [0, 1, 2, 3, 4]
+
+    summaries.document(post_ids[2]).delete()
+    recipe = client.get(f"/api/recipes/{post_ids[2]}", query_string={"userId": "author"}).get_json()
+    assert recipe["likes"] == 2
+
+    assert client.delete(f"/api/recipes/{post_ids[4]}",
+                         query_string={"userId": "author"}).status_code == 200
+    for name in ("likes", "like_shards"):
+        assert recipe_ref.document(post_ids[4]).collection(name).get() == []
+    assert app.extensions["like_counter"].flush() == 0
+    assert not summaries.document(post_ids[4]).get().exists
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from backend.api.services.metrics import METRICS, Metrics, TimedFirestoreAPI
+
+
+def _samples(text):
+    """{series line without value: value} from Prometheus text output."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+def test_per_thread_aggregation():
+    """
+    Test Flow:
+      1. Record from several threads into one registry.
+      2. Expect collect()/render() to merge them, with cumulative buckets.
+    """
+    metrics = Metrics(buckets=(0.1, 1.0))
+    labels = (("route", "/x"),)
+
+    def work():
+        for _ in range(1000):
+            metrics.inc("http_requests_total", labels)
+        metrics.observe("http_request_duration_seconds", labels, 0.05)
+        metrics.observe("http_request_duration_seconds", labels, 5.0)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    samples = _samples(metrics.render())
+    assert samples['http_requests_total{route="/x"}'] == 4000
+    assert samples['http_request_duration_seconds_bucket{route="/x",le="0.1"}'] == 4
+    assert samples['http_request_duration_seconds_bucket{route="/x",le="1.0"}'] == 4
+    assert samples['http_request_duration_seconds_bucket{route="/x",le="+Inf"}'] == 8
+    assert samples['http_request_duration_seconds_count{route="/x"}'] == 8
+    assert samples['http_request_duration_seconds_sum{route="/x"}'] == pytest.approx(20.2)
+    assert "# TYPE http_request_duration_seconds histogram" in metrics.render()
+
+
+def test_exited_threads_are_retired():
+    """Shards of threads that exited are merged away; their counts remain"""
+    metrics = Metrics()
+    for _ in range(20):
+        t = threading.Thread(target=metrics.inc, args=("http_requests_total", ()))
+        t.start()
+        t.join()
+    assert len(metrics._shards) <= 1
+    assert metrics.collect()[0][("http_requests_total", ())] == 20
+    assert metrics._shards == []
+
+
+def test_metrics_endpoint(memory_app):
+    """
+    Test Flow:
+      1. Create and list recipes, and hit an unknown path.
+      2. GET /metrics; expect per-route status counts and latencies, and
+         Firestore RPCs timed by operation.
+    """
+    METRICS.reset()
+    client = memory_app.test_client()
+    client.post("/api/recipes", json={"userId": "m1", "title": "Toast"})
+    client.get("/api/recipes", query_string={"userId": "m1"}).get_data()
+    client.get("/api/nope")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain; version=0.0.4")
+    samples = _samples(resp.get_data(as_text=True))
+
+    route = 'blueprint="recipes",route="/api/recipes"'
+    assert samples[f'http_requests_total{{{route},method="POST",status="201"}}'] == 1
+    assert samples[f'http_requests_total{{{route},method="GET",status="200"}}'] == 1
+    assert samples[f'http_request_duration_seconds_count{{{route},method="GET"}}'] == 1
+    assert samples['http_requests_total{blueprint="",route="<unmatched>",method="GET",status="404"}'] == 1
+    assert samples['dependency_call_duration_seconds_count{dependency="firestore",operation="commit"}'] >= 1
+    assert samples['dependency_call_duration_seconds_count{dependency="firestore",operation="run_query"}'] >= 1
+
+
+def test_timed_firestore_api():
+    """Streaming RPCs are timed once read to the end; failures are counted"""
+    class FakeAPI:
+        def run_query(self, request=None):
+            return iter([1, 2, 3])
+
+        def commit(self, request=None):
+            raise RuntimeError("unavailable")
+
+    METRICS.reset()
+    api = TimedFirestoreAPI(FakeAPI())
+    stream = api.run_query(request={})
+    labels = (("dependency", "firestore"), ("operation", "run_query"))
+    assert ("dependency_call_duration_seconds", labels) not in METRICS.collect()[1]
+    assert list(stream) == [1, 2, 3]
+    assert sum(METRICS.collect()[1][("dependency_call_duration_seconds", labels)][:-1]) == 1
+
+    with pytest.raises(RuntimeError):
+        api.commit(request={})
+    errors = METRICS.collect()[0]
+    assert errors[("dependency_errors_total", (("dependency", "firestore"), ("operation", "commit")))] == 1
@@ -0,0 +1,80 @@
+import os
+import pstats
+
+from backend.api import create_app
+
+
+def _app(tmp_path, **config):
+    app = create_app({"STORAGE_BACKEND": "memory", "PROFILE_DIR": str(tmp_path), **config})
+    app.config["TESTING"] = True
+    return app
+
+
+def test_profile_header_needs_the_secret(tmp_path):
+    """
+    Test Flow:
+      1. Send X-Profile with the wrong secret, or a non-ASCII one; expect
+         no profile and no Server-Timing.
+      2. Send the right one; expect a collapsed-stack file that shows the
+         Firestore call, and a Server-Timing breakdown.
+    """
+    app = _app(tmp_path, PROFILE_SECRET="s3cret", STORAGE_LATENCY_MS=20)
+    client = app.test_client()
+
+    resp = client.post("/api/recipes", json={"userId": "p1", "title": "Soup"},
+                       headers={"X-Profile": "guess"})
+    assert resp.status_code == 201
+    assert "Server-Timing" not in resp.headers
+    assert os.listdir(tmp_path) == []
+    resp = client.post("/api/recipes", json={"userId": "p1", "title": "Soup"},
+                       headers={"X-Profile": "s\u00e9cret"})
+    assert resp.status_code == 201
+    assert os.listdir(tmp_path) == []
+
+    resp = client.post("/api/recipes", json={"userId": "p1", "title": "Stew"},
+                       headers={"X-Profile": "s3cret"})
+    assert resp.status_code == 201
+    timing = resp.headers["Server-Timing"]
+    assert [part.split(";")[0] for part in timing.split(", ")] == [
+        "firestore", "cloudinary", "serialization", "total"]
+    firestore_ms = float(timing.split(", ")[0].split("dur=")[1])
+    assert firestore_ms >= 20
+
+    name = resp.headers["X-Profile-File"]
+    assert name.endswith(".collapsed")
+    with open(tmp_path / name) as f:
+        stacks = f.read()
+    assert "create_recipe_in_firebase" in stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+
+
+def test_sampled_routes_write_pstats_and_rotate(tmp_path):
+    """
+    Test Flow:
+      1. Profile every update_recipe request as pstats, keeping 2 files.
+      2. Other routes aren't profiled; after 3 updates only 2 files remain
+         and they load with pstats.
+    """
+    app = _app(tmp_path, PROFILE_ROUTES="update_recipe", PROFILE_SAMPLE_RATE=1.0,
+               PROFILE_FORMAT="pstats", PROFILE_KEEP=2)
+    client = app.test_client()
+    post_id = client.post("/api/recipes", json={"userId": "p2", "title": "A"}).get_json()["postId"]
+    assert "X-Profile-File" not in client.get(f"/api/recipes/{post_id}",
+                                              query_string={"userId": "p2"}).headers
+
+    for title in ("B", "C", "D"):
+        resp = client.put(f"/api/recipes/{post_id}", json={"userId": "p2", "title": title})
+        assert resp.headers["X-Profile-File"].endswith(".prof")
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2
+    stats = pstats.Stats(str(tmp_path / files[0]))
+    assert any(func[2] == "update_recipe_in_firebase" for func in stats.stats)
+
+
+def test_server_timing_everywhere(tmp_path):
+    """SERVER_TIMING adds the header to unprofiled requests too"""
+    app = _app(tmp_path, SERVER_TIMING=True)
+    resp = app.test_client().get("/api/recipes", query_string={"userId": "p3", "limit": 5})
+    assert resp.headers["Server-Timing"].startswith("firestore;dur=")
+    assert os.listdir(tmp_path) == []
@@ -197,3 +197,230 @@ def test_delete_recipe_success(client):
     # Confirm that a GET for this recipe now returns a 404.
     get_resp = client.get(f"/api/recipes/{post_id}", query_string={"userId": user_id})
     assert get_resp.status_code == 404, get_resp.get_json()
+
+# Test: List Recipes (pagination and projection)
+
+def test_get_all_recipes_paginated(client):
+    """
+    Test Flow:
+      1. Register a new user and create five recipes.
+      2. Page through them two at a time using nextCursor.
+      3. Confirm every recipe is seen exactly once, newest first.
+    """
+    reg_payload = {
+        "username": unique_username("pageRecipes"),
+        "email": f"{uuid.uuid4().hex[:6]}@example.com",
+        "password": "secret123"
+    }
+    reg_resp = client.post("/api/register", json=reg_payload)
+    assert reg_resp.status_code == 201, reg_resp.get_json()
+    user_id = reg_resp.get_json()["user"]["userId"]
+
+    for i in range(5):
+        create_resp = client.post(
+            "/api/recipes", json={"userId": user_id, "title": f"Recipe {i}"})
+        assert create_resp.status_code == 201, create_resp.get_json()
+
+    titles = []
+    cursor = None
+    pages = 0
+    while True:
+        query = {"userId": user_id, "limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        resp = client.get("/api/recipes", query_string=query)
+        assert resp.status_code == 200, resp.get_json()
+        page = resp.get_json()
+        assert len(page["recipes"]) <= 2
+        titles.extend(r["title"] for r in page["recipes"])
+        pages += 1
+        cursor = page["nextCursor"]
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert titles == [f"Recipe {i}" for i in reversed(range(5))]
+
+
+def test_get_all_recipes_field_projection(client):
+    """
+    Test Flow:
+      1. Register a new user and create a recipe with long text fields.
+      2. List with fields=title and confirm only title and IDs come back.
+    """
+    reg_payload = {
+        "username": unique_username("projectRecipes"),
+        "email": f"{uuid.uuid4().hex[:6]}@example.com",
+        "password": "secret123"
+    }
+    reg_resp = client.post("/api/register", json=reg_payload)
+    assert reg_resp.status_code == 201, reg_resp.get_json()
+    user_id = reg_resp.get_json()["user"]["userId"]
+
+    client.post("/api/recipes", json={
+        "userId": user_id,
+        "title": "Projected",
+        "ingredients": "Lots of things",
+        "instructions": "Many steps",
+    })
+
+    resp = client.get("/api/recipes", query_string={"userId": user_id, "fields": "title"})
+    assert resp.status_code == 200, resp.get_json()
+    recipes = resp.get_json()
+    assert len(recipes) == 1
+    assert set(recipes[0]) == {"title", "postId", "id"}
+
+    bad = client.get("/api/recipes", query_string={"userId": user_id, "fields": "password_hash"})
+    assert bad.status_code == 400
+
+
+def test_get_all_recipes_invalid_cursor(client):
+    """A cursor we didn't issue should be rejected with 400"""
+    resp = client.get("/api/recipes", query_string={"userId": "someone", "cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Invalid cursor"
+
+# Test: Update/Delete round trips
+
+def test_update_and_delete_round_trips(memory_app):
+    """
+    Test Flow:
+      1. Create a recipe with an image on the in-memory backend.
+      2. A field-only PUT costs one read and one write.
+      3. A PUT that removes the image costs one read and one write and
+         destroys the image.
+      4. A DELETE costs one write, plus a listing of each likes
+         subcollection (empty here); deleting again is a 404.
+    """
+    client = memory_app.test_client()
+    backend = memory_app.extensions["storage"]
+    user_id = uuid.uuid4().hex
+    backend.db.collection("users").document(user_id).set({"username": user_id})
+
+    create_resp = client.post(
+        "/api/recipes",
+        data={"userId": user_id, "title": "Toast",
+              "images": (BytesIO(MINIMAL_PNG), "toast.png")},
+        content_type="multipart/form-data"
+    )
+    post_id = create_resp.get_json()["postId"]
+
+    before = backend.db.rpc_count
+    resp = client.put(f"/api/recipes/{post_id}", json={"userId": user_id, "title": "Jam Toast"})
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["recipe"]["title"] == "Jam Toast"
+    assert len(resp.get_json()["recipe"]["imageList"]) == 1
+    assert backend.db.rpc_count - before == 2
+
+    public_id = resp.get_json()["recipe"]["imageList"][0]["publicId"]
+    before = backend.db.rpc_count
+    resp = client.put(f"/api/recipes/{post_id}",
+                      json={"userId": user_id, "removePublicIds": public_id})
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["recipe"]["imageList"] == []
+    assert resp.get_json()["recipe"]["title"] == "Jam Toast"
+    assert backend.db.rpc_count - before == 2
+    assert public_id not in backend.images
+
+    before = backend.db.rpc_count
+    resp = client.delete(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    assert resp.status_code == 200
+    assert backend.db.rpc_count - before == 3
+
+    resp = client.delete(f"/api/recipes/{post_id}", query_string={"userId": user_id})
+    assert resp.status_code == 404
+    resp = client.put(f"/api/recipes/{post_id}", json={"userId": user_id, "title": "Gone"})
+    assert resp.status_code == 404
+
+
+def test_image_update_retries_on_concurrent_write(memory_app, monkeypatch):
+    """
+    A write that lands between the transaction's read and commit must not
+    be clobbered: the transaction retries and keeps both changes.
+    """
+    from backend.api.services.recipe_database import update_recipe_images_in_firebase
+
+    db = memory_app.extensions["storage"].db
+    user_id = uuid.uuid4().hex
+    doc_ref = db.collection("users").document(user_id).collection("created_recipes").document("p1")
+    doc_ref.set({"postId": "p1", "title": "Salad", "imageList": [{"url": "u1", "publicId": "a"}]})
+
+    original_get = doc_ref.__class__.get
+    interfered = []
+
+    def racing_get(self, *args, **kwargs):
+        snapshot = original_get(self, *args, **kwargs)
+        if kwargs.get("transaction") is not None and not interfered:
+            interfered.append(True)
+            # Another request appends an image right after our read
+            doc_ref.update({"imageList": [{"url": "u1", "publicId": "a"},
+                                          {"url": "u2", "publicId": "b"}]})
+        return snapshot
+
+    monkeypatch.setattr(doc_ref.__class__, "get", racing_get)
+    with memory_app.app_context():
+        recipe, removed = update_recipe_images_in_firebase(
+            user_id, "p1", {}, remove_ids=["a"],
+            new_images=[{"url": "u3", "publicId": "c"}])
+    monkeypatch.undo()
+
+    assert [img["publicId"] for img in removed] == ["a"]
+    assert [img["publicId"] for img in recipe["imageList"]] == ["b", "c"]
+    assert doc_ref.get().to_dict()["imageList"] == recipe["imageList"]
+
+# Test: Image pipeline
+
+def test_images_upload_concurrently():
+    """
+    With 50ms per upload and 4 workers, four images should take about one
+    round trip rather than four.
+    """
+    import time
+    from backend.api import create_app
+
+    app = create_app({"STORAGE_BACKEND": "memory", "STORAGE_LATENCY_MS": 50,
+                      "IMAGE_IO_CONCURRENCY": 4})
+    client = app.test_client()
+    user_id = uuid.uuid4().hex
+    app.extensions["storage"].db.collection("users").document(user_id).set({"username": user_id})
+
+    start = time.perf_counter()
+    resp = client.post(
+        "/api/recipes",
+        data={"userId": user_id, "title": "Gallery",
+              "images": [(BytesIO(MINIMAL_PNG), f"img{i}.png") for i in range(4)]},
+        content_type="multipart/form-data"
+    )
+    elapsed = time.perf_counter() - start
+
+    assert resp.status_code == 201, resp.get_json()
+    assert len(app.extensions["storage"].images) == 4
+    assert elapsed < 0.15
+
+
+def test_partial_upload_failure_cleans_up(memory_app, monkeypatch):
+    """
+    If one upload fails, the request fails with the per-file error and the
+    images that did upload are destroyed.
+    """
+    backend = memory_app.extensions["storage"]
+    original_upload = backend.upload_image
+
+    def flaky_upload(file_obj, public_id, folder, timeout=None):
+        if file_obj.filename == "bad.png":
+            raise RuntimeError("boom")
+        return original_upload(file_obj, public_id, folder, timeout=timeout)
+
+    monkeypatch.setattr(backend, "upload_image", flaky_upload)
+    client = memory_app.test_client()
+    resp = client.post(
+        "/api/recipes",
+        data={"userId": uuid.uuid4().hex, "title": "Broken",
+              "images": [(BytesIO(MINIMAL_PNG), "good.png"),
+                         (BytesIO(MINIMAL_PNG), "bad.png"),
+                         (BytesIO(MINIMAL_PNG), "good2.png")]},
+        content_type="multipart/form-data"
+    )
+    assert resp.status_code == 502
+    assert resp.get_json()["failures"] == [{"filename": "bad.png", "error": "boom"}]
+    assert backend.images == {}
@@ -0,0 +1,133 @@
+import os
+import threading
+
+import pytest
+
+from backend.api import create_app
+
+np = pytest.importorskip("numpy")
+
+from backend.api.services.recommendations import RecipeVectors, top_k  # noqa: E402
+
+
+def _seed(db):
+    recipes = {
+        ("chef", "curry"): {"title": "Chickpea Curry", "ingredients": "chickpeas, curry paste, coconut milk"},
+        ("chef", "dal"): {"title": "Red Lentil Dal", "ingredients": "lentils, curry powder, coconut milk"},
+        ("baker", "cake"): {"title": "Chocolate Cake", "ingredients": "flour, sugar, cocoa, eggs"},
+        ("fan", "mine"): {"title": "Green Curry", "ingredients": "curry paste, coconut milk"},
+    }
+    for (user_id, post_id), recipe in recipes.items():
+        db.collection("users").document(user_id).collection("created_recipes") \
+            .document(post_id).set(dict(recipe, postId=post_id))
+
+
+def _get_when_ready(client, app, url):
+    """The first request starts the background build; wait for it and retry."""
+    resp = client.get(url)
+    if resp.status_code == 503:
+        assert app.extensions["recommender"].wait_refreshed(timeout=5)
+        resp = client.get(url)
+    return resp
+
+
+def test_top_k_matches_full_sort():
+    """argpartition top-k agrees with a full sort, for one row or a batch"""
+    scores = np.random.default_rng(0).random((3, 50)).astype(np.float32)
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    assert (top_k(scores, 5) == expected).all()
+    assert (top_k(scores[0], 5) == expected[0]).all()
+
+
+def test_recommendations_follow_preferences_and_saves(memory_app):
+    """
+    Test Flow:
+      1. Seed recipes and a user who likes curry and saved the curry.
+      2. Expect the dal (similar, not saved, not theirs) ranked first, and
+         neither the saved recipe nor the user's own recipe returned.
+    """
+    db = memory_app.extensions["storage"].db
+    _seed(db)
+    db.collection("users").document("fan").set({
+        "username": "fan", "preferences": ["curry", "coconut"], "saved_recipes": ["curry"]})
+
+    client = memory_app.test_client()
+    resp = _get_when_ready(client, memory_app, "/api/users/fan/recommendations")
+    assert resp.status_code == 200, resp.get_json()
+    results = resp.get_json()["results"]
+    assert results[0]["postId"] == "dal"
+    assert {r["postId"] for r in results} <= {"dal", "cake"}
+
+    assert client.get("/api/users/ghost/recommendations").status_code == 404
+
+
+def test_model_file_round_trip(memory_app, tmp_path):
+    """Vectors saved by the offline job load back identically and are picked up"""
+    db = memory_app.extensions["storage"].db
+    _seed(db)
+    path = str(tmp_path / "recommend.npz")
+    built = RecipeVectors.build(db)
+    built.save(path)
+
+    loaded = RecipeVectors.load(path)
+    assert loaded.keys == built.keys
+    assert loaded.vocabulary == built.vocabulary
+    assert np.array_equal(loaded.matrix, built.matrix)
+    assert loaded.recommend(["lentil"], []) == built.recommend(["lentil"], [])
+
+    app = create_app({"STORAGE_BACKEND": "memory", "RECOMMEND_MODEL_PATH": path})
+    app.extensions["storage"].db.collection("users").document("u").set({"preferences": ["lentils"]})
+    resp = _get_when_ready(app.test_client(), app, "/api/users/u/recommendations")
+    assert resp.get_json()["results"][0]["postId"] == "dal"
+
+
+def test_vectors_refresh_and_survive_a_bad_model(tmp_path, monkeypatch):
+    """
+    Test Flow:
+      1. While the background build is held up, requests are a 503 rather
+         than waiting on it; once it is in, recommendations are served.
+      2. Without a model file, a recipe created later is recommended after
+         the next refresh.
+      3. With a model file, a corrupt replacement is logged and skipped; the
+         last good vectors keep answering.
+    """
+    app = create_app({"STORAGE_BACKEND": "memory", "RECOMMEND_RELOAD_INTERVAL": 3600})
+    db = app.extensions["storage"].db
+    _seed(db)
+    db.collection("users").document("u").set({"preferences": ["lentils"]})
+    recommender = app.extensions["recommender"]
+    client = app.test_client()
+    release = threading.Event()
+    build = RecipeVectors.build
+
+    def held_build(db):
+        release.wait(5)
+        return build(db)
+
+    monkeypatch.setattr(RecipeVectors, "build", staticmethod(held_build))
+    assert client.get("/api/users/u/recommendations").status_code == 503
+    release.set()
+    assert recommender.wait_refreshed(timeout=5)
+    assert client.get("/api/users/u/recommendations").get_json()["results"][0]["postId"] == "dal"
+
+    db.collection("users").document("chef").collection("created_recipes") \
+        .document("soup").set({"title": "Lentil Soup", "ingredients": "lentils, lentils, stock"})
+    recommender.refresh(db)
+    results = client.get("/api/users/u/recommendations").get_json()["results"]
+    assert results[0]["postId"] == "soup"
+
+    path = tmp_path / "recommend.npz"
+    RecipeVectors.build(db).save(str(path))
+    app = create_app({"STORAGE_BACKEND": "memory", "RECOMMEND_MODEL_PATH": str(path),
+                      "RECOMMEND_RELOAD_INTERVAL": 3600})
+    app.extensions["storage"].db.collection("users").document("u").set({"preferences": ["lentils"]})
+    recommender = app.extensions["recommender"]
+    client = app.test_client()
+    resp = _get_when_ready(client, app, "/api/users/u/recommendations")
+    assert resp.get_json()["results"][0]["postId"] == "soup"
+    path.write_bytes(b"not a model")
+    os.utime(path, (path.stat().st_mtime + 10,) * 2)
+    recommender.refresh(app.extensions["storage"].db)
+    resp = client.get("/api/users/u/recommendations")
+    assert resp.status_code == 200
+    assert resp.get_json()["results"][0]["postId"] == "soup"
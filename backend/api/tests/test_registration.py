@@ -1,6 +1,7 @@
 import pytest
 from werkzeug.security import check_password_hash
 
+
 def test_registration_success_minimal(client):
     """Test registration with only required fields"""
     payload = {
@@ -20,6 +21,7 @@ def test_registration_success_minimal(client):
     assert data["user"]["friend_list"] == []
     assert data["user"]["created_recipes"] == []
 
+
 def test_registration_success_full(client):
     """Test registration with all optional fields"""
     payload = {
@@ -40,6 +42,7 @@ def test_registration_success_full(client):
     assert user["friend_list"] == []
     assert user["created_recipes"] == []
 
+
 def test_registration_missing_required_fields(client):
     """Test all combinations of missing required fields"""
     required_fields = ["username", "email", "password"]
@@ -58,6 +61,7 @@ def test_registration_missing_required_fields(client):
         assert "error" in data
         assert "missing required fields" in data["error"].lower()
 
+
 def test_registration_invalid_email(client):
     """Test registration with invalid email format"""
     payload = {
@@ -69,6 +73,7 @@ def test_registration_invalid_email(client):
     assert response.status_code == 400
     assert "invalid email format" in response.get_json()["error"].lower()
 
+
 def test_registration_duplicate_email(client):
     """Test registration with duplicate email"""
     payload = {
@@ -86,6 +91,7 @@ def test_registration_duplicate_email(client):
     assert response2.status_code == 409
     assert "email already exists" in response2.get_json()["error"].lower()
 
+
 def test_registration_invalid_preferences(client):
     """Test registration with invalid preferences format"""
     payload = {
@@ -98,6 +104,7 @@ def test_registration_invalid_preferences(client):
     assert response.status_code == 400
     assert "invalid preferences format" in response.get_json()["error"].lower()
 
+
 def test_password_hashing(client):
     """Test that password is properly hashed"""
     payload = {
@@ -113,14 +120,137 @@ def test_password_hashing(client):
     assert data["user"]["password_hash"] != payload["password"]
     assert check_password_hash(data["user"]["password_hash"], payload["password"])
 
+
 def test_registration_empty_payload(client):
     """Test registration with empty payload"""
     response = client.post("/api/register", json={})
     assert response.status_code == 400
     assert "no data provided" in response.get_json()["error"].lower()
 
+
 def test_registration_invalid_json(client):
     """Test registration with invalid JSON"""
     response = client.post("/api/register", data="invalid json")
     assert response.status_code == 400
-    assert "invalid json" in response.get_json()["error"].lower()
\ No newline at end of file
+    assert "invalid json" in response.get_json()["error"].lower()
+
+
+def test_registration_duplicate_username_normalized(client):
+    """Usernames are unique regardless of case or surrounding spaces"""
+    payload = {
+        "username": "CaseUser",
+        "email": "caseuser@example.com",
+        "password": "testpass"
+    }
+    assert client.post("/api/register", json=payload).status_code == 201
+
+    payload = {
+        "username": " caseuser ",
+        "email": "other-caseuser@example.com",
+        "password": "testpass"
+    }
+    response = client.post("/api/register", json=payload)
+    assert response.status_code == 409
+    assert response.get_json()["error"] == "User already exists"
+
+
+def test_registration_single_read_and_commit(memory_app):
+    """
+    With LEGACY_USER_LOOKUP off, registering costs a reservation read
+    before hashing, then one batched read and one commit
+    """
+    memory_app.config["LEGACY_USER_LOOKUP"] = False
+    client = memory_app.test_client()
+    db = memory_app.extensions["storage"].db
+    payload = {
+        "username": "roundtrip",
+        "email": "RoundTrip@Example.com",
+        "password": "testpass"
+    }
+    before = db.rpc_count
+    response = client.post("/api/register", json=payload)
+    assert response.status_code == 201
+    assert db.rpc_count - before == 3
+
+    user_id = response.get_json()["userId"]
+    assert db.collection("usernames").document("roundtrip").get().get("userId") == user_id
+    assert db.collection("emails").document("roundtrip@example.com").get().get("userId") == user_id
+
+
+def test_legacy_user_without_reservations(memory_app):
+    """
+    Users created before reservation docs can still log in, and the
+    backfill command reserves their username and email.
+    """
+    from werkzeug.security import generate_password_hash
+
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("legacy1").set({
+        "userId": "legacy1",
+        "username": "legacy",
+        "email": "legacy@example.com",
+        "password_hash": generate_password_hash("legacypass"),
+    })
+    client = memory_app.test_client()
+    resp = client.post("/api/login", json={"username": "legacy", "password": "legacypass"})
+    assert resp.status_code == 200
+
+    result = memory_app.test_cli_runner().invoke(args=["backfill-reservations"])
+    assert "Wrote 2 reservation docs" in result.output
+
+    payload = {"username": "newname", "email": "legacy@example.com", "password": "x"}
+    response = client.post("/api/register", json=payload)
+    assert response.status_code == 409
+    assert response.get_json()["error"] == "Email already exists"
+
+
+def test_legacy_user_cannot_be_registered_again(memory_app, monkeypatch):
+    """
+    Test Flow:
+      1. Store a user from before reservation docs, with none of its own.
+      2. Registering its username, or its email, again is a 409.
+      3. Neither duplicate cost a password hash.
+      4. The create transaction on its own turns the name away too.
+    """
+    from backend.api.services.database_interface import UserExists, add_user_to_firebase
+
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("legacy3").set({
+        "userId": "legacy3", "username": "veteran", "email": "vet@example.com"})
+    hasher = memory_app.extensions["password_hasher"]
+
+    def no_hashing(password):
+        raise AssertionError("hashed the password of a duplicate")
+
+    monkeypatch.setattr(hasher, "hash_password", no_hashing)
+    client = memory_app.test_client()
+    resp = client.post("/api/register", json={
+        "username": "veteran", "email": "new@example.com", "password": "x"})
+    assert resp.status_code == 409
+    assert resp.get_json()["error"] == "User already exists"
+    resp = client.post("/api/register", json={
+        "username": "rookie", "email": "vet@example.com", "password": "x"})
+    assert resp.status_code == 409
+    assert resp.get_json()["error"] == "Email already exists"
+
+    with memory_app.app_context(), pytest.raises(UserExists):
+        add_user_to_firebase({"username": "veteran", "email": "other@example.com"})
+
+
+def test_legacy_lookup_can_be_switched_off(memory_app):
+    """
+    With LEGACY_USER_LOOKUP off, an unknown username costs one reservation
+    read and no field query, and un-backfilled users are no longer found.
+    """
+    db = memory_app.extensions["storage"].db
+    db.collection("users").document("legacy2").set({
+        "userId": "legacy2", "username": "oldtimer", "email": "old@example.com"})
+    memory_app.config["LEGACY_USER_LOOKUP"] = False
+    client = memory_app.test_client()
+
+    before = db.rpc_count
+    resp = client.post("/api/login", json={"username": "nobody", "password": "x"})
+    assert resp.status_code == 401
+    assert db.rpc_count - before == 1
+    resp = client.post("/api/login", json={"username": "oldtimer", "password": "x"})
+    assert resp.status_code == 401
@@ -0,0 +1,108 @@
+from datetime import datetime
+
+from backend.api import create_app
+from backend.api.services.search import SearchIndex, tokenize
+
+
+def test_tokenize_stems_and_drops_stop_words():
+    """Plurals and verb forms should meet on the same term"""
+    assert tokenize("The Tomatoes, chopped") == tokenize("tomato chop")
+
+
+def test_search_follows_create_update_delete(memory_app):
+    """
+    Test Flow:
+      1. Create three recipes; search ranks the title match first.
+      2. Update one so it no longer mentions the term; it drops out.
+      3. Delete another; it drops out too.
+    """
+    client = memory_app.test_client()
+    ids = {}
+    for title, ingredients in [
+        ("Garlic Bread", "bread, garlic, butter"),
+        ("Pasta Aglio e Olio", "spaghetti, garlic cloves, olive oil"),
+        ("Pancakes", "flour, eggs, milk"),
+    ]:
+        resp = client.post("/api/recipes", json={
+            "userId": "cook", "title": title, "ingredients": ingredients})
+        ids[title] = resp.get_json()["postId"]
+
+    results = client.get("/api/recipes/search", query_string={"q": "garlic"}).get_json()["results"]
+    assert [r["title"] for r in results] == ["Garlic Bread", "Pasta Aglio e Olio"]
+    assert results[0]["userId"] == "cook"
+
+    client.put(f"/api/recipes/{ids['Pasta Aglio e Olio']}", json={
+        "userId": "cook", "ingredients": "spaghetti, chili, olive oil"})
+    client.delete(f"/api/recipes/{ids['Garlic Bread']}", query_string={"userId": "cook"})
+
+    resp = client.get("/api/recipes/search", query_string={"q": "garlic"})
+    assert resp.status_code == 200
+    assert resp.get_json()["results"] == []
+    assert client.get("/api/recipes/search").status_code == 400
+
+
+def test_snapshot_restore_round_trip(tmp_path):
+    """A restored index answers the same as the one that wrote the snapshot"""
+    path = str(tmp_path / "search.json.gz")
+    app = create_app({"STORAGE_BACKEND": "memory", "SEARCH_INDEX_PATH": path})
+    client = app.test_client()
+    client.get("/api/recipes/search", query_string={"q": "soup"})  # first build
+    client.post("/api/recipes", json={"userId": "u1", "title": "Tomato Soup"})
+    client.post("/api/recipes", json={"userId": "u2", "title": "Tomato Salad"})
+    index = app.extensions["search_index"]
+    index.snapshot(path)
+
+    restored = SearchIndex()
+    assert restored.restore(path)
+    assert restored.search("tomatoes") == index.search("tomatoes")
+    assert [r["title"] for r in restored.search("tomato", user_id="u2")] == ["Tomato Salad"]
+    assert not SearchIndex().restore(str(tmp_path / "missing.json.gz"))
+
+
+def test_restored_snapshot_catches_up(tmp_path):
+    """
+    Test Flow:
+      1. build-search-index writes a snapshot; nothing else writes one.
+      2. A worker restoring it sees, on its first search, recipes created
+         and updated after the snapshot (writes its own hooks never saw).
+    """
+    path = str(tmp_path / "search.json.gz")
+    app = create_app({"STORAGE_BACKEND": "memory", "SEARCH_INDEX_PATH": path})
+    client = app.test_client()
+    client.post("/api/recipes", json={"userId": "u1", "title": "Tomato Soup"})
+    old_id = client.post("/api/recipes", json={"userId": "u1", "title": "Plain Rice"}) \
+        .get_json()["postId"]
+    result = app.test_cli_runner().invoke(args=["build-search-index"])
+    assert "Indexed 2 recipes" in result.output
+
+    restored = SearchIndex()
+    assert restored.restore(path) and restored.behind
+    client.post("/api/recipes", json={"userId": "u2", "title": "Tomato Salad"})
+    client.put(f"/api/recipes/{old_id}", json={"userId": "u1", "title": "Tomato Rice"})
+
+    restored.ensure_loaded(app.extensions["storage"].db)
+    assert not restored.behind
+    assert sorted(r["title"] for r in restored.search("tomato")) == [
+        "Tomato Rice", "Tomato Salad", "Tomato Soup"]
+
+
+def test_other_workers_writes_show_up_after_the_refresh_interval(memory_app):
+    """
+    Test Flow:
+      1. Build the index, then store a recipe straight in Firestore, as
+         another worker would (this index's hooks never see it).
+      2. Within SEARCH_REFRESH_INTERVAL searches don't find it.
+      3. Once the interval has passed, the next search catches up and does.
+    """
+    db = memory_app.extensions["storage"].db
+    index = SearchIndex(refresh_interval=60)
+    index.ensure_loaded(db)
+    db.collection("users").document("w2").collection("created_recipes").document("p1").set(
+        {"title": "Lentil Curry", "dateUpdated": datetime.utcnow().isoformat()})
+
+    index.ensure_loaded(db)
+    assert index.search("lentil") == []
+
+    index._refreshed_at -= 60
+    index.ensure_loaded(db)
+    assert [r["postId"] for r in index.search("lentil")] == ["p1"]
@@ -0,0 +1,129 @@
+import time
+import pytest
+
+from backend.api import create_app
+from backend.api.services.storage import MemoryBackend
+
+
+def test_memory_backend_selected_by_config():
+    """create_app() should attach the backend named in STORAGE_BACKEND"""
+    app = create_app({"STORAGE_BACKEND": "memory"})
+    assert isinstance(app.extensions["storage"], MemoryBackend)
+
+
+def test_unknown_backend_rejected():
+    """An unknown STORAGE_BACKEND fails at startup, not on first request"""
+    with pytest.raises(ValueError):
+        create_app({"STORAGE_BACKEND": "nosuchstore"})
+
+
+def test_memory_backend_injects_latency():
+    """Each simulated round trip should cost STORAGE_LATENCY_MS"""
+    app = create_app({"STORAGE_BACKEND": "memory", "STORAGE_LATENCY_MS": 20})
+    client = app.test_client()
+
+    start = time.perf_counter()
+    resp = client.get("/api/recipes", query_string={"userId": "nobody"})
+    elapsed = time.perf_counter() - start
+
+    assert resp.status_code == 200
+    assert resp.get_json() == []
+    assert elapsed >= 0.04
+    # One read for the recipes version (the ETag), one for the list
+    assert app.extensions["storage"].db.rpc_count == 2
+
+
+def test_memory_firestore_round_trip():
+    """The stand-in should behave like Firestore for basic reads and writes"""
+    db = MemoryBackend().client()
+    users = db.collection("users")
+    users.document("u1").set({"username": "alice", "email": "a@example.com"})
+    users.document("u2").set({"username": "bob", "email": "b@example.com"})
+
+    matches = list(users.where("username", "==", "bob").limit(1).stream())
+    assert [doc.id for doc in matches] == ["u2"]
+
+    users.document("u1").update({"email": "alice@example.com"})
+    assert users.document("u1").get().to_dict()["email"] == "alice@example.com"
+
+    users.document("u1").delete()
+    assert not users.document("u1").get().exists
+
+
+def test_ready_endpoint(memory_app):
+    """The memory backend has nothing to warm up, so it's ready at once"""
+    resp = memory_app.test_client().get("/api/ready")
+    assert resp.status_code == 200
+    assert resp.get_json()["status"] == "ready"
+
+
+def test_readiness_waits_for_warm_up():
+    """Readiness reports warming until warm_up() returns, failed if it raises"""
+    import threading
+    from backend.api.services.lifecycle import Readiness
+
+    release = threading.Event()
+
+    class SlowBackend:
+        def warm_up(self):
+            release.wait(5)
+
+    readiness = Readiness(SlowBackend())
+    assert readiness.status()["status"] == "warming"
+    release.set()
+    for _ in range(100):
+        if readiness.status()["status"] == "ready":
+            break
+        time.sleep(0.01)
+    assert readiness.status()["status"] == "ready"
+
+    class BrokenBackend:
+        def warm_up(self):
+            raise RuntimeError("no credentials")
+
+    readiness = Readiness(BrokenBackend())
+    for _ in range(100):
+        if readiness.status()["status"] != "warming":
+            break
+        time.sleep(0.01)
+    assert readiness.status() == {"status": "failed", "error": "no credentials"}
+
+
+def test_readiness_retries_failed_warm_up():
+    """A failed warm-up is retried with backoff until the backend recovers"""
+    from backend.api.services.lifecycle import Readiness
+
+    class FlakyBackend:
+        calls = 0
+
+        def warm_up(self):
+            self.calls += 1
+            if self.calls < 3:
+                raise RuntimeError("unavailable")
+
+    backend = FlakyBackend()
+    readiness = Readiness(backend, retry_delay=0.01)
+    for _ in range(200):
+        if readiness.status()["status"] == "ready":
+            break
+        time.sleep(0.01)
+    assert readiness.status()["status"] == "ready"
+    assert "error" not in readiness.status()
+    assert backend.calls == 3
+
+
+def test_sdks_not_imported_at_start_up():
+    """Importing the app and create_app() must not pull in the heavy SDKs"""
+    import subprocess
+    import sys
+
+    code = (
+        "import sys\n"
+        "from backend.api import create_app\n"
+        "create_app({'STORAGE_BACKEND': 'memory'})\n"
+        "heavy = ('firebase_admin', 'google.cloud.firestore', 'cloudinary')\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, check=True)
+    assert result.stdout.strip() == ""
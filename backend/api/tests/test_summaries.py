@@ -0,0 +1,109 @@
+from io import BytesIO
+
+
+def _summary_doc(memory_app, user_id, post_id):
+    db = memory_app.extensions["storage"].db
+    doc = db.collection("users").document(user_id).collection("recipe_summaries") \
+        .document(post_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def test_summaries_follow_recipe_writes(memory_app):
+    """
+    Test Flow:
+      1. Create a recipe with long instructions and an image; the summary
+         list has just the summary fields and the likes, and is a small
+         fraction of the full list's bytes.
+      2. Change the title and drop the image: the summary follows. A
+         description-only update leaves the summary as it was.
+      3. Delete the recipe; its summary goes with it.
+    """
+    client = memory_app.test_client()
+    memory_app.extensions["storage"].db.collection("users").document("s1").set({"username": "s1"})
+    resp = client.post("/api/recipes", data={
+        "userId": "s1", "title": "Soup", "cookingTime": "30", "difficulty": "easy",
+        "ingredients": "water, " * 500, "instructions": "Stir. " * 1000,
+        "images": [(BytesIO(b"img"), "soup.png")],
+    })
+    assert resp.status_code == 201
+    post_id = resp.get_json()["postId"]
+
+    full = client.get("/api/recipes", query_string={"userId": "s1"})
+    summary = client.get("/api/recipes", query_string={"userId": "s1", "view": "summary"})
+    [recipe] = summary.get_json()
+    assert set(recipe) == {"postId", "title", "cookingTime", "difficulty", "datePosted",
+                           "coverImage", "id", "likes", "isLiked"}
+    assert recipe["coverImage"].startswith("memory://")
+    assert len(summary.get_data()) * 20 < len(full.get_data())
+    full.close()
+    summary.close()
+
+    image_id = client.get(f"/api/recipes/{post_id}", query_string={"userId": "s1"}) \
+        .get_json()["imageList"][0]["publicId"]
+    resp = client.put(f"/api/recipes/{post_id}", data={
+        "userId": "s1", "title": "Stew", "removePublicIds": image_id})
+    assert resp.status_code == 200
+    assert _summary_doc(memory_app, "s1", post_id)["title"] == "Stew"
+    assert _summary_doc(memory_app, "s1", post_id)["coverImage"] is None
+
+    db = memory_app.extensions["storage"].db
+    before = db.collection("users").document("s1").collection("recipe_summaries") \
+        .document(post_id).get().update_time
+    client.put(f"/api/recipes/{post_id}", json={"userId": "s1", "description": "Hearty"})
+    after = db.collection("users").document("s1").collection("recipe_summaries") \
+        .document(post_id).get().update_time
+    assert before == after
+
+    resp = client.get("/api/recipes", query_string={"userId": "s1", "view": "summary",
+                                                    "limit": 5})
+    assert [r["title"] for r in resp.get_json()["recipes"]] == ["Stew"]
+    full_page = client.get("/api/recipes", query_string={"userId": "s1", "limit": 5})
+    assert resp.headers["ETag"] != full_page.headers["ETag"]
+
+    assert client.delete(f"/api/recipes/{post_id}",
+                         query_string={"userId": "s1"}).status_code == 200
+    assert _summary_doc(memory_app, "s1", post_id) is None
+    resp = client.get("/api/recipes", query_string={"userId": "s1", "view": "summary"})
+    assert resp.get_json() == []
+
+
+def test_feed_summaries_and_backfill(memory_app):
+    """
+    Test Flow:
+      1. Recipes written before summaries existed are missing from the
+         summary feed until `flask backfill-summaries` runs.
+      2. The summary feed pages like the full one, each recipe tagged
+         with its author; bad view values are a 400.
+    """
+    db = memory_app.extensions["storage"].db
+    for i in range(3):
+        db.collection("users").document(f"user{i}").collection("created_recipes") \
+            .document(f"old{i}").set({"postId": f"old{i}", "title": f"Old {i}",
+                                      "instructions": "Mix.",
+                                      "datePosted": f"2024-01-0{i + 1}T00:00:00"})
+    client = memory_app.test_client()
+    client.post("/api/recipes", json={"userId": "user0", "title": "New"})
+    memory_app.config["FEED_CACHE_TTL"] = 0
+
+    resp = client.get("/api/feed", query_string={"view": "summary"})
+    assert [r["title"] for r in resp.get_json()["recipes"]] == ["New"]
+
+    result = memory_app.test_cli_runner().invoke(args=["backfill-summaries"])
+    assert "Wrote 4 recipe summaries" in result.output
+
+    seen, cursor = [], None
+    while True:
+        params = {"view": "summary", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/feed", query_string=params).get_json()
+        for recipe in body["recipes"]:
+            assert "instructions" not in recipe
+            seen.append((recipe["title"], recipe["userId"]))
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+    assert seen == [("New", "user0"), ("Old 2", "user2"), ("Old 1", "user1"), ("Old 0", "user0")]
+
+    assert client.get("/api/feed", query_string={"view": "tiny"}).status_code == 400
+    resp = client.get("/api/recipes", query_string={"userId": "user0", "view": "summary",
+                                                    "fields": "title"})
+    assert resp.status_code == 400
@@ -0,0 +1,357 @@
+"""
+Load test: throughput and tail latency per route under a mixed workload.
+
+Each virtual user registers, logs in, then runs a seeded random mix of
+recipe calls (list, get, create, create with an image, update, delete)
+against a fresh create_app() on the memory backend, so Firestore and
+Cloudinary are local stand-ins with STORAGE_LATENCY_MS of simulated round
+trip. Two drivers:
+  - client: Flask's test client, in process (no sockets)
+  - server: a threaded local HTTP server, keep-alive connections
+Reports requests/sec and p50/p95/p99 per route. The same --seed, --users
+and --ops replay the same requests.
+
+Before a deploy, compare against a baseline saved on the same machine:
+    python -m benchmarks.api_load --driver server --save-baseline baseline.json
+    python -m benchmarks.api_load --driver server --baseline baseline.json --threshold 0.2
+The second run exits 1 if any route's p95 or p99 grew, or overall
+requests/sec fell, by more than the threshold.
+
+Run from the backend directory:
+    python -m benchmarks.api_load --users 8 --ops 50
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from api import create_app
+
+# (operation, weight) for the recipe phase of each virtual user.
+MIX = (
+    ("list", 30),
+    ("get", 30),
+    ("create", 10),
+    ("create_with_image", 5),
+    ("update", 15),
+    ("delete", 10),
+)
+ROUTES = ("register", "login") + tuple(op for op, _ in MIX)
+PASSWORD = "load-test-password"
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(int(round(p / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                     f'\r\n\r\n{value}\r\n'.encode("utf-8"))
+    for name, (data, filename) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: image/png\r\n\r\n'.encode("utf-8"))
+        parts.append(data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class ClientDriver:
+    """Requests through the Flask test client, one client per thread."""
+
+    name = "client"
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, query=None, payload=None, form=None, files=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        kwargs = {"query_string": query}
+        if payload is not None:
+            kwargs["json"] = payload
+        elif form is not None:
+            data = dict(form)
+            for name, (content, filename) in (files or {}).items():
+                data[name] = (io.BytesIO(content), filename)
+            kwargs.update(data=data, content_type="multipart/form-data")
+        resp = client.open(path, method=method, **kwargs)
+        body = resp.get_data()
+        resp.close()
+        return resp.status_code, body
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ServerDriver:
+    """Requests over HTTP to a threaded local server, one connection per thread."""
+
+    name = "server"
+
+    def __init__(self, app):
+        self.server = make_server("127.0.0.1", 0, app, threaded=True,
+                                  request_handler=_QuietHandler)
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+
+    def request(self, method, path, query=None, payload=None, form=None, files=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = HTTPConnection("127.0.0.1", self.port)
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        headers = {}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body, headers["Content-Type"] = _multipart(form, files or {})
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+
+    def close(self):
+        self.server.shutdown()
+
+
+DRIVERS = {ClientDriver.name: ClientDriver, ServerDriver.name: ServerDriver}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def timed(self, route, expected, call):
+        start = time.perf_counter()
+        status, body = call()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if status != expected:
+                self.errors[route] += 1
+        return status, body
+
+
+class VirtualUser:
+    def __init__(self, driver, recorder, index, seed, image_bytes):
+        self.driver = driver
+        self.recorder = recorder
+        self.rng = random.Random(f"{seed}-{index}")
+        self.username = f"load{seed}u{index}"
+        self.image = self.rng.randbytes(image_bytes)
+        self.user_id = None
+        self.post_ids = []
+
+    def _json(self, body):
+        return json.loads(body) if body else {}
+
+    def sign_up(self):
+        self.recorder.timed("register", 201, lambda: self.driver.request(
+            "POST", "/api/register", payload={
+                "username": self.username, "email": f"{self.username}@example.com",
+                "password": PASSWORD, "country": "CA", "preferences": ["pasta"]}))
+        status, body = self.recorder.timed("login", 200, lambda: self.driver.request(
+            "POST", "/api/login", payload={"username": self.username, "password": PASSWORD}))
+        if status != 200:
+            raise RuntimeError(f"login failed for {self.username}: {status} {body[:200]!r}")
+        self.user_id = self._json(body)["userId"]
+
+    def _recipe_fields(self):
+        words = self.rng.choices(("tomato", "basil", "garlic", "onion", "rice", "lemon"), k=6)
+        return {
+            "userId": self.user_id,
+            "title": " ".join(words[:3]).title(),
+            "description": " ".join(words) * 3,
+            "cookingTime": str(self.rng.randrange(10, 90)),
+            "difficulty": self.rng.choice(("Easy", "Medium", "Hard")),
+            "servings": str(self.rng.randrange(1, 8)),
+            "ingredients": ", ".join(words),
+            "instructions": "Mix and cook. " * 20,
+        }
+
+    def step(self):
+        ops, weights = zip(*MIX)
+        op = self.rng.choices(ops, weights)[0]
+        if op in ("get", "update", "delete") and not self.post_ids:
+            op = "create"
+        request = self.driver.request
+        user = {"userId": self.user_id}
+
+        if op == "list":
+            self.recorder.timed(op, 200, lambda: request("GET", "/api/recipes", query=user))
+        elif op == "get":
+            post_id = self.rng.choice(self.post_ids)
+            self.recorder.timed(op, 200, lambda: request("GET", f"/api/recipes/{post_id}", query=user))
+        elif op == "create":
+            status, body = self.recorder.timed(op, 201, lambda: request(
+                "POST", "/api/recipes", payload=self._recipe_fields()))
+            if status == 201:
+                self.post_ids.append(self._json(body)["postId"])
+        elif op == "create_with_image":
+            status, body = self.recorder.timed(op, 201, lambda: request(
+                "POST", "/api/recipes", form=self._recipe_fields(),
+                files={"images": (self.image, "dish.png")}))
+            if status == 201:
+                self.post_ids.append(self._json(body)["postId"])
+        elif op == "update":
+            post_id = self.rng.choice(self.post_ids)
+            self.recorder.timed(op, 200, lambda: request(
+                "PUT", f"/api/recipes/{post_id}", payload={**user, "title": self.rng.choice("ABCDEF")}))
+        elif op == "delete":
+            post_id = self.post_ids.pop(self.rng.randrange(len(self.post_ids)))
+            self.recorder.timed(op, 200, lambda: request(
+                "DELETE", f"/api/recipes/{post_id}", query=user))
+
+
+def run(driver_name, users, ops, warmup, seed, latency_ms, image_kb):
+    app = create_app({"STORAGE_BACKEND": "memory", "STORAGE_LATENCY_MS": latency_ms,
+                      "STORAGE_WARMUP": False})
+    driver = DRIVERS[driver_name](app)
+    recorder = Recorder()
+    vusers = [VirtualUser(driver, recorder, i, seed, image_kb * 1024) for i in range(users)]
+    # Every user is signed up and warm before the measured phase starts.
+    barrier = threading.Barrier(users + 1)
+
+    def work(vuser):
+        try:
+            vuser.sign_up()
+            vuser.recorder = Recorder()  # warm-up calls go nowhere
+            for _ in range(warmup):
+                vuser.step()
+            vuser.recorder = recorder
+        except BaseException:
+            barrier.abort()
+            raise
+        barrier.wait()
+        for _ in range(ops):
+            vuser.step()
+
+    threads = [threading.Thread(target=work, args=(v,)) for v in vusers]
+    try:
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        seconds = time.perf_counter() - start
+    finally:
+        driver.close()
+        app.extensions["password_hasher"].shutdown()
+    return summarize(recorder, seconds, users * ops)
+
+
+def summarize(recorder, seconds, measured):
+    routes = {}
+    for route in ROUTES:
+        ordered = sorted(recorder.latencies[route])
+        if not ordered:
+            continue
+        routes[route] = {
+            "count": len(ordered),
+            "errors": recorder.errors[route],
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+    return {"routes": routes,
+            "total": {"requests": measured, "seconds": round(seconds, 3),
+                      "rps": round(measured / seconds, 1) if seconds else 0.0}}
+
+
+def compare(result, baseline, threshold):
+    """Lines describing regressions beyond `threshold` (a fraction)."""
+    regressions = []
+    for route, base in baseline["routes"].items():
+        current = result["routes"].get(route)
+        if current is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and current[key] > base[key] * (1 + threshold):
+                regressions.append(f"{route} {key}: {base[key]} -> {current[key]}")
+    base_rps, rps = baseline["total"]["rps"], result["total"]["rps"]
+    if base_rps and rps < base_rps * (1 - threshold):
+        regressions.append(f"requests/sec: {base_rps} -> {rps}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--driver", choices=DRIVERS, default="client")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--ops", type=int, default=50, help="measured recipe calls per user")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured recipe calls per user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="simulated Firestore/Cloudinary round trip")
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="fail on regression against this run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed regression, as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    config = {"driver": args.driver, "users": args.users, "ops": args.ops,
+              "warmup": args.warmup, "seed": args.seed, "latency_ms": args.latency_ms,
+              "image_kb": args.image_kb}
+    result = run(args.driver, args.users, args.ops, args.warmup, args.seed,
+                 args.latency_ms, args.image_kb)
+    result["config"] = config
+
+    print(" ".join(f"{k}={v}" for k, v in config.items()))
+    print(f"{'route':>18} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, row in result["routes"].items():
+        print(f"{route:>18} {row['count']:>6} {row['errors']:>6} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    total = result["total"]
+    print(f"{total['requests']} recipe requests in {total['seconds']:.2f}s: {total['rps']:.1f} req/s")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    failed = any(row["errors"] for row in result["routes"].values())
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"warning: baseline was recorded with {baseline.get('config')}")
+        regressions = compare(result, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        failed = failed or bool(regressions)
+        if not regressions:
+            print(f"no regression beyond {args.threshold:.0%} of {args.baseline}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
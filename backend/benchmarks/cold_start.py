@@ -0,0 +1,74 @@
+"""
+Cold start: time from launching a fresh interpreter to the first response.
+
+Each run starts a new Python process that imports the app, calls
+create_app() and serves one request through the test client, so nothing
+is shared between runs (module cache, SDK clients, connections). Reports
+the median and worst time-to-first-response, plus the median split into
+import, create_app() and the request itself.
+
+Defaults to the memory backend so it needs no credentials. Run from the
+backend directory:
+    python -m benchmarks.cold_start --runs 10 --path /api/ready
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Runs inside the child process; prints its own timings as JSON.
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from api import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[1]).status_code
+done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "request": done - created,
+    "status": status,
+}))
+"""
+
+
+def run_once(path, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, path],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/api/ready",
+                        help="request served by each fresh process")
+    parser.add_argument("--backend", default="memory",
+                        help="STORAGE_BACKEND for the child processes")
+    args = parser.parse_args()
+
+    env = dict(os.environ, STORAGE_BACKEND=args.backend)
+    runs = [run_once(args.path, env) for _ in range(args.runs)]
+    statuses = {run["status"] for run in runs}
+
+    print(f"backend={args.backend} path={args.path} runs={args.runs} "
+          f"status={','.join(map(str, sorted(statuses)))}")
+    print(f"{'phase':>12} {'median ms':>10} {'max ms':>10}")
+    for phase in ("import", "create_app", "request", "total"):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:>12} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+JSON serialization: stdlib vs orjson, buffered vs streamed.
+
+Encodes a list of realistic recipe documents (ingredients, instructions,
+a few images, likes) the way GET /api/recipes does, with each provider:
+  - buffered: the whole list through app.json.response(), like jsonify()
+  - streamed: stream_json_array(), one element at a time
+Reports the median time per list, the encoded size and the peak memory
+allocated while encoding (tracemalloc). orjson rows are skipped if it
+isn't installed.
+
+Run from the backend directory:
+    python -m benchmarks.json_serialization --recipes 500 --runs 20
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from api import create_app
+from api.services.json_provider import OrjsonProvider, stream_json_array
+
+WORDS = ("tomato onion garlic basil olive oil salt pepper butter flour sugar egg "
+         "milk cream lemon thyme chicken rice beans cumin paprika ginger").split()
+
+
+def make_recipe(rng, now):
+    return {
+        "id": str(uuid.uuid4()),
+        "postId": str(uuid.uuid4()),
+        "title": " ".join(rng.choices(WORDS, k=3)).title(),
+        "description": " ".join(rng.choices(WORDS, k=30)),
+        "cookingTime": rng.randrange(10, 120),
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "servings": rng.randrange(1, 8),
+        "datePosted": (now - timedelta(minutes=rng.randrange(100000))).isoformat(),
+        "ingredients": [f"{rng.randrange(1, 500)} g {w}" for w in rng.sample(WORDS, 8)],
+        "instructions": " ".join(rng.choices(WORDS, k=120)),
+        "imageList": [
+            {"url": f"https://res.cloudinary.com/demo/image/upload/{uuid.uuid4()}.jpg",
+             "public_id": str(uuid.uuid4())}
+            for _ in range(rng.randrange(1, 4))
+        ],
+        "likes": rng.randrange(1000),
+        "isLiked": rng.random() < 0.2,
+    }
+
+
+def buffered(app, recipes):
+    return len(app.json.response(recipes).get_data())
+
+
+def streamed(app, recipes):
+    return sum(len(chunk.encode("utf-8")) for chunk in stream_json_array(app, iter(recipes)))
+
+
+def measure(app, encode, recipes, runs):
+    with app.app_context():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            size = encode(app, recipes)
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        encode(app, recipes)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return statistics.median(times), size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recipes", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime(2024, 1, 1)
+    recipes = [make_recipe(rng, now) for _ in range(args.recipes)]
+
+    providers = {"stdlib": create_app({"STORAGE_BACKEND": "memory", "JSON_PROVIDER": "stdlib"})}
+    fast = create_app({"STORAGE_BACKEND": "memory", "JSON_PROVIDER": "auto"})
+    if isinstance(fast.json, OrjsonProvider):
+        providers["orjson"] = fast
+    else:
+        print("orjson not installed; only the stdlib provider is measured")
+
+    print(f"recipes={args.recipes} runs={args.runs}")
+    print(f"{'provider':>8} {'mode':>9} {'median ms':>10} {'KB':>8} {'peak KB':>9}")
+    for name, app in providers.items():
+        for mode, encode in (("buffered", buffered), ("streamed", streamed)):
+            seconds, size, peak = measure(app, encode, recipes, args.runs)
+            print(f"{name:>8} {mode:>9} {seconds * 1000:>10.2f} "
+                  f"{size / 1024:>8.0f} {peak / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
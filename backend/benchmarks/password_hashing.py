@@ -0,0 +1,59 @@
+"""
+Login throughput for the password hashing pool.
+
+Simulates concurrent logins (check_password_hash on a stored hash) for
+each worker count and reports logins/sec overall and per core. Worker
+count 0 is the old inline behaviour, where request threads hash under
+the GIL.
+
+Run from the backend directory:
+    python -m benchmarks.password_hashing --workers 0 1 2 4 --logins 64
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.services.hashing import PasswordHasher
+
+
+def run(workers, method, logins, concurrency):
+    hasher = PasswordHasher(workers=workers, method=method)
+    try:
+        stored = hasher.hash_password("benchmark-password")
+        hasher.verify_password(stored, "benchmark-password")  # warm the pool
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as requests:
+            results = list(requests.map(
+                lambda _: hasher.verify_password(stored, "benchmark-password"),
+                range(logins),
+            ))
+        elapsed = time.perf_counter() - start
+    finally:
+        hasher.shutdown()
+
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="simultaneous login requests")
+    args = parser.parse_args()
+
+    print(f"method={args.method} logins={args.logins} "
+          f"concurrency={args.concurrency} cpus={os.cpu_count()}")
+    print(f"{'workers':>8} {'logins/s':>10} {'per core':>10}")
+    for workers in args.workers:
+        rate = run(workers, args.method, args.logins, args.concurrency)
+        cores = min(workers, os.cpu_count() or 1) or 1
+        print(f"{workers:>8} {rate:>10.1f} {rate / cores:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""
+ASGI entry point: `uvicorn start_asgi:app` (or any ASGI server) from
+backend/. See api/asgi.py for what runs async.
+"""
+from api import create_app
+from api.asgi import AsgiApp
+
+app = AsgiApp(create_app())
@@ -1,6 +1,75 @@
-from api import create_app
+import argparse
+import subprocess
+import sys
+import time
 
+_import_start = time.perf_counter()
+from api import create_app  # noqa: E402
+_import_seconds = time.perf_counter() - _import_start
+
+_create_start = time.perf_counter()
 app = create_app()
+_create_seconds = time.perf_counter() - _create_start
+
+# SDKs that dominate cold start; they should only appear once first used.
+HEAVY_MODULES = (
+    "firebase_admin",
+    "firebase_admin.auth",
+    "google.cloud.firestore",
+    "google.api_core.exceptions",
+    "cloudinary",
+    "redis",
+    "numpy",
+)
+
+
+def _loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def _slowest_imports(top):
+    """Re-import the app in a fresh interpreter under -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def profile_startup(path, top):
+    """Print where start-up time goes, from import to first response."""
+    print(f"import api            {_import_seconds * 1000:8.1f} ms")
+    print(f"create_app()          {_create_seconds * 1000:8.1f} ms")
+    print(f"  SDKs loaded: {', '.join(_loaded_heavy_modules()) or 'none'}")
+
+    start = time.perf_counter()
+    resp = app.test_client().get(path)
+    first = time.perf_counter() - start
+    print(f"first GET {path:<11} {first * 1000:8.1f} ms  ({resp.status_code})")
+    print(f"  SDKs loaded: {', '.join(_loaded_heavy_modules()) or 'none'}")
+
+    print("\nslowest imports (cumulative, self) for 'import api':")
+    for cumulative_us, self_us, name in _slowest_imports(top):
+        print(f"  {cumulative_us / 1000:8.1f} ms {self_us / 1000:8.1f} ms  {name}")
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report import/start-up/first-response time and exit")
+    parser.add_argument("--profile-path", default="/api/ready",
+                        help="request timed by --profile-startup")
+    parser.add_argument("--profile-top", type=int, default=15,
+                        help="how many of the slowest imports to list")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup(args.profile_path, args.profile_top)
+    else:
+        app.run(debug=True)